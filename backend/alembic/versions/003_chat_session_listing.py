@@ -0,0 +1,45 @@
+"""Add listing stats and per-user index to chat_sessions
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-18
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "003"
+down_revision = "002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "chat_sessions",
+        sa.Column("message_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "chat_sessions", sa.Column("last_message_preview", sa.Text(), nullable=True)
+    )
+    op.add_column(
+        "chat_sessions",
+        sa.Column("last_activity", sa.DateTime(timezone=True), nullable=True),
+    )
+    # Sidebar listing: a user's sessions, most recently updated first
+    op.create_index(
+        "ix_chat_sessions_user_id_updated_at",
+        "chat_sessions",
+        ["user_id", "updated_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_chat_sessions_user_id_updated_at", table_name="chat_sessions")
+    op.drop_column("chat_sessions", "last_activity")
+    op.drop_column("chat_sessions", "last_message_preview")
+    op.drop_column("chat_sessions", "message_count")
@@ -0,0 +1,95 @@
+import logging
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.api.dependencies import get_current_active_superuser
+from app.models.user import User
+from app.services.purge import user_history_purge
+from app.services.transfer import chat_transfer
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("/export")
+async def export_histories(
+    user_id: Optional[int] = Query(None, description="Export only this user's history"),
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Download chat histories for one user or the whole cluster.
+
+    Streams gzip-compressed NDJSON, one session or message per line.
+    """
+    scope = f"user-{user_id}" if user_id is not None else "all"
+    filename = f"chat-history-{scope}-{datetime.utcnow():%Y%m%d}.ndjson.gz"
+    logger.info(f"User {current_user.id} exporting chat histories ({scope})")
+    return StreamingResponse(
+        chat_transfer.export_history(user_id),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/import", response_model=dict)
+async def import_histories(
+    request: Request,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Load an export produced by the export endpoints.
+
+    The request body is the gzip-compressed NDJSON file, streamed as is.
+    """
+    logger.info(f"User {current_user.id} importing chat histories")
+    try:
+        return await chat_transfer.import_history(request.stream())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+
+
+@router.delete(
+    "/users/{user_id}/chats", status_code=status.HTTP_202_ACCEPTED, response_model=dict
+)
+async def purge_user_history(
+    user_id: int,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Delete all of a user's chat sessions and messages.
+
+    Returns as soon as the deletion has started; poll ``/admin/tasks/{task_id}``
+    with the returned task IDs for progress.
+    """
+    logger.info(f"User {current_user.id} purging chat history of user {user_id}")
+    try:
+        return await user_history_purge.start(user_id)
+    except Exception as e:
+        logger.error(f"Failed to start purge of user {user_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not start the purge",
+        )
+
+
+@router.get("/tasks/{task_id}", response_model=dict)
+async def get_task_progress(
+    task_id: str,
+    current_user: User = Depends(get_current_active_superuser),
+) -> Any:
+    """
+    Get the progress of a background purge task.
+    """
+    progress = await user_history_purge.progress(task_id)
+    if progress is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found",
+        )
+    return progress
@@ -1,13 +1,16 @@
-from typing import Any
 import logging
+from typing import Any
+
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app.api.dependencies import get_db, get_current_user
+from app.api.dependencies import get_current_user, get_db
 from app.core.security import get_user_by_email
 from app.models.user import User
-from app.schemas.user import User as UserSchema, UserCreate, UserUpdate, Token
+from app.schemas.user import Token
+from app.schemas.user import User as UserSchema
+from app.schemas.user import UserCreate, UserUpdate
 from app.services.auth import auth_service
 
 router = APIRouter()
@@ -15,7 +18,7 @@ logger = logging.getLogger(__name__)
 
 
 @router.post("/register", response_model=UserSchema)
-def register_user(
+async def register_user(
     *,
     db: Session = Depends(get_db),
     user_in: UserCreate,
@@ -26,8 +29,8 @@ def register_user(
     try:
         # Limit is_superuser to false for public registrations
         user_in.is_superuser = False
-        
-        user = auth_service.create_user(db=db, user_in=user_in)
+
+        user = await auth_service.create_user(db=db, user_in=user_in)
         return user
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -41,7 +44,7 @@ def register_user(
 
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     *,
     db: Session = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends(),
@@ -50,7 +53,7 @@ def login(
     Login and get access token.
     """
     try:
-        user = auth_service.authenticate(
+        user = await auth_service.authenticate(
             db=db, email=form_data.username, password=form_data.password
         )
         if not user:
@@ -65,7 +68,7 @@ def login(
                 detail="Inactive user",
                 headers={"WWW-Authenticate": "Bearer"},
             )
-        
+
         return auth_service.get_access_token(user_id=user.id)
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -89,7 +92,7 @@ def read_users_me(
 
 
 @router.put("/me", response_model=UserSchema)
-def update_user_me(
+async def update_user_me(
     *,
     db: Session = Depends(get_db),
     user_in: UserUpdate,
@@ -102,8 +105,10 @@ def update_user_me(
         # Ensure user can't make themselves a superuser
         if user_in.is_superuser:
             user_in.is_superuser = current_user.is_superuser
-        
-        user = auth_service.update_user(db=db, user_id=current_user.id, user_in=user_in)
+
+        user = await auth_service.update_user(
+            db=db, user_id=current_user.id, user_in=user_in
+        )
         return user
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -113,4 +118,4 @@ def update_user_me(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating user: {str(e)}",
-        )
\ No newline at end of file
+        )
@@ -1,36 +1,138 @@
-from typing import Any, Dict, List
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+import json
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from app.api.dependencies import get_current_user
 from app.models.user import User
 from app.schemas.chat import (
+    ChatHistory,
     ChatRequest,
     ChatResponse,
-    ChatHistory,
     ChatSession,
     ChatSessionCreate,
     ChatSessionUpdate,
+    MessagePage,
+    MessageSearchResults,
 )
-from app.services.chat import ChatService
+from app.services.chat import chat_service
+from app.services.idempotency import IdempotencyConflictError
+from app.services.transfer import chat_transfer
 from app.utils.rate_limiter import check_rate_limit
 
 router = APIRouter()
-chat_service = ChatService()
+logger = logging.getLogger(__name__)
+
+
+async def _authorize_session(
+    session_id: str, user: User, action: str = "access"
+) -> None:
+    """
+    Check that a session exists and belongs to the user.
+
+    Served from the relational index, so no session document is fetched.
+
+    Raises:
+        HTTPException: 404 if the session does not exist, 403 if it is not the user's
+    """
+    owner = await chat_service.get_session_owner(session_id, user.id)
+    if owner is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found",
+        )
+    if owner != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Not authorized to {action} this chat session",
+        )
 
 
 @router.get("/history", response_model=ChatHistory)
 async def get_chat_history(
     request: Request,
+    limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
 ) -> Any:
     """
     Get chat history for the current user.
+
+    Returns one page of sessions (most recently updated first) with their
+    listing stats but without messages; fetch a session for its messages.
+    """
+    check_rate_limit(request)
+
+    try:
+        sessions, next_cursor = await chat_service.get_user_chat_sessions(
+            current_user.id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return {"sessions": sessions, "next_cursor": next_cursor}
+
+
+@router.get("/export")
+async def export_history(
+    request: Request,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Download the current user's full chat history.
+
+    Streams gzip-compressed NDJSON, one session or message per line.
     """
     check_rate_limit(request)
-    
-    sessions = await chat_service.get_user_chat_sessions(current_user.id)
-    return {"sessions": sessions}
+
+    filename = f"chat-history-{current_user.id}-{datetime.utcnow():%Y%m%d}.ndjson.gz"
+    return StreamingResponse(
+        chat_transfer.export_history(current_user.id),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/search", response_model=MessageSearchResults)
+async def search_messages(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=500),
+    role: Optional[str] = Query(None, pattern="^(user|assistant)$"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Full-text search across the current user's messages.
+
+    Results are ranked by relevance and carry highlighted snippets and the
+    session they belong to; pass next_cursor back to get the next page.
+    """
+    check_rate_limit(request)
+
+    try:
+        results, next_cursor = await chat_service.search_messages(
+            current_user.id,
+            q,
+            limit=limit,
+            role=role,
+            start=start_date,
+            end=end_date,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return {"results": results, "next_cursor": next_cursor}
 
 
 @router.post("/sessions", response_model=ChatSession)
@@ -43,7 +145,7 @@ async def create_session(
     Create a new chat session.
     """
     check_rate_limit(request)
-    
+
     session = await chat_service.create_chat_session(
         user_id=current_user.id,
         title=session_in.title,
@@ -61,22 +163,56 @@ async def get_session(
     Get a specific chat session.
     """
     check_rate_limit(request)
-    
-    session = await chat_service.get_session(session_id)
+
+    await _authorize_session(session_id, current_user)
+    session = await chat_service.get_session(session_id, current_user.id)
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat session not found",
         )
-    
-    # Ensure the session belongs to the current user
-    if session["user_id"] != current_user.id:
+    return session
+
+
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
+async def get_session_messages(
+    request: Request,
+    session_id: str,
+    before: Optional[str] = Query(
+        None, description="Message ID; return older messages"
+    ),
+    after: Optional[str] = Query(None, description="Message ID; return newer messages"),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user),
+) -> Any:
+    """
+    Get a page of messages from a chat session.
+
+    Without cursors this returns the newest messages; page back through
+    scrollback with ``before`` set to the oldest message ID received.
+    """
+    check_rate_limit(request)
+
+    await _authorize_session(session_id, current_user)
+    session = await chat_service.get_session(
+        session_id, current_user.id, include_messages=False
+    )
+    if not session:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to access this chat session",
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found",
         )
-    
-    return session
+
+    try:
+        messages, has_more = await chat_service.get_session_messages(
+            session, limit=limit, before=before, after=after
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
+    return {"messages": messages, "has_more": has_more}
 
 
 @router.put("/sessions/{session_id}", response_model=ChatSession)
@@ -90,28 +226,20 @@ async def update_session(
     Update a chat session.
     """
     check_rate_limit(request)
-    
+
     # Check if session exists and belongs to user
-    session = await chat_service.get_session(session_id)
-    if not session:
+    await _authorize_session(session_id, current_user, "update")
+
+    # Update session
+    update_data = session_in.dict(exclude_unset=True)
+    if not await chat_service.update_chat_session(
+        session_id, current_user.id, update_data
+    ):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat session not found",
         )
-    
-    if session["user_id"] != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to update this chat session",
-        )
-    
-    # Update session
-    update_data = session_in.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        session[field] = value
-    
-    await chat_service.update_chat_session(session_id, update_data)
-    return await chat_service.get_session(session_id)
+    return await chat_service.get_session(session_id, current_user.id)
 
 
 @router.delete("/sessions/{session_id}", response_model=dict)
@@ -124,29 +252,18 @@ async def delete_session(
     Delete a chat session.
     """
     check_rate_limit(request)
-    
+
     # Check if session exists and belongs to user
-    session = await chat_service.get_session(session_id)
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat session not found",
-        )
-    
-    if session["user_id"] != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not authorized to delete this chat session",
-        )
-    
+    await _authorize_session(session_id, current_user, "delete")
+
     # Delete session
-    result = await chat_service.delete_chat_session(session_id)
+    result = await chat_service.delete_chat_session(session_id, current_user.id)
     if not result:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete chat session",
         )
-    
+
     return {"success": True, "message": "Chat session deleted successfully"}
 
 
@@ -155,48 +272,97 @@ async def send_message(
     request: Request,
     chat_request: ChatRequest,
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", max_length=128
+    ),
 ) -> Any:
     """
     Send a message to Claude and get a response.
+
+    Resends carrying the same Idempotency-Key header (or client_message_id)
+    return the original reply instead of starting a new turn.
     """
     check_rate_limit(request)
-    
+
     # Verify session if provided
     if chat_request.session_id:
-        session = await chat_service.get_session(chat_request.session_id)
-        if session and session["user_id"] != current_user.id:
+        # An unknown session is fine: the turn starts a new one
+        owner = await chat_service.get_session_owner(
+            chat_request.session_id, current_user.id
+        )
+        if owner is not None and owner != current_user.id:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Not authorized to access this chat session",
             )
-    
+
     try:
         # Process the message
-        session = await chat_service.process_user_message(
+        reply = await chat_service.process_user_message(
             user_id=current_user.id,
             message=chat_request.message,
-            session_id=chat_request.session_id
-        )
-        
-        # Get the assistant's message (last message in the session)
-        if session["messages"]:
-            assistant_messages = [
-                msg for msg in session["messages"] if msg["role"] == "assistant"
-            ]
-            if assistant_messages:
-                assistant_response = assistant_messages[-1]["content"]
-            else:
-                assistant_response = "No response received"
-        else:
-            assistant_response = "No response received"
-        
-        return {
-            "message": assistant_response,
-            "session_id": session["session_id"]
-        }
-    
+            session_id=chat_request.session_id,
+            idempotency_key=idempotency_key or chat_request.client_message_id,
+            model_hint=chat_request.model_hint,
+        )
+
+        return {"message": reply["message"], "session_id": reply["session_id"]}
+
+    except IdempotencyConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        )
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"detail": f"Error processing message: {str(e)}"}
-        )
\ No newline at end of file
+            content={"detail": f"Error processing message: {str(e)}"},
+        )
+
+
+@router.post("/message/stream")
+async def send_message_stream(
+    request: Request,
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", max_length=128
+    ),
+) -> Any:
+    """
+    Send a message to Claude and stream the response as Server-Sent Events.
+    """
+    check_rate_limit(request)
+
+    # Verify session if provided
+    if chat_request.session_id:
+        # An unknown session is fine: the turn starts a new one
+        owner = await chat_service.get_session_owner(
+            chat_request.session_id, current_user.id
+        )
+        if owner is not None and owner != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Not authorized to access this chat session",
+            )
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in chat_service.stream_user_message(
+                user_id=current_user.id,
+                message=chat_request.message,
+                session_id=chat_request.session_id,
+                idempotency_key=idempotency_key or chat_request.client_message_id,
+                model_hint=chat_request.model_hint,
+            ):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming message: {e}", exc_info=True)
+            error = {"type": "error", "detail": f"Error processing message: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,21 @@
+import asyncio
 import json
 import logging
 from typing import Dict, List, Optional
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+
 import jwt
-import asyncio
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 
 from app.core.security import decode_jwt_token
-from app.models.user import User
 from app.db.postgresql import SessionLocal
-from app.services.chat import ChatService
+from app.models.user import User
+from app.services.chat import chat_service
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 connections: Dict[int, List[WebSocket]] = {}
-chat_service = ChatService()
+
 
 async def get_current_user_ws(token: str) -> Optional[User]:
     try:
@@ -37,6 +38,7 @@ async def get_current_user_ws(token: str) -> Optional[User]:
         logger.error(f"WebSocket authentication error: {e}", exc_info=True)
         return None
 
+
 @router.websocket("/ws/{token}")
 async def websocket_endpoint(websocket: WebSocket, token: str):
     logger.info(f"WebSocket connection attempt with token: {token[:10]}...")
@@ -62,7 +64,12 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
     ping_task = None
 
     try:
-        await websocket.send_json({"type": "connection_established", "message": "WebSocket connection established"})
+        await websocket.send_json(
+            {
+                "type": "connection_established",
+                "message": "WebSocket connection established",
+            }
+        )
 
         async def send_ping():
             while True:
@@ -85,7 +92,12 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             except Exception as e:
                 logger.error(f"Error receiving WebSocket message: {e}", exc_info=True)
                 try:
-                    await websocket.send_json({"type": "error", "message": "Connection error, please try again"})
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": "Connection error, please try again",
+                        }
+                    )
                     await asyncio.sleep(1)
                     continue
                 except:
@@ -100,32 +112,77 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
 
                 user_message = message_data.get("message")
                 session_id = message_data.get("session_id")
+                client_message_id = message_data.get("client_message_id")
+                model_hint = message_data.get("model_hint")
 
                 if not user_message:
                     await websocket.send_json({"error": "Message content is required"})
                     continue
 
-                logger.info(f"Processing WebSocket message for user {user.id}, session: {session_id}")
-                session = await chat_service.process_user_message(
+                logger.info(
+                    f"Processing WebSocket message for user {user.id}, session: "
+                    f"{session_id}"
+                )
+                if message_data.get("stream"):
+                    stream = chat_service.stream_user_message(
+                        user_id=user.id,
+                        message=user_message,
+                        session_id=session_id,
+                        idempotency_key=client_message_id,
+                        model_hint=model_hint,
+                    )
+                    disconnected = False
+                    try:
+                        async for event in stream:
+                            if event["type"] == "done":
+                                event = {
+                                    "message": event["message"],
+                                    "session_id": event["session_id"],
+                                    "timestamp": event["timestamp"],
+                                }
+                            try:
+                                await websocket.send_json(event)
+                            except (WebSocketDisconnect, RuntimeError):
+                                # Sending to a closed socket raises RuntimeError
+                                disconnected = True
+                                break
+                    finally:
+                        # On a disconnect, persist the partial reply right away
+                        await stream.aclose()
+                    if disconnected:
+                        # Nobody is left to send an error frame to
+                        logger.info(
+                            f"WebSocket client disconnected mid-stream: User {user.id}"
+                        )
+                        return
+                    logger.info(f"WebSocket stream sent to user {user.id}")
+                    continue
+
+                reply = await chat_service.process_user_message(
                     user_id=user.id,
                     message=user_message,
-                    session_id=session_id
+                    session_id=session_id,
+                    idempotency_key=client_message_id,
+                    model_hint=model_hint,
                 )
 
-                assistant_messages = [msg for msg in session["messages"] if msg["role"] == "assistant"]
-                assistant_response = assistant_messages[-1]["content"] if assistant_messages else "No response received"
-                timestamp = assistant_messages[-1]["timestamp"] if assistant_messages else None
-
-                logger.debug(f"Sending to WebSocket: {assistant_response=} session_id={session['session_id']}")
+                logger.debug(
+                    f"Sending to WebSocket: {reply['message']=} "
+                    f"session_id={reply['session_id']}"
+                )
 
                 try:
-                    await websocket.send_json({
-                        "message": assistant_response,
-                        "session_id": session["session_id"],
-                        "timestamp": timestamp
-                    })
+                    await websocket.send_json(
+                        {
+                            "message": reply["message"],
+                            "session_id": reply["session_id"],
+                            "timestamp": reply["timestamp"],
+                        }
+                    )
                 except Exception as e:
-                    logger.error(f"Failed to send message to WebSocket: {e}", exc_info=True)
+                    logger.error(
+                        f"Failed to send message to WebSocket: {e}", exc_info=True
+                    )
                     await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
                     return
 
@@ -136,7 +193,9 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                 await websocket.send_json({"error": "Invalid JSON format"})
             except Exception as e:
                 logger.error(f"Error processing WebSocket message: {e}", exc_info=True)
-                await websocket.send_json({"error": f"Error processing message: {str(e)}"})
+                await websocket.send_json(
+                    {"error": f"Error processing message: {str(e)}"}
+                )
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket client disconnected: User {user.id}")
@@ -148,4 +207,4 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
         if user.id in connections and websocket in connections[user.id]:
             connections[user.id].remove(websocket)
             if not connections[user.id]:
-                del connections[user.id]
\ No newline at end of file
+                del connections[user.id]
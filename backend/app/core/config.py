@@ -1,4 +1,5 @@
 from typing import Any, Dict, List, Optional, Union
+
 from pydantic import AnyHttpUrl, PostgresDsn, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,7 +9,7 @@ class Settings(BaseSettings):
 
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Claude Chat API"
-    
+
     # CORS Configuration
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
@@ -44,19 +45,125 @@ class Settings(BaseSettings):
     ELASTICSEARCH_PORT: int
     ELASTICSEARCH_USERNAME: Optional[str] = None
     ELASTICSEARCH_PASSWORD: Optional[str] = None
+    # Async client connection pool (per worker)
+    ES_MAX_CONNECTIONS: int = 50
+    ES_REQUEST_TIMEOUT: float = 10.0
+    ES_MAX_RETRIES: int = 2
+    # While Elasticsearch is unreachable, reconnect at most this often;
+    # requests in between get no client right away
+    ES_RECONNECT_INTERVAL_SECONDS: float = 5.0
+    # Index names are aliases: sessions sit behind CHAT_INDEX_NAME, messages
+    # behind a rollover write alias. Documents are routed by user_id.
     CHAT_INDEX_NAME: str = "chat_history"
+    # One document per message, keyed by session_id
+    CHAT_MESSAGES_INDEX_NAME: str = "chat_messages"
+    CHAT_INDEX_SHARDS: int = 3
+    CHAT_MESSAGES_INDEX_SHARDS: int = 3
+    ES_NUMBER_OF_REPLICAS: int = 0
+    CHAT_MESSAGES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE: str = "30gb"
+    CHAT_MESSAGES_ROLLOVER_MAX_AGE: str = "30d"
+    # Writes don't force a refresh; messages this worker wrote are overlaid
+    # on search results until they are certainly visible
+    ES_RECENT_WRITES_TTL_SECONDS: float = 5.0
+    ES_RECENT_WRITES_MAX_SESSIONS: int = 10000
+    # Batch message appends and usage updates through _bulk (opt-in).
+    # Keep ES_RECENT_WRITES_TTL_SECONDS above the flush interval plus the
+    # index refresh interval.
+    ES_BULK_ENABLED: bool = False
+    ES_BULK_MAX_ACTIONS: int = 500
+    ES_BULK_FLUSH_INTERVAL: float = 0.5
+    ES_BULK_QUEUE_SIZE: int = 5000
+    ES_BULK_MAX_RETRIES: int = 3
+    # Retention: archive sessions idle for RETENTION_IDLE_DAYS to ARCHIVE_DIR
+    # (rehydrated when opened) and purge empty and orphaned sessions. Passes
+    # are serialized across workers by a PostgreSQL advisory lock; ARCHIVE_DIR
+    # must be shared by every instance.
+    RETENTION_ENABLED: bool = False
+    RETENTION_INTERVAL_SECONDS: int = 3600
+    RETENTION_IDLE_DAYS: int = 90
+    RETENTION_EMPTY_SESSION_HOURS: int = 24
+    ARCHIVE_DIR: str = "data/archive"
+    # Admin purge of a user's chat history: delete_by_query throttle
+    # (documents per second, -1 for none) and batch sizes
+    ADMIN_PURGE_REQUESTS_PER_SECOND: float = 1000.0
+    ADMIN_PURGE_SCROLL_SIZE: int = 1000
+    ADMIN_PURGE_SQL_BATCH_SIZE: int = 1000
+    # Export/import of chat histories (NDJSON, gzip)
+    EXPORT_BATCH_SIZE: int = 1000
+    EXPORT_PIT_KEEP_ALIVE: str = "2m"
+    IMPORT_BULK_ACTIONS: int = 1000
+    IMPORT_CONCURRENCY: int = 4
+    # Caps on an import's decompressed size and on a single NDJSON line
+    IMPORT_MAX_BYTES: int = 10 * 1024**3
+    IMPORT_MAX_LINE_BYTES: int = 16 * 1024**2
 
     # JWT Authentication
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     JWT_ALGORITHM: str = "HS256"
+    # Password hashing: bcrypt work factor (existing hashes are upgraded on
+    # login when it changes), hashing processes and the most hash/verify
+    # operations queued per API worker before new ones get a 503
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
 
     # Claude API
     CLAUDE_API_KEY: str
     CLAUDE_MODEL: str = "claude-3-7-sonnet-20250219"
-    
+    CLAUDE_FAST_MODEL: Optional[str] = "claude-3-5-haiku-20241022"
+    # Point at scripts/mock_anthropic.py for load testing
+    CLAUDE_API_BASE_URL: str = "https://api.anthropic.com"
+    # Upstream HTTP client (one pooled client per worker)
+    CLAUDE_HTTP2: bool = False
+    CLAUDE_MAX_CONNECTIONS: int = 100
+    CLAUDE_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    CLAUDE_KEEPALIVE_EXPIRY: float = 30.0
+    CLAUDE_CONNECT_TIMEOUT: float = 5.0
+    CLAUDE_READ_TIMEOUT: float = 60.0
+    CLAUDE_POOL_TIMEOUT: float = 10.0
+    # Upstream retries, circuit breaker and overload fallback
+    CLAUDE_MAX_RETRIES: int = 3
+    CLAUDE_RETRY_BASE_DELAY: float = 0.5
+    CLAUDE_RETRY_MAX_DELAY: float = 8.0
+    CLAUDE_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CLAUDE_CIRCUIT_RESET_SECONDS: float = 30.0
+    CLAUDE_FALLBACK_MODEL: Optional[str] = None
+    CHAT_RESPONSE_TIMEOUT: float = 20.0
+    # Per-worker cache of full sessions; another worker's writes to the same
+    # session are only seen once the entry expires
+    SESSION_CACHE_ENABLED: bool = True
+    SESSION_CACHE_TTL_SECONDS: float = 15.0
+    SESSION_CACHE_MAX_ENTRIES: int = 1000
+    # Per-turn routing between CLAUDE_FAST_MODEL and CLAUDE_MODEL (opt-in);
+    # when enabled, context summaries also use CLAUDE_FAST_MODEL
+    MODEL_ROUTING_ENABLED: bool = False
+    ROUTING_FAST_MAX_CHARS: int = 200
+    ROUTING_FAST_MAX_DEPTH: int = 6
+    # Pin users to a tier, e.g. {"42": "strong"}
+    ROUTING_USER_TIERS: Dict[int, str] = {}
+    # How long completed idempotent chat turns are replayed
+    IDEMPOTENCY_TTL_SECONDS: int = 300
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    # Mark the stable prompt prefix for provider-side prompt caching
+    PROMPT_CACHE_ENABLED: bool = True
+    # Cache of identical upstream requests (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_SCOPE: str = "user"  # "user" or "global"
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    RESPONSE_CACHE_DIR: Optional[str] = None
+    # Estimated input-token budget for history plus the new message
+    CONTEXT_MAX_INPUT_TOKENS: int = 8000
+    # Rolling summary of older turns (opt-in)
+    CONTEXT_SUMMARY_ENABLED: bool = False
+    CONTEXT_SUMMARY_KEEP_MESSAGES: int = 20
+    CONTEXT_SUMMARY_BATCH_MESSAGES: int = 10
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 512
+
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
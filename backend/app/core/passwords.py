@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Hashes made with any other work factor are flagged for an upgrade, so a
+# change of BCRYPT_ROUNDS is rolled out as users log in
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+# Run in the worker processes; module-level so they can be pickled
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(
+    password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Run bcrypt in a small process pool instead of the request threadpool.
+
+    bcrypt is CPU-bound by design; on the shared threadpool a burst of logins
+    holds every thread and stalls all other sync endpoints and DB calls. Here
+    the work goes to PASSWORD_HASH_WORKERS processes and the waiting request
+    holds no thread. At most PASSWORD_HASH_MAX_PENDING operations are queued
+    or running per API worker; beyond that requests fail fast with 503.
+    """
+
+    def __init__(
+        self,
+        workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_pending: int = settings.PASSWORD_HASH_MAX_PENDING,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Don't fork a process that already runs threads and an event loop
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Started password hashing pool with {self.workers} processes")
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            metrics.increment("password_hash.rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._pool().submit(fn, *args))
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool for the next request
+            logger.error("Password hashing pool broke, restarting it")
+            self._executor = None
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication temporarily unavailable, please retry",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password with the configured work factor.
+
+        Raises:
+            HTTPException: 503 if the pool is saturated
+        """
+        return await self._run(_hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and rehash it if its hash is outdated.
+
+        Returns:
+            Whether the password matches, and a replacement hash to store if
+            the existing one uses other parameters (None otherwise)
+
+        Raises:
+            HTTPException: 503 if the pool is saturated
+        """
+        return await self._run(_verify_and_update, password, hashed_password)
+
+    def start(self) -> None:
+        """Start the worker processes ahead of the first login."""
+        self._pool()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance, started on app startup
+password_hasher = PasswordHasher()
@@ -1,23 +1,25 @@
+import logging
 from datetime import datetime, timedelta
 from typing import Any, Dict, Optional, Union
-import logging
 
 import jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.passwords import pwd_context
 from app.models.user import User
 from app.schemas.user import TokenPayload
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def create_access_token(subject: Union[str, int], expires_delta: Optional[timedelta] = None) -> str:
+
+def create_access_token(
+    subject: Union[str, int], expires_delta: Optional[timedelta] = None
+) -> str:
     """
     Create a JWT access token.
     """
@@ -25,15 +27,20 @@ def create_access_token(subject: Union[str, int], expires_delta: Optional[timede
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = datetime.utcnow() + timedelta(
+                minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+            )
 
         to_encode = {"exp": expire, "sub": str(subject)}
-        encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        encoded_jwt = jwt.encode(
+            to_encode, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM
+        )
         return encoded_jwt
     except Exception as e:
         logger.error(f"Error creating access token: {e}", exc_info=True)
         raise
 
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a password against a hash.
@@ -44,6 +51,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         logger.error(f"Error verifying password: {e}", exc_info=True)
         return False
 
+
 def get_password_hash(password: str) -> str:
     """
     Hash a password.
@@ -54,6 +62,7 @@ def get_password_hash(password: str) -> str:
         logger.error(f"Error hashing password: {e}", exc_info=True)
         raise
 
+
 def decode_jwt_token(token: str) -> Dict[str, Any]:
     """
     Decode a JWT token.
@@ -85,6 +94,7 @@ def decode_jwt_token(token: str) -> Dict[str, Any]:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """
     Get a user by email.
@@ -95,6 +105,7 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
         logger.error(f"Error getting user by email: {e}", exc_info=True)
         return None
 
+
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """
     Authenticate a user.
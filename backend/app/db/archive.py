@@ -0,0 +1,138 @@
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+
+# Session IDs come from request paths; anything else must not reach the filesystem
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# Archived sessions are stored one file per session, as gzip-compressed JSON
+# ({"session": {...}, "messages": [...]}), under ARCHIVE_DIR/<user_id>/.
+
+
+def _path(session_id: str, user_id: int) -> Optional[Path]:
+    if not _SAFE_ID.match(session_id):
+        return None
+    return Path(settings.ARCHIVE_DIR) / str(int(user_id)) / f"{session_id}.json.gz"
+
+
+def _write(session: Dict[str, Any], messages: List[Dict[str, Any]]) -> None:
+    path = _path(session["session_id"], session["user_id"])
+    if path is None:
+        raise ValueError(f"Invalid session ID {session['session_id']!r}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump({"session": session, "messages": messages}, f, separators=(",", ":"))
+    # Only a complete archive ever appears under the final name
+    os.replace(tmp, path)
+
+
+def _read(session_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    path = _path(session_id, user_id)
+    if path is None or not path.exists():
+        return None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _delete(session_id: str, user_id: int) -> None:
+    path = _path(session_id, user_id)
+    if path is not None:
+        path.unlink(missing_ok=True)
+
+
+def _delete_user(user_id: int) -> None:
+    shutil.rmtree(Path(settings.ARCHIVE_DIR) / str(int(user_id)), ignore_errors=True)
+
+
+def _archive_paths(user_id: Optional[int]) -> List[Path]:
+    root = Path(settings.ARCHIVE_DIR)
+    if user_id is not None:
+        root = root / str(int(user_id))
+    if not root.is_dir():
+        return []
+    return sorted(root.glob("*.json.gz" if user_id is not None else "*/*.json.gz"))
+
+
+def _read_path(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Restored or deleted since the directory was listed
+        return None
+
+
+def _archived_user_ids() -> List[int]:
+    root = Path(settings.ARCHIVE_DIR)
+    if not root.is_dir():
+        return []
+    return [
+        int(entry.name)
+        for entry in root.iterdir()
+        if entry.is_dir() and entry.name.isdigit()
+    ]
+
+
+async def write_session_archive(
+    session: Dict[str, Any], messages: List[Dict[str, Any]]
+) -> None:
+    """
+    Archive a session and its messages to local disk.
+
+    Args:
+        session: Session document, without messages
+        messages: All of the session's messages
+    """
+    await asyncio.to_thread(_write, session, messages)
+
+
+async def read_session_archive(
+    session_id: str, user_id: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Read an archived session.
+
+    Returns:
+        Dict with ``session`` and ``messages``, or None if it is not archived
+    """
+    return await asyncio.to_thread(_read, session_id, user_id)
+
+
+async def iter_session_archives(
+    user_id: Optional[int] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Read archived sessions one file at a time.
+
+    Args:
+        user_id: Only this user's archives, or None for everyone's
+
+    Yields:
+        Dicts with ``session`` and ``messages``
+    """
+    for path in await asyncio.to_thread(_archive_paths, user_id):
+        archive = await asyncio.to_thread(_read_path, path)
+        if archive is not None:
+            yield archive
+
+
+async def delete_session_archive(session_id: str, user_id: int) -> None:
+    await asyncio.to_thread(_delete, session_id, user_id)
+
+
+async def delete_user_archives(user_id: int) -> None:
+    """Remove every archived session of a user."""
+    await asyncio.to_thread(_delete_user, user_id)
+
+
+async def get_archived_user_ids() -> List[int]:
+    """IDs of the users with archived sessions."""
+    return await asyncio.to_thread(_archived_user_ids)
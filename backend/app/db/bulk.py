@@ -0,0 +1,297 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from elasticsearch import AsyncElasticsearch
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# One logical write: alternating action and source lines for the _bulk API
+Operations = List[Dict[str, Any]]
+
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 5.0
+
+# Item statuses worth another attempt: rejected under load or shard trouble
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+class BulkWriteError(Exception):
+    """Raised when actions of a bulk write were not stored."""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        self.errors = errors
+        super().__init__(f"{len(errors)} bulk actions failed: {errors[0]}")
+
+
+def item_succeeded(action: str, outcome: Dict[str, Any]) -> bool:
+    """
+    Whether one item of a _bulk response means the action is stored.
+
+    A create that conflicts with an existing document counts as stored: it
+    is a retry of a create that already went through.
+    """
+    if "error" not in outcome:
+        return True
+    return action == "create" and outcome.get("status") == 409
+
+
+def failed_items(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Items of a _bulk response whose actions were not stored."""
+    if not result.get("errors"):
+        return []
+    return [
+        item
+        for item in result["items"]
+        if not item_succeeded(*next(iter(item.items())))
+    ]
+
+
+class _Write:
+    """One submitted write: the actions still to store and the caller's future."""
+
+    def __init__(self, operations: Operations, future: "asyncio.Future[None]"):
+        self.operations = operations
+        self.future = future
+        self.errors: List[Dict[str, Any]] = []
+
+    @property
+    def actions(self) -> int:
+        return len(self.operations) // 2
+
+    def resolve(self) -> None:
+        if self.future.done():
+            return
+        if self.errors:
+            self.future.set_exception(BulkWriteError(self.errors))
+        else:
+            self.future.set_result(None)
+
+    def fail(self, error: BaseException) -> None:
+        if not self.future.done():
+            self.future.set_exception(error)
+
+
+class BulkWriter:
+    """
+    Buffer Elasticsearch writes and send them through the _bulk API.
+
+    Writes are queued and flushed by a background task once a batch reaches
+    ES_BULK_MAX_ACTIONS actions or ES_BULK_FLUSH_INTERVAL seconds after its
+    first write, whichever comes first. The queue is bounded: when it is
+    full, submit() waits for the flusher to catch up instead of growing
+    without limit.
+
+    Each write gets a future that resolves once all of its actions are
+    stored, or fails with the item errors, so callers only treat a write as
+    done when Elasticsearch has it. Items rejected under load are retried on
+    their own; the rest of the batch is not sent again. Retried actions must
+    be idempotent (creates, or scripts guarded against double application).
+    """
+
+    def __init__(
+        self,
+        max_actions: int = settings.ES_BULK_MAX_ACTIONS,
+        flush_interval: float = settings.ES_BULK_FLUSH_INTERVAL,
+        max_queue: int = settings.ES_BULK_QUEUE_SIZE,
+        max_retries: int = settings.ES_BULK_MAX_RETRIES,
+    ):
+        self.max_actions = max_actions
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self._client: Optional[AsyncElasticsearch] = None
+        self._queue: Optional["asyncio.Queue[_Write]"] = None
+        self._task: Optional[asyncio.Task] = None
+        # Writes queued and writes done (flushed or dropped), in queue order,
+        # so drain() can wait for a point in the queue rather than an empty one
+        self._submitted = 0
+        self._completed = 0
+        self._progress: Optional[asyncio.Condition] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, client: AsyncElasticsearch) -> None:
+        """Start the background flusher on the current event loop."""
+        if self.running:
+            return
+        self._client = client
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._progress = asyncio.Condition()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Started bulk writer (max_actions={self.max_actions}, "
+            f"flush_interval={self.flush_interval}s, max_queue={self.max_queue})"
+        )
+
+    async def drain(self) -> None:
+        """
+        Wait until every write queued so far has been flushed.
+
+        Writes queued after the call are not waited for, so this returns
+        under steady traffic too.
+        """
+        if not self.running:
+            return
+        target = self._submitted
+        async with self._progress:
+            await self._progress.wait_for(
+                lambda: self._completed >= target or not self.running
+            )
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Flush everything still queued, then stop the flusher."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Bulk writer shut down with {self._queue.qsize()} writes unflushed"
+            )
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Nothing will flush what is left; fail it so no caller waits forever
+        while not self._queue.empty():
+            self._queue.get_nowait().fail(RuntimeError("Bulk writer stopped"))
+            self._queue.task_done()
+        # Release drain() callers waiting on writes that will never flush
+        async with self._progress:
+            self._progress.notify_all()
+        logger.info("Stopped bulk writer")
+
+    async def submit(self, operations: Operations) -> "asyncio.Future[None]":
+        """
+        Queue one logical write for the next bulk flush.
+
+        Args:
+            operations: Action and source lines, as accepted by the _bulk API
+
+        Returns:
+            Future that resolves once every action is stored, or fails with
+            BulkWriteError (or the request error) if any could not be
+        """
+        if self._queue.full():
+            metrics.increment("es_bulk.backpressure_waits")
+        write = _Write(operations, asyncio.get_running_loop().create_future())
+        await self._queue.put(write)
+        self._submitted += 1
+        return write.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            actions = batch[0].actions
+            deadline = loop.time() + self.flush_interval
+            try:
+                while actions < self.max_actions:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        write = await asyncio.wait_for(
+                            self._queue.get(), timeout=remaining
+                        )
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(write)
+                    actions += write.actions
+                await self._flush(batch)
+            except Exception as e:
+                logger.error(
+                    f"Bulk flush of {actions} actions failed: {e}", exc_info=True
+                )
+                for write in batch:
+                    write.fail(e)
+            except BaseException:
+                for write in batch:
+                    write.fail(RuntimeError("Bulk writer stopped"))
+                raise
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                async with self._progress:
+                    self._completed += len(batch)
+                    self._progress.notify_all()
+
+    async def _flush(self, batch: List[_Write]) -> None:
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            final = attempt >= self.max_retries
+            operations = [line for write in pending for line in write.operations]
+            actions = len(operations) // 2
+            try:
+                result = await self._client.bulk(body=operations)
+            except Exception as e:
+                if final:
+                    metrics.increment("es_bulk.dropped_actions", actions)
+                    raise
+                delay = backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                logger.warning(f"Bulk flush failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            metrics.increment("es_bulk.flushes")
+            metrics.increment("es_bulk.actions", actions)
+            retry, failed = self._sort_items(pending, result["items"], final)
+            if failed:
+                metrics.increment("es_bulk.failed_actions", failed)
+            if not retry:
+                return
+            delay = backoff_delay(attempt, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+            logger.warning(
+                f"{sum(w.actions for w in retry)} bulk actions rejected, "
+                f"retrying them in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+            pending = retry
+
+    @staticmethod
+    def _sort_items(
+        pending: List[_Write], items: List[Dict[str, Any]], final: bool
+    ) -> Tuple[List[_Write], int]:
+        """
+        Match response items to their writes and resolve the finished ones.
+
+        Returns:
+            The writes with actions to retry (only those actions left in
+            them), and the number of actions that failed for good
+        """
+        retry: List[_Write] = []
+        failed = 0
+        position = 0
+        for write in pending:
+            again: Operations = []
+            for index in range(write.actions):
+                action, outcome = next(iter(items[position].items()))
+                position += 1
+                if item_succeeded(action, outcome):
+                    continue
+                if not final and outcome.get("status") in RETRYABLE_STATUSES:
+                    again.extend(write.operations[2 * index : 2 * index + 2])
+                    continue
+                write.errors.append({action: outcome})
+                failed += 1
+            if again:
+                write.operations = again
+                retry.append(write)
+            else:
+                write.resolve()
+        if failed:
+            logger.error(f"{failed} bulk actions failed")
+        return retry, failed
+
+
+# Singleton instance, started on app startup when ES_BULK_ENABLED
+bulk_writer = BulkWriter()
@@ -1,96 +1,393 @@
-from typing import Any, Dict, List, Optional
+import asyncio
 import json
 import logging
-from elasticsearch import Elasticsearch
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from elasticsearch import AsyncElasticsearch
+
 from app.core.config import settings
+from app.db.archive import delete_session_archive, read_session_archive
+from app.db.bulk import bulk_writer, failed_items
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.resilience import backoff_delay
 
 logger = logging.getLogger(__name__)
 
-# Initialize Elasticsearch client
-es_client = None
+# One pooled client per worker, opened on app startup
+es_client: Optional[AsyncElasticsearch] = None
+_client_lock = asyncio.Lock()
+# Monotonic time of the last failed connection attempt
+_last_connect_failure: Optional[float] = None
 
+USAGE_MAPPING = {
+    "properties": {
+        "input_tokens": {"type": "long"},
+        "output_tokens": {"type": "long"},
+        "cache_creation_input_tokens": {"type": "long"},
+        "cache_read_input_tokens": {"type": "long"},
+    }
+}
 
-def get_elasticsearch_client() -> Optional[Elasticsearch]:
-    """Get or create Elasticsearch client."""
-    global es_client
-    if es_client is None:
+MESSAGE_PROPERTIES = {
+    "id": {"type": "keyword"},
+    "role": {"type": "keyword"},
+    "content": {"type": "text"},
+    "timestamp": {"type": "date"},
+    "token_count": {"type": "integer"},
+    "usage": USAGE_MAPPING,
+    "model": {"type": "keyword"},
+    "routing": {
+        "properties": {
+            "tier": {"type": "keyword"},
+            "reason": {"type": "keyword"},
+            "model": {"type": "keyword"},
+        }
+    },
+}
+
+# Upper bound on messages loaded with a session (index.max_result_window)
+MAX_SESSION_MESSAGES = 10000
+
+# Seconds between checks on a background delete_by_query task
+TASK_POLL_INTERVAL = 1.0
+
+# Length of the last-message preview kept on the session document
+PREVIEW_CHARS = 200
+
+# Keeps the session listing stats current on every appended message. Legacy
+# sessions start counting from their embedded messages. A retried bulk
+# request may apply it twice, so a message already counted is a no-op.
+APPEND_STATS_SCRIPT = (
+    "if (ctx._source.last_message_id == params.message_id) { ctx.op = 'noop'; } "
+    "else { "
+    "if (ctx._source.message_count == null) { "
+    "ctx._source.message_count = ctx._source.messages == null ? 0 : "
+    "ctx._source.messages.size(); } "
+    "ctx._source.message_count += 1; "
+    "ctx._source.last_message_id = params.message_id; "
+    "ctx._source.last_message_preview = params.preview; "
+    "ctx._source.last_activity = params.timestamp; "
+    "ctx._source.updated_at = params.timestamp; }"
+)
+
+# Adds one turn's token usage to the session totals, once per message
+USAGE_SCRIPT = (
+    "if (ctx._source.usage_message_id == params.message_id) { ctx.op = 'noop'; } "
+    "else { "
+    "if (ctx._source.usage == null) { ctx._source.usage = [:]; } "
+    "for (entry in params.usage.entrySet()) { "
+    "def current = ctx._source.usage.get(entry.getKey()); "
+    "ctx._source.usage.put(entry.getKey(), (current == null ? 0 : current) + "
+    "entry.getValue()); } "
+    "ctx._source.usage_message_id = params.message_id; }"
+)
+
+# Messages appended by this worker, by session, that may not be searchable
+# until the next index refresh. Merged into reads for read-your-writes.
+# Each message carries its own expiry, so an active session only keeps the
+# last ES_RECENT_WRITES_TTL_SECONDS of its writes.
+_recent_messages: TTLCache[List[Tuple[float, Dict[str, Any]]]] = TTLCache(
+    max_entries=settings.ES_RECENT_WRITES_MAX_SESSIONS,
+    ttl_seconds=settings.ES_RECENT_WRITES_TTL_SECONDS,
+)
+
+
+def _remember_recent(session_id: str, document: Dict[str, Any]) -> None:
+    """Add an appended message to the overlay and drop the expired ones."""
+    now = time.monotonic()
+    recent = _recent_messages.get(session_id)
+    if recent is None:
+        recent = []
+    # Appended in write order, so the expired ones are at the front
+    expired = 0
+    while expired < len(recent) and recent[expired][0] <= now:
+        expired += 1
+    del recent[:expired]
+    recent.append((now + settings.ES_RECENT_WRITES_TTL_SECONDS, document))
+    # Re-set to extend the entry to the newest message's expiry
+    _recent_messages.set(session_id, recent)
+
+
+def forget_recent_writes(user_id: int) -> None:
+    """Drop a user's messages from this worker's recent-writes overlay."""
+    _recent_messages.delete_where(
+        lambda recent: any(document["user_id"] == user_id for _, document in recent)
+    )
+
+
+def _recent(session_id: str) -> List[Dict[str, Any]]:
+    """Unexpired overlay messages of a session, oldest first."""
+    now = time.monotonic()
+    return [
+        document
+        for expires_at, document in _recent_messages.get(session_id) or []
+        if expires_at > now
+    ]
+
+
+def _create_client() -> AsyncElasticsearch:
+    auth = None
+    if settings.ELASTICSEARCH_USERNAME and settings.ELASTICSEARCH_PASSWORD:
+        auth = (settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD)
+    return AsyncElasticsearch(
+        [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"],
+        basic_auth=auth,
+        connections_per_node=settings.ES_MAX_CONNECTIONS,
+        request_timeout=settings.ES_REQUEST_TIMEOUT,
+        max_retries=settings.ES_MAX_RETRIES,
+        retry_on_timeout=True,
+    )
+
+
+async def init_elasticsearch() -> Optional[AsyncElasticsearch]:
+    """Open the Elasticsearch client and make sure the indices exist."""
+    global es_client, _last_connect_failure
+    async with _client_lock:
+        if es_client is not None:
+            return es_client
+        client = _create_client()
         try:
-            # Create a basic client without extra parameters
-            es_client = Elasticsearch(
-                [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"]
-            )
-            
             # Check if the client is connected
-            if es_client.ping():
+            if await client.ping():
                 logger.info("Successfully connected to Elasticsearch")
-                # Initialize index
-                _ensure_index_exists(es_client)
-            else:
-                logger.error("Failed to ping Elasticsearch")
-                es_client = None
+                # Initialize indices
+                await _ensure_index_exists(client)
+                await _ensure_messages_index_exists(client)
+                es_client = client
+                _last_connect_failure = None
+                return es_client
+            logger.error("Failed to ping Elasticsearch")
         except Exception as e:
             logger.error(f"Failed to initialize Elasticsearch: {e}", exc_info=True)
-            es_client = None
-    
-    return es_client
+        _last_connect_failure = time.monotonic()
+        await client.close()
+        return None
+
+
+async def close_elasticsearch() -> None:
+    """Close the Elasticsearch client and its connection pool."""
+    global es_client
+    if es_client is not None:
+        await es_client.close()
+        es_client = None
+
+
+async def get_elasticsearch_client() -> Optional[AsyncElasticsearch]:
+    """
+    Get the Elasticsearch client, connecting if startup couldn't.
+
+    After a failed attempt, returns None without trying again until
+    ES_RECONNECT_INTERVAL_SECONDS have passed, so requests don't queue up
+    behind each other's connection timeouts.
+    """
+    if es_client is not None:
+        return es_client
+    if _connect_backing_off():
+        return None
+    if _client_lock.locked():
+        # Another request is connecting; its outcome decides for this one
+        async with _client_lock:
+            pass
+        if es_client is not None or _connect_backing_off():
+            return es_client
+    return await init_elasticsearch()
+
+
+def _connect_backing_off() -> bool:
+    return (
+        _last_connect_failure is not None
+        and time.monotonic() - _last_connect_failure
+        < settings.ES_RECONNECT_INTERVAL_SECONDS
+    )
+
+
+def _routing(user_id: int) -> str:
+    """Routing key that keeps all of a user's documents on one shard."""
+    return str(user_id)
 
 
-def _ensure_index_exists(es: Elasticsearch) -> None:
-    """Create index if it doesn't exist."""
-    index_name = settings.CHAT_INDEX_NAME
-    
+async def _ensure_index_exists(es: AsyncElasticsearch) -> None:
+    """
+    Create the sessions index behind its alias if neither exists.
+
+    Sessions are updated in place, so they live in a single versioned index
+    (reindex into ``-000002`` and swap the alias to change the layout).
+    A concrete index already using the alias name is left as it is.
+    """
+    alias = settings.CHAT_INDEX_NAME
+    index_name = f"{alias}-000001"
+
     try:
-        # Check if index exists
-        if not es.indices.exists(index=index_name):
-            # Create a basic index first
+        # Check if the alias (or a legacy index of that name) exists
+        if not await es.indices.exists(index=alias):
             body = {
                 "settings": {
-                    "number_of_shards": 1,
-                    "number_of_replicas": 0
-                }
+                    "number_of_shards": settings.CHAT_INDEX_SHARDS,
+                    "number_of_replicas": settings.ES_NUMBER_OF_REPLICAS,
+                },
+                "mappings": {
+                    # Every read and write must carry the user_id routing
+                    "_routing": {"required": True},
+                    "properties": {
+                        "user_id": {"type": "integer"},
+                        "session_id": {"type": "keyword"},
+                        "title": {"type": "text"},
+                        # Legacy: messages now live in CHAT_MESSAGES_INDEX_NAME
+                        "messages": {
+                            "type": "nested",
+                            "properties": MESSAGE_PROPERTIES,
+                        },
+                        "summary": {"type": "text", "index": False},
+                        "summary_message_count": {"type": "integer"},
+                        "usage": USAGE_MAPPING,
+                        # Denormalized for the session listing
+                        "message_count": {"type": "integer"},
+                        "last_message_preview": {"type": "text", "index": False},
+                        # Last message counted by the stats and usage scripts
+                        "last_message_id": {"type": "keyword", "index": False},
+                        "usage_message_id": {"type": "keyword", "index": False},
+                        "last_activity": {"type": "date"},
+                        "created_at": {"type": "date"},
+                        "updated_at": {"type": "date"},
+                    },
+                },
+                "aliases": {alias: {"is_write_index": True}},
             }
-            es.indices.create(index=index_name, body=body)
-            logger.info(f"Created index: {index_name}")
-            
-            # Update mappings
-            mapping_body = {
-                "properties": {
-                    "user_id": {"type": "integer"},
-                    "session_id": {"type": "keyword"},
-                    "title": {"type": "text"},
-                    "messages": {
-                        "type": "nested",
+            await es.indices.create(index=index_name, body=body)
+            logger.info(f"Created index {index_name} with alias {alias}")
+    except Exception as e:
+        logger.error(f"Error setting up index: {e}", exc_info=True)
+
+
+async def _ensure_messages_index_exists(es: AsyncElasticsearch) -> None:
+    """
+    Set up time-based rollover for the messages index.
+
+    An ILM policy rolls the write alias over to a new backing index by
+    primary shard size or age, and an index template gives every backing
+    index the same settings and mappings. Reads go through the same alias,
+    which spans all backing indices. A concrete index already using the
+    alias name is left as it is.
+    """
+    alias = settings.CHAT_MESSAGES_INDEX_NAME
+    policy_name = f"{alias}-policy"
+    max_shard_size = settings.CHAT_MESSAGES_ROLLOVER_MAX_PRIMARY_SHARD_SIZE
+    rollover = {
+        "max_primary_shard_size": max_shard_size,
+        "max_age": settings.CHAT_MESSAGES_ROLLOVER_MAX_AGE,
+    }
+
+    try:
+        await es.ilm.put_lifecycle(
+            name=policy_name,
+            body={"policy": {"phases": {"hot": {"actions": {"rollover": rollover}}}}},
+        )
+        await es.indices.put_index_template(
+            name=f"{alias}-template",
+            body={
+                "index_patterns": [f"{alias}-*"],
+                "template": {
+                    "settings": {
+                        "number_of_shards": settings.CHAT_MESSAGES_INDEX_SHARDS,
+                        "number_of_replicas": settings.ES_NUMBER_OF_REPLICAS,
+                        "index.lifecycle.name": policy_name,
+                        "index.lifecycle.rollover_alias": alias,
+                    },
+                    "mappings": {
+                        "_routing": {"required": True},
                         "properties": {
-                            "id": {"type": "keyword"},
-                            "role": {"type": "keyword"},
-                            "content": {"type": "text"},
-                            "timestamp": {"type": "date"}
-                        }
+                            **MESSAGE_PROPERTIES,
+                            "session_id": {"type": "keyword"},
+                            "user_id": {"type": "integer"},
+                            # Keep sub-millisecond ordering of messages within a session
+                            "timestamp": {"type": "date_nanos"},
+                        },
                     },
-                    "created_at": {"type": "date"},
-                    "updated_at": {"type": "date"}
-                }
-            }
-            es.indices.put_mapping(body=mapping_body, index=index_name)
-            logger.info(f"Added mappings to {index_name}")
+                },
+            },
+        )
+        if not await es.indices.exists(index=alias):
+            index_name = f"{alias}-000001"
+            await es.indices.create(
+                index=index_name, body={"aliases": {alias: {"is_write_index": True}}}
+            )
+            logger.info(f"Created index {index_name} with rollover alias {alias}")
     except Exception as e:
         logger.error(f"Error setting up index: {e}", exc_info=True)
 
 
-def save_chat_session(chat_session: Dict[str, Any]) -> None:
+async def _get_session_messages(
+    es: AsyncElasticsearch, user_id: int, session_ids: List[str]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Load indexed messages for the given sessions of one user, oldest first.
+
+    Past MAX_SESSION_MESSAGES only the newest are loaded, so a very long
+    session keeps its latest turns.
+    """
+    body = {
+        "query": {
+            "bool": {
+                "filter": [
+                    {"terms": {"session_id": session_ids}},
+                    {"term": {"user_id": user_id}},
+                ]
+            }
+        },
+        "sort": [{"timestamp": {"order": "desc"}}],
+        "size": MAX_SESSION_MESSAGES,
+    }
+    result = await es.search(
+        index=settings.CHAT_MESSAGES_INDEX_NAME, body=body, routing=_routing(user_id)
+    )
+    messages: Dict[str, List[Dict[str, Any]]] = {
+        session_id: [] for session_id in session_ids
+    }
+    for hit in reversed(result["hits"]["hits"]):
+        message = hit["_source"]
+        messages.setdefault(message["session_id"], []).append(message)
+    for session_id in session_ids:
+        recent = _recent(session_id)
+        if not recent:
+            continue
+        indexed = messages[session_id]
+        seen = {message["id"] for message in indexed}
+        unseen = [
+            message
+            for message in recent
+            if message["id"] not in seen and message["user_id"] == user_id
+        ]
+        if not unseen:
+            continue
+        if indexed and indexed[-1]["timestamp"] > unseen[0]["timestamp"]:
+            messages[session_id] = sorted(
+                indexed + unseen, key=lambda message: message["timestamp"]
+            )
+        else:
+            # The usual case: the unsearchable writes are the newest ones
+            indexed.extend(unseen)
+    return messages
+
+
+async def save_chat_session(chat_session: Dict[str, Any]) -> None:
     """Save a chat session to Elasticsearch."""
     try:
-        es = get_elasticsearch_client()
+        es = await get_elasticsearch_client()
         if not es:
             logger.error("Elasticsearch client not available")
             raise Exception("Elasticsearch not available")
-            
-        # Use index API for ES 8.x
-        result = es.index(
+
+        # Use index API for ES 8.x. Sessions are created rarely, so wait for
+        # the next scheduled refresh rather than forcing one; that keeps a new
+        # session visible to the listing the client requests next.
+        result = await es.index(
             index=settings.CHAT_INDEX_NAME,
             id=chat_session["session_id"],
             body=chat_session,
-            refresh=True
+            routing=_routing(chat_session["user_id"]),
+            refresh="wait_for",
         )
         logger.info(f"Saved chat session: {result.get('result', 'unknown')}")
     except Exception as e:
@@ -98,84 +395,1002 @@ def save_chat_session(chat_session: Dict[str, Any]) -> None:
         raise
 
 
-def get_chat_sessions_by_user(user_id: int) -> List[Dict[str, Any]]:
-    """Get all chat sessions for a user."""
+async def _restore_archived(
+    es: AsyncElasticsearch, session_id: str, user_id: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Move an archived session back into the indices.
+
+    Returns:
+        The session document, or None if the session is not archived
+    """
+    archive = await read_session_archive(session_id, user_id)
+    if archive is None:
+        return None
+    session = archive["session"]
+    operations: List[Dict[str, Any]] = [
+        {
+            "index": {
+                "_index": settings.CHAT_INDEX_NAME,
+                "_id": session_id,
+                "routing": _routing(user_id),
+            }
+        },
+        session,
+    ]
+    for message in archive["messages"]:
+        operations.append(
+            {
+                "index": {
+                    "_index": settings.CHAT_MESSAGES_INDEX_NAME,
+                    "_id": message["id"],
+                    "routing": _routing(user_id),
+                }
+            }
+        )
+        operations.append({**message, "session_id": session_id, "user_id": user_id})
+    # The caller reads the messages back right away
+    result = await es.bulk(body=operations, refresh="wait_for")
+    if result.get("errors"):
+        errors = [
+            item for item in result["items"] if "error" in next(iter(item.values()))
+        ]
+        raise Exception(f"Restoring archived session {session_id} failed: {errors[:3]}")
+    await delete_session_archive(session_id, user_id)
+    metrics.increment("retention.rehydrated_sessions")
+    logger.info(
+        f"Rehydrated archived session {session_id} with {len(archive['messages'])} "
+        "messages"
+    )
+    return dict(session)
+
+
+async def get_chat_session(session_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Get a specific chat session by its ID.
+
+    Returns None unless the session belongs to user_id. Documents are routed
+    by user_id, but routing only picks the shard, so ownership is checked on
+    the document. A session moved to the archive by the retention job is
+    restored first.
+    """
     try:
-        es = get_elasticsearch_client()
+        es = await get_elasticsearch_client()
         if not es:
-            logger.warning("Elasticsearch client not available for getting chat sessions")
-            return []
-            
-        body = {
-            "query": {
-                "term": {"user_id": user_id}
-            },
-            "sort": [{"updated_at": {"order": "desc"}}],
-            "size": 100
-        }
-        result = es.search(index=settings.CHAT_INDEX_NAME, body=body)
-        return [hit["_source"] for hit in result["hits"]["hits"]]
+            logger.warning(
+                f"Elasticsearch client not available for getting session {session_id}"
+            )
+            return None
+
+        try:
+            result = await es.get(
+                index=settings.CHAT_INDEX_NAME, id=session_id, routing=_routing(user_id)
+            )
+            session = result["_source"]
+        except Exception as not_found_err:
+            if "404" not in str(not_found_err):
+                raise
+            session = await _restore_archived(es, session_id, user_id)
+            if session is None:
+                return None
+        if session.get("user_id") != user_id:
+            return None
+        # Sessions written before the messages index keep their embedded messages
+        indexed = await _get_session_messages(es, user_id, [session_id])
+        session["embedded_message_count"] = len(session.get("messages", []))
+        session["messages"] = session.get("messages", []) + indexed[session_id]
+        return session
     except Exception as e:
-        logger.error(f"Failed to get chat sessions: {e}")
-        return []
+        logger.error(f"Failed to get chat session: {e}")
+        return None
+
 
+async def get_chat_session_meta(
+    session_id: str, user_id: int
+) -> Optional[Dict[str, Any]]:
+    """
+    Get a chat session document without loading its indexed messages.
 
-def get_chat_session(session_id: str) -> Optional[Dict[str, Any]]:
-    """Get a specific chat session by its ID."""
+    ``messages`` only holds messages embedded in sessions written before
+    the messages index, which is empty for every newer session. Returns None
+    unless the session belongs to user_id. An archived session is restored
+    first.
+    """
     try:
-        es = get_elasticsearch_client()
+        es = await get_elasticsearch_client()
         if not es:
-            logger.warning(f"Elasticsearch client not available for getting session {session_id}")
+            logger.warning(
+                f"Elasticsearch client not available for getting session {session_id}"
+            )
             return None
-            
+
         try:
-            result = es.get(index=settings.CHAT_INDEX_NAME, id=session_id)
-            return result["_source"]
+            result = await es.get(
+                index=settings.CHAT_INDEX_NAME,
+                id=session_id,
+                routing=_routing(user_id),
+                _source_excludes=["summary"],
+            )
+            session = result["_source"]
         except Exception as not_found_err:
-            if "404" in str(not_found_err):
+            if "404" not in str(not_found_err):
+                raise
+            session = await _restore_archived(es, session_id, user_id)
+            if session is None:
                 return None
-            raise
+            session.pop("summary", None)
+        if session.get("user_id") != user_id:
+            return None
+        session["embedded_message_count"] = len(session.get("messages", []))
+        return session
     except Exception as e:
         logger.error(f"Failed to get chat session: {e}")
         return None
 
 
-def update_chat_session(session_id: str, update_data: Dict[str, Any]) -> None:
-    """Update fields in a chat session."""
+async def get_chat_message(
+    session_id: str, user_id: int, message_id: str
+) -> Optional[Dict[str, Any]]:
+    """Get one indexed message of a session by its ID."""
+    for message in _recent(session_id):
+        if message["id"] == message_id and message["user_id"] == user_id:
+            return message
     try:
-        es = get_elasticsearch_client()
+        es = await get_elasticsearch_client()
+        if not es:
+            logger.warning(
+                f"Elasticsearch client not available for getting message {message_id}"
+            )
+            return None
+
+        # The alias spans every rollover index, so look the id up with a search
+        body = {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"ids": {"values": [message_id]}},
+                        {"term": {"session_id": session_id}},
+                        {"term": {"user_id": user_id}},
+                    ]
+                }
+            },
+            "size": 1,
+        }
+        result = await es.search(
+            index=settings.CHAT_MESSAGES_INDEX_NAME,
+            body=body,
+            routing=_routing(user_id),
+        )
+        hits = result["hits"]["hits"]
+        return hits[0]["_source"] if hits else None
+    except Exception as e:
+        logger.error(f"Failed to get chat message: {e}")
+        return None
+
+
+async def get_session_messages_page(
+    session_id: str,
+    user_id: int,
+    limit: int,
+    before: Optional[List[str]] = None,
+    after: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Get one page of a session's indexed messages.
+
+    Only the requested page is read from Elasticsearch, so the cost does
+    not depend on the length of the session. Without ``after`` the page is
+    the newest ``limit`` messages before ``before``; with only ``after`` it
+    is the oldest ``limit`` messages following it.
+
+    Messages are ordered by timestamp, then ID, and pages continue from a
+    message with search_after, so messages sharing a timestamp are neither
+    skipped nor repeated.
+
+    Args:
+        session_id: ID of the chat session
+        user_id: ID of the session owner, used for routing
+        limit: Maximum number of messages to return
+        before: Only return messages preceding this ``[timestamp, id]``
+        after: Only return messages following this ``[timestamp, id]``
+
+    Returns:
+        Tuple of the messages in chronological order and whether more
+        messages exist beyond the page in the direction of travel
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        logger.error("Elasticsearch client not available for getting messages")
+        raise Exception("Elasticsearch not available")
+
+    filters: List[Dict[str, Any]] = [
+        {"term": {"session_id": session_id}},
+        {"term": {"user_id": user_id}},
+    ]
+    ascending = bool(after) and not before
+    order = "asc" if ascending else "desc"
+    if before and after:
+        # Paging back from ``before``; ``after`` closes the window
+        timestamp, message_id = after
+        filters.append(
+            {
+                "bool": {
+                    "should": [
+                        {"range": {"timestamp": {"gt": timestamp}}},
+                        {
+                            "bool": {
+                                "filter": [
+                                    {"term": {"timestamp": timestamp}},
+                                    {"range": {"id": {"gt": message_id}}},
+                                ]
+                            }
+                        },
+                    ],
+                    "minimum_should_match": 1,
+                }
+            }
+        )
+    body: Dict[str, Any] = {
+        "query": {"bool": {"filter": filters}},
+        "sort": [
+            # Sort values keep full precision, so search_after takes them back
+            {
+                "timestamp": {
+                    "order": order,
+                    "format": "strict_date_optional_time_nanos",
+                }
+            },
+            {"id": {"order": order}},
+        ],
+        # One extra hit tells us whether there is another page
+        "size": limit + 1,
+    }
+    anchor = after if ascending else before
+    if anchor:
+        body["search_after"] = list(anchor)
+    result = await es.search(
+        index=settings.CHAT_MESSAGES_INDEX_NAME, body=body, routing=_routing(user_id)
+    )
+    messages = [hit["_source"] for hit in result["hits"]["hits"]]
+
+    def position(message: Dict[str, Any]) -> Tuple[str, str]:
+        return message["timestamp"], message["id"]
+
+    seen = {message["id"] for message in messages}
+    for message in _recent(session_id):
+        if message["id"] in seen or message["user_id"] != user_id:
+            continue
+        if (before and position(message) >= tuple(before)) or (
+            after and position(message) <= tuple(after)
+        ):
+            continue
+        messages.append(message)
+    messages.sort(key=position, reverse=not ascending)
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not ascending:
+        messages.reverse()
+    return messages, has_more
+
+
+async def search_user_messages(
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    role: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    search_after: Optional[List[Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+    """
+    Full-text search over one user's messages, best matches first.
+
+    Only the matching message documents are searched and returned, with
+    highlighted fragments of their content; session documents are never
+    loaded.
+
+    Args:
+        user_id: ID of the user whose messages are searched
+        query: Search text
+        limit: Page size
+        role: Optional role filter ("user" or "assistant")
+        start: Only match messages at or after this timestamp
+        end: Only match messages at or before this timestamp
+        search_after: Sort values of the last hit on the previous page
+
+    Returns:
+        Tuple of the hits (message id, session id, role, timestamp, score
+        and highlights) and the sort values to continue from, or None if
+        this is the last page
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        logger.error("Elasticsearch client not available for searching messages")
+        raise Exception("Elasticsearch not available")
+
+    filters: List[Dict[str, Any]] = [{"term": {"user_id": user_id}}]
+    if role:
+        filters.append({"term": {"role": role}})
+    if start or end:
+        bounds = {}
+        if start:
+            bounds["gte"] = start
+        if end:
+            bounds["lte"] = end
+        filters.append({"range": {"timestamp": bounds}})
+    body = {
+        "query": {"bool": {"must": [{"match": {"content": query}}], "filter": filters}},
+        "_source": ["id", "session_id", "role", "timestamp"],
+        "highlight": {
+            "fields": {"content": {"fragment_size": 150, "number_of_fragments": 3}},
+            "pre_tags": ["<mark>"],
+            "post_tags": ["</mark>"],
+        },
+        # Newer messages and then ids break score ties so pages are stable
+        "sort": ["_score", {"timestamp": {"order": "desc"}}, {"id": {"order": "asc"}}],
+        "track_total_hits": False,
+        "size": limit,
+    }
+    if search_after:
+        body["search_after"] = search_after
+    result = await es.search(
+        index=settings.CHAT_MESSAGES_INDEX_NAME, body=body, routing=_routing(user_id)
+    )
+    hits = result["hits"]["hits"]
+    matches = [
+        {
+            "message_id": hit["_source"]["id"],
+            "session_id": hit["_source"]["session_id"],
+            "role": hit["_source"]["role"],
+            "timestamp": hit["_source"]["timestamp"],
+            "score": hit.get("_score"),
+            "highlights": hit.get("highlight", {}).get("content", []),
+        }
+        for hit in hits
+    ]
+    next_search_after = hits[-1]["sort"] if len(hits) == limit else None
+    return matches, next_search_after
+
+
+async def get_session_titles(user_id: int, session_ids: List[str]) -> Dict[str, str]:
+    """Look up the titles of several of a user's chat sessions in one request."""
+    if not session_ids:
+        return {}
+    try:
+        es = await get_elasticsearch_client()
+        if not es:
+            return {}
+
+        result = await es.mget(
+            index=settings.CHAT_INDEX_NAME,
+            body={
+                "docs": [
+                    {"_id": session_id, "routing": _routing(user_id)}
+                    for session_id in session_ids
+                ]
+            },
+            _source_includes=["title"],
+        )
+        return {
+            doc["_id"]: doc["_source"].get("title")
+            for doc in result["docs"]
+            if doc.get("found")
+        }
+    except Exception as e:
+        logger.error(f"Failed to get session titles: {e}")
+        return {}
+
+
+async def append_chat_message(
+    session_id: str, user_id: int, message: Dict[str, Any]
+) -> None:
+    """
+    Append one message to a chat session.
+
+    The message is indexed as its own document and the session only gets a
+    scripted update of its listing stats (message count, preview, last
+    activity), so the write cost does not grow with the length of the
+    conversation. Both go out in a single bulk request.
+
+    No refresh is forced; the message is kept in this worker's recent-writes
+    overlay until the periodic refresh has made it searchable. With the bulk
+    writer running, the write goes out with the next bulk flush and this
+    returns once that flush has stored it.
+    """
+    try:
+        es = await get_elasticsearch_client()
+        if not es:
+            logger.error("Elasticsearch client not available for appending message")
+            raise Exception("Elasticsearch not available")
+
+        document = {**message, "session_id": session_id, "user_id": user_id}
+        operations = [
+            {
+                "create": {
+                    "_index": settings.CHAT_MESSAGES_INDEX_NAME,
+                    "_id": message["id"],
+                    "routing": _routing(user_id),
+                }
+            },
+            document,
+            {
+                "update": {
+                    "_index": settings.CHAT_INDEX_NAME,
+                    "_id": session_id,
+                    "routing": _routing(user_id),
+                    "retry_on_conflict": 3,
+                }
+            },
+            {
+                "script": {
+                    "source": APPEND_STATS_SCRIPT,
+                    "lang": "painless",
+                    "params": {
+                        "message_id": message["id"],
+                        "preview": message["content"][:PREVIEW_CHARS],
+                        "timestamp": message["timestamp"],
+                    },
+                }
+            },
+        ]
+        if bulk_writer.running:
+            # Resolves once the flush has stored both actions
+            await (await bulk_writer.submit(operations))
+        else:
+            result = await es.bulk(body=operations)
+            errors = failed_items(result)
+            if errors:
+                raise Exception(f"Bulk append failed: {errors}")
+        _remember_recent(session_id, document)
+        logger.info(f"Appended message {message['id']} to chat session {session_id}")
+    except Exception as e:
+        logger.error(f"Failed to append chat message: {e}")
+        raise
+
+
+async def update_chat_session(
+    session_id: str, user_id: int, update_data: Dict[str, Any]
+) -> bool:
+    """
+    Update fields in a chat session.
+
+    Returns:
+        False if the session document does not exist (e.g. it is archived)
+    """
+    try:
+        es = await get_elasticsearch_client()
         if not es:
             logger.error("Elasticsearch client not available for updating")
             raise Exception("Elasticsearch not available")
-            
+
+        body = {"doc": update_data}
+        # Reads by id are realtime, so no refresh is needed here
+        try:
+            result = await es.update(
+                index=settings.CHAT_INDEX_NAME,
+                id=session_id,
+                body=body,
+                routing=_routing(user_id),
+            )
+        except Exception as not_found_err:
+            if "404" not in str(not_found_err):
+                raise
+            return False
+        logger.info(f"Updated chat session: {result.get('result', 'unknown')}")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to update chat session: {e}")
+        raise
+
+
+async def increment_session_usage(
+    session_id: str, user_id: int, usage: Dict[str, int], message_id: str
+) -> None:
+    """
+    Add token usage from one turn to a chat session's running totals.
+
+    Args:
+        message_id: Assistant message the usage belongs to; usage already
+            added for it is not added again
+    """
+    try:
+        es = await get_elasticsearch_client()
+        if not es:
+            logger.error("Elasticsearch client not available for updating usage")
+            raise Exception("Elasticsearch not available")
+
         body = {
-            "doc": update_data
+            "script": {
+                "source": USAGE_SCRIPT,
+                "lang": "painless",
+                "params": {"usage": usage, "message_id": message_id},
+            }
         }
-        result = es.update(
+        if bulk_writer.running:
+            await (
+                await bulk_writer.submit(
+                    [
+                        {
+                            "update": {
+                                "_index": settings.CHAT_INDEX_NAME,
+                                "_id": session_id,
+                                "routing": _routing(user_id),
+                                "retry_on_conflict": 3,
+                            }
+                        },
+                        body,
+                    ]
+                )
+            )
+            return
+        await es.update(
             index=settings.CHAT_INDEX_NAME,
             id=session_id,
             body=body,
-            refresh=True
+            routing=_routing(user_id),
+            retry_on_conflict=3,
         )
-        logger.info(f"Updated chat session: {result.get('result', 'unknown')}")
     except Exception as e:
-        logger.error(f"Failed to update chat session: {e}")
+        logger.error(f"Failed to update chat session usage: {e}")
         raise
 
 
-def delete_chat_session(session_id: str) -> bool:
-    """Delete a chat session."""
+async def delete_chat_session(session_id: str, user_id: int) -> bool:
+    """
+    Delete a chat session and its messages.
+
+    A session document that is already gone (e.g. the session was archived)
+    counts as deleted; its messages are still removed.
+
+    Returns:
+        False if the deletion failed
+    """
     try:
-        es = get_elasticsearch_client()
+        es = await get_elasticsearch_client()
         if not es:
             logger.error("Elasticsearch client not available for deletion")
             return False
-            
-        result = es.delete(index=settings.CHAT_INDEX_NAME, id=session_id, refresh=True)
+
+        # Queued writes for this session must land before it is deleted
+        await bulk_writer.drain()
+        try:
+            # Wait for the refresh so the session drops out of the listing
+            result = await es.delete(
+                index=settings.CHAT_INDEX_NAME,
+                id=session_id,
+                routing=_routing(user_id),
+                refresh="wait_for",
+            )
+        except Exception as not_found_err:
+            if "404" not in str(not_found_err):
+                raise
+            result = {"result": "not_found"}
+        _recent_messages.delete(session_id)
+        await es.delete_by_query(
+            index=settings.CHAT_MESSAGES_INDEX_NAME,
+            body={"query": {"term": {"session_id": session_id}}},
+            routing=_routing(user_id),
+            conflicts="proceed",
+        )
         logger.info(f"Deleted chat session: {result.get('result', 'unknown')}")
         return True
     except Exception as e:
-        if "404" in str(e):
-            return False
         logger.error(f"Failed to delete chat session: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def scan_documents(
+    index: str,
+    user_id: Optional[int] = None,
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+    query: Optional[Dict[str, Any]] = None,
+    source_includes: Optional[List[str]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream every document of an index, or one user's, in constant memory.
+
+    Pages through a point-in-time with search_after, so documents written
+    while the scan runs neither shift pages nor show up twice.
+
+    Args:
+        index: Index or alias to read
+        user_id: Only this user's documents (routed to their shard), or all
+        batch_size: Documents fetched per request
+        query: Only documents matching this query
+        source_includes: Only these source fields
+
+    Yields:
+        Document sources
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+
+    pit_kwargs: Dict[str, Any] = {
+        "index": index,
+        "keep_alive": settings.EXPORT_PIT_KEEP_ALIVE,
+    }
+    filters: List[Dict[str, Any]] = [query] if query else []
+    if user_id is not None:
+        pit_kwargs["routing"] = _routing(user_id)
+        filters.append({"term": {"user_id": user_id}})
+    query = {"bool": {"filter": filters}} if filters else {"match_all": {}}
+    pit_id = (await es.open_point_in_time(**pit_kwargs))["id"]
+    try:
+        search_after = None
+        while True:
+            body: Dict[str, Any] = {
+                "query": query,
+                "pit": {"id": pit_id, "keep_alive": settings.EXPORT_PIT_KEEP_ALIVE},
+                # Cheapest total order over a point-in-time
+                "sort": [{"_shard_doc": "asc"}],
+                "size": batch_size,
+                "track_total_hits": False,
+            }
+            if source_includes is not None:
+                body["_source"] = source_includes
+            if search_after:
+                body["search_after"] = search_after
+            result = await es.search(body=body)
+            pit_id = result.get("pit_id", pit_id)
+            hits = result["hits"]["hits"]
+            for hit in hits:
+                yield hit["_source"]
+            if len(hits) < batch_size:
+                return
+            search_after = hits[-1]["sort"]
+    finally:
+        try:
+            await es.close_point_in_time(body={"id": pit_id})
+        except Exception as e:
+            logger.warning(f"Failed to close point in time: {e}")
+
+
+async def import_documents(
+    index: str, documents: List[Dict[str, Any]], id_field: str, op_type: str = "index"
+) -> Dict[str, Any]:
+    """
+    Write a batch of exported documents through one _bulk request.
+
+    Each document is routed by its user_id, like the application's own
+    writes. The request is retried with backoff if it fails as a whole.
+
+    Args:
+        index: Index or alias to write to
+        documents: Document sources
+        id_field: Source field holding the document ID
+        op_type: "index" to overwrite, "create" to keep existing documents
+
+    Returns:
+        Dict with the number of documents ``written`` and ``existing``
+        (create conflicts), and the IDs of ``failed`` ones
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+
+    operations: List[Dict[str, Any]] = []
+    for document in documents:
+        operations.append(
+            {
+                op_type: {
+                    "_index": index,
+                    "_id": document[id_field],
+                    "routing": _routing(document["user_id"]),
+                }
+            }
+        )
+        operations.append(document)
+
+    for attempt in range(settings.ES_BULK_MAX_RETRIES + 1):
+        try:
+            result = await es.bulk(body=operations)
+            break
+        except Exception as e:
+            if attempt >= settings.ES_BULK_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt, 0.5, 5.0)
+            logger.warning(
+                f"Import bulk request failed ({e}), retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+    stats: Dict[str, Any] = {"written": 0, "existing": 0, "failed": []}
+    for item in result["items"]:
+        outcome = next(iter(item.values()))
+        if "error" not in outcome:
+            stats["written"] += 1
+        elif outcome.get("status") == 409:
+            stats["existing"] += 1
+        else:
+            if not stats["failed"]:
+                logger.error(
+                    f"Import of document {outcome['_id']} failed: {outcome['error']}"
+                )
+            stats["failed"].append(outcome["_id"])
+    if stats["failed"]:
+        logger.error(
+            f"{len(stats['failed'])} of {len(documents)} imported documents failed"
+        )
+    return stats
+
+
+async def iter_session_user_ids(
+    batch_size: int = settings.EXPORT_BATCH_SIZE,
+) -> AsyncIterator[int]:
+    """Yield every user ID that owns at least one session, in ascending order."""
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+
+    after_key = None
+    while True:
+        composite: Dict[str, Any] = {
+            "size": batch_size,
+            "sources": [{"user_id": {"terms": {"field": "user_id"}}}],
+        }
+        if after_key:
+            composite["after"] = after_key
+        result = await es.search(
+            index=settings.CHAT_INDEX_NAME,
+            body={"size": 0, "aggs": {"users": {"composite": composite}}},
+        )
+        users = result["aggregations"]["users"]
+        for bucket in users["buckets"]:
+            yield bucket["key"]["user_id"]
+        after_key = users.get("after_key")
+        if not after_key or len(users["buckets"]) < batch_size:
+            return
+
+
+async def delete_sessions(sessions: List[Dict[str, Any]]) -> int:
+    """
+    Delete session documents that have no indexed messages.
+
+    Args:
+        sessions: Documents with ``session_id`` and ``user_id``
+
+    Returns:
+        Number of sessions deleted
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+    operations = [
+        {
+            "delete": {
+                "_index": settings.CHAT_INDEX_NAME,
+                "_id": session["session_id"],
+                "routing": _routing(session["user_id"]),
+            }
+        }
+        for session in sessions
+    ]
+    result = await es.bulk(body=operations)
+    return sum(
+        1 for item in result["items"] if item["delete"].get("result") == "deleted"
+    )
+
+
+async def get_sessions_for_archive(
+    sessions: List[Dict[str, Any]],
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    Load sessions with all of their messages, to move them to the archive.
+
+    Sessions that no longer exist are left out; archived ones are not
+    restored.
+
+    Args:
+        sessions: Documents with ``session_id`` and ``user_id``
+
+    Returns:
+        (session, key) pairs. The key holds the version the session was read
+        at; pass it to delete_archived_sessions so that a session written to
+        since is not deleted.
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+    # Queued writes land first, so they are either archived or change the version
+    await bulk_writer.drain()
+    result = await es.mget(
+        index=settings.CHAT_INDEX_NAME,
+        body={
+            "docs": [
+                {"_id": session["session_id"], "routing": _routing(session["user_id"])}
+                for session in sessions
+            ]
+        },
+    )
+    found = [doc for doc in result["docs"] if doc.get("found")]
+    if not found:
+        return []
+    # Every message, not just the newest MAX_SESSION_MESSAGES: whatever is
+    # left out would be deleted with the session
+    indexed: Dict[str, List[Dict[str, Any]]] = {doc["_id"]: [] for doc in found}
+    query = {"terms": {"session_id": list(indexed)}}
+    async for message in scan_documents(settings.CHAT_MESSAGES_INDEX_NAME, query=query):
+        indexed[message["session_id"]].append(message)
+    loaded = []
+    for doc in found:
+        session = doc["_source"]
+        session_id = doc["_id"]
+        messages = sorted(indexed[session_id], key=lambda message: message["timestamp"])
+        # Sessions written before the messages index keep their embedded messages
+        session["messages"] = session.get("messages", []) + messages
+        key = {
+            "session_id": session_id,
+            "user_id": session["user_id"],
+            "if_seq_no": doc["_seq_no"],
+            "if_primary_term": doc["_primary_term"],
+        }
+        loaded.append((session, key))
+    return loaded
+
+
+async def delete_archived_sessions(keys: List[Dict[str, Any]]) -> List[str]:
+    """
+    Delete archived sessions and their messages, unless written to since.
+
+    Each session document is only deleted at the version it was archived
+    at; the messages of the sessions that were deleted then go in one
+    delete_by_query.
+
+    Args:
+        keys: Keys as returned by get_sessions_for_archive
+
+    Returns:
+        IDs of the sessions deleted
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+    operations = [
+        {
+            "delete": {
+                "_index": settings.CHAT_INDEX_NAME,
+                "_id": key["session_id"],
+                "routing": _routing(key["user_id"]),
+                "if_seq_no": key["if_seq_no"],
+                "if_primary_term": key["if_primary_term"],
+            }
+        }
+        for key in keys
+    ]
+    result = await es.bulk(body=operations)
+    deleted = [
+        key
+        for key, item in zip(keys, result["items"])
+        if item["delete"].get("result") == "deleted"
+    ]
+    if not deleted:
+        return []
+    session_ids = [key["session_id"] for key in deleted]
+    await es.delete_by_query(
+        index=settings.CHAT_MESSAGES_INDEX_NAME,
+        body={
+            "query": {
+                "bool": {
+                    "filter": [
+                        {"terms": {"session_id": session_ids}},
+                        {
+                            "terms": {
+                                "user_id": sorted({key["user_id"] for key in deleted})
+                            }
+                        },
+                    ]
+                }
+            }
+        },
+        conflicts="proceed",
+    )
+    for session_id in session_ids:
+        _recent_messages.delete(session_id)
+    return session_ids
+
+
+async def delete_user_documents(user_ids: List[int]) -> int:
+    """
+    Delete every session and message of the given users.
+
+    Runs as background delete_by_query tasks, sliced and throttled like
+    start_user_delete, and polls them until they finish.
+
+    Returns:
+        Number of documents deleted
+
+    Raises:
+        Exception: If a task failed, so the caller keeps its own records
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+    tasks = []
+    for index in (settings.CHAT_INDEX_NAME, settings.CHAT_MESSAGES_INDEX_NAME):
+        result = await es.delete_by_query(
+            index=index,
+            body={"query": {"terms": {"user_id": user_ids}}},
+            conflicts="proceed",
+            slices="auto",
+            scroll_size=settings.ADMIN_PURGE_SCROLL_SIZE,
+            requests_per_second=settings.ADMIN_PURGE_REQUESTS_PER_SECOND,
+            wait_for_completion=False,
+        )
+        tasks.append(result["task"])
+    deleted = 0
+    for task_id in tasks:
+        while True:
+            task = await get_task(task_id)
+            if task is None:
+                raise Exception(f"Delete task {task_id} not found")
+            if task.get("completed"):
+                break
+            await asyncio.sleep(TASK_POLL_INTERVAL)
+        response = task.get("response") or {}
+        if task.get("error") or response.get("failures"):
+            raise Exception(
+                f"Delete task {task_id} failed: "
+                f"{task.get('error') or response['failures'][0]}"
+            )
+        deleted += response.get("deleted", 0)
+    return deleted
+
+
+async def start_user_delete(user_id: int) -> Dict[str, str]:
+    """
+    Start deleting all of a user's sessions and messages in the background.
+
+    Runs one delete_by_query task per index, confined to the user's shard by
+    routing, sliced and throttled to ADMIN_PURGE_REQUESTS_PER_SECOND so a
+    large purge does not starve live traffic.
+
+    Returns:
+        Elasticsearch task IDs, by ``sessions`` and ``messages``
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+
+    # Queued writes for this user must not land after the purge
+    await bulk_writer.drain()
+    tasks = {}
+    for name, index in (
+        ("sessions", settings.CHAT_INDEX_NAME),
+        ("messages", settings.CHAT_MESSAGES_INDEX_NAME),
+    ):
+        result = await es.delete_by_query(
+            index=index,
+            body={"query": {"term": {"user_id": user_id}}},
+            routing=_routing(user_id),
+            conflicts="proceed",
+            slices="auto",
+            scroll_size=settings.ADMIN_PURGE_SCROLL_SIZE,
+            requests_per_second=settings.ADMIN_PURGE_REQUESTS_PER_SECOND,
+            wait_for_completion=False,
+        )
+        tasks[name] = result["task"]
+    logger.info(f"Started purge of user {user_id}: {tasks}")
+    return tasks
+
+
+async def get_task(task_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the state of a background Elasticsearch task.
+
+    Args:
+        task_id: Task ID as returned when the task was started
+
+    Returns:
+        The tasks API response, or None if there is no such task
+    """
+    es = await get_elasticsearch_client()
+    if not es:
+        raise Exception("Elasticsearch not available")
+    try:
+        return dict(await es.tasks.get(task_id=task_id))
+    except Exception as e:
+        if "404" in str(e):
+            return None
+        raise
@@ -1,6 +1,11 @@
-from sqlalchemy import create_engine
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, func, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+
 from app.core.config import settings
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
@@ -8,10 +13,46 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
 # Database dependency
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@asynccontextmanager
+async def try_advisory_lock(key: int) -> AsyncIterator[bool]:
+    """
+    Hold a PostgreSQL session-level advisory lock if no one else does.
+
+    The lock lives on a dedicated connection for the duration of the block,
+    so it is shared by every worker and instance using the database.
+
+    Args:
+        key: Application-chosen lock ID
+
+    Yields:
+        Whether the lock was acquired
+    """
+    conn = await asyncio.to_thread(engine.connect)
+    acquired = False
+    try:
+        acquired = bool(
+            await asyncio.to_thread(
+                lambda: conn.execute(select(func.pg_try_advisory_lock(key))).scalar()
+            )
+        )
+        yield acquired
+    finally:
+        try:
+            if acquired:
+                await asyncio.to_thread(
+                    lambda: conn.execute(select(func.pg_advisory_unlock(key)))
+                )
+        except Exception:
+            # Don't return a connection that may still hold the lock to the pool
+            conn.invalidate()
+        await asyncio.to_thread(conn.close)
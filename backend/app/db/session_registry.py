@@ -0,0 +1,393 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.db.elasticsearch import PREVIEW_CHARS
+from app.db.postgresql import SessionLocal
+from app.models.chat import ChatMessage, ChatSession
+from app.models.user import User
+
+# Relational index of chat sessions and messages in PostgreSQL. Content lives
+# in Elasticsearch; these rows carry ownership and the listing stats, so
+# authorization checks and the sidebar never have to touch Elasticsearch.
+# SQLAlchemy is synchronous here, so each call runs in a worker thread.
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """Parse the naive UTC ISO timestamps used in Elasticsearch documents."""
+    if value is None or isinstance(value, datetime):
+        return value
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def session_row_values(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Column values for a session document's chat_sessions row."""
+    return {
+        "session_id": session["session_id"],
+        "user_id": session["user_id"],
+        "title": session.get("title"),
+        "message_count": session.get("message_count") or 0,
+        "last_message_preview": session.get("last_message_preview"),
+        "last_activity": _to_datetime(session.get("last_activity")),
+        "created_at": _to_datetime(session.get("created_at")),
+        "updated_at": _to_datetime(
+            session.get("updated_at") or session.get("created_at")
+        ),
+    }
+
+
+def _register_session(session: Dict[str, Any]) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            insert(ChatSession)
+            .values(**session_row_values(session))
+            .on_conflict_do_nothing(index_elements=["session_id"])
+        )
+        db.commit()
+
+
+def _record_message(session: Dict[str, Any], message: Dict[str, Any]) -> None:
+    timestamp = _to_datetime(message["timestamp"])
+    preview = message["content"][:PREVIEW_CHARS]
+    with SessionLocal() as db:
+        # Sessions created before this table was written are registered on
+        # their first new message, with the count the caller already has
+        row_id = db.execute(
+            insert(ChatSession)
+            .values(**session_row_values(session))
+            .on_conflict_do_update(
+                index_elements=["session_id"],
+                set_={
+                    "message_count": ChatSession.message_count + 1,
+                    "last_message_preview": preview,
+                    "last_activity": timestamp,
+                    "updated_at": timestamp,
+                },
+            )
+            .returning(ChatSession.id)
+        ).scalar_one()
+        db.execute(
+            insert(ChatMessage)
+            .values(
+                message_id=message["id"],
+                session_id=row_id,
+                role=message["role"],
+                content_preview=preview,
+                timestamp=timestamp,
+            )
+            .on_conflict_do_nothing(index_elements=["message_id"])
+        )
+        db.commit()
+
+
+def _register_sessions(sessions: List[Dict[str, Any]]) -> None:
+    with SessionLocal() as db:
+        db.execute(
+            insert(ChatSession)
+            .values([session_row_values(session) for session in sessions])
+            .on_conflict_do_nothing(index_elements=["session_id"])
+        )
+        db.commit()
+
+
+def _register_messages(messages: List[Dict[str, Any]]) -> int:
+    session_ids = {message["session_id"] for message in messages}
+    with SessionLocal() as db:
+        row_ids = dict(
+            db.execute(
+                select(ChatSession.session_id, ChatSession.id).where(
+                    ChatSession.session_id.in_(session_ids)
+                )
+            ).all()
+        )
+        rows = [
+            {
+                "message_id": message["id"],
+                "session_id": row_ids[message["session_id"]],
+                "role": message["role"],
+                "content_preview": message["content"][:PREVIEW_CHARS],
+                "timestamp": _to_datetime(message["timestamp"]),
+            }
+            for message in messages
+            if message["session_id"] in row_ids
+        ]
+        if rows:
+            db.execute(
+                insert(ChatMessage)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["message_id"])
+            )
+            db.commit()
+        return len(messages) - len(rows)
+
+
+def _update_session(session_id: str, data: Dict[str, Any]) -> bool:
+    values = {key: data[key] for key in ("title", "is_active") if key in data}
+    if not values:
+        return True
+    values["updated_at"] = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        result = db.execute(
+            update(ChatSession)
+            .where(ChatSession.session_id == session_id)
+            .values(**values)
+        )
+        db.commit()
+        return result.rowcount > 0
+
+
+def _delete_session(session_id: str) -> bool:
+    with SessionLocal() as db:
+        row_id = db.execute(
+            select(ChatSession.id).where(ChatSession.session_id == session_id)
+        ).scalar_one_or_none()
+        if row_id is None:
+            return False
+        db.execute(delete(ChatMessage).where(ChatMessage.session_id == row_id))
+        db.execute(delete(ChatSession).where(ChatSession.id == row_id))
+        db.commit()
+        return True
+
+
+def _delete_sessions_where(condition: Any) -> int:
+    with SessionLocal() as db:
+        row_ids = select(ChatSession.id).where(condition).scalar_subquery()
+        db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(row_ids)))
+        result = db.execute(delete(ChatSession).where(condition))
+        db.commit()
+        return result.rowcount
+
+
+def _purge_user(user_id: int, batch_size: int) -> int:
+    purged = 0
+    while True:
+        # Short transactions, so a large purge doesn't hold locks for long
+        with SessionLocal() as db:
+            row_ids = list(
+                db.execute(
+                    select(ChatSession.id)
+                    .where(ChatSession.user_id == user_id)
+                    .limit(batch_size)
+                ).scalars()
+            )
+            if not row_ids:
+                return purged
+            db.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(row_ids)))
+            db.execute(delete(ChatSession).where(ChatSession.id.in_(row_ids)))
+            db.commit()
+        purged += len(row_ids)
+
+
+def _existing_user_ids(user_ids: List[int]) -> Set[int]:
+    with SessionLocal() as db:
+        return set(db.execute(select(User.id).where(User.id.in_(user_ids))).scalars())
+
+
+def _get_session_owner(session_id: str) -> Optional[int]:
+    with SessionLocal() as db:
+        return db.execute(
+            select(ChatSession.user_id).where(ChatSession.session_id == session_id)
+        ).scalar_one_or_none()
+
+
+def _session_version(session_id: str) -> Optional[Tuple[int, Optional[datetime]]]:
+    with SessionLocal() as db:
+        row = db.execute(
+            select(ChatSession.message_count, ChatSession.updated_at).where(
+                ChatSession.session_id == session_id
+            )
+        ).one_or_none()
+        return (row.message_count, row.updated_at) if row else None
+
+
+def _list_user_sessions(
+    user_id: int, limit: int, after: Optional[Tuple[datetime, int]]
+) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+    query = select(ChatSession).where(ChatSession.user_id == user_id)
+    if after is not None:
+        query = query.where(tuple_(ChatSession.updated_at, ChatSession.id) < after)
+    query = query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).limit(
+        limit
+    )
+    with SessionLocal() as db:
+        rows = db.execute(query).scalars().all()
+    sessions = [
+        {
+            "session_id": row.session_id,
+            "user_id": row.user_id,
+            "title": row.title,
+            "message_count": row.message_count,
+            "last_message_preview": row.last_message_preview,
+            "last_activity": row.last_activity,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+        }
+        for row in rows
+    ]
+    next_after = None
+    if len(rows) == limit:
+        next_after = [rows[-1].updated_at.isoformat(), rows[-1].id]
+    return sessions, next_after
+
+
+async def register_chat_session(session: Dict[str, Any]) -> None:
+    """
+    Add a new session to the relational index.
+
+    Args:
+        session: Session document as written to Elasticsearch
+    """
+    await asyncio.to_thread(_register_session, session)
+
+
+async def record_chat_message(session: Dict[str, Any], message: Dict[str, Any]) -> None:
+    """
+    Record one appended message and bump its session's listing stats.
+
+    Args:
+        session: Session the message belongs to
+        message: The appended message
+    """
+    await asyncio.to_thread(_record_message, session, message)
+
+
+async def register_chat_sessions(sessions: List[Dict[str, Any]]) -> None:
+    """
+    Add a batch of imported sessions, with their stats as exported.
+
+    Args:
+        sessions: Session documents; ones already registered are skipped
+    """
+    await asyncio.to_thread(_register_sessions, sessions)
+
+
+async def register_chat_messages(messages: List[Dict[str, Any]]) -> int:
+    """
+    Add rows for a batch of imported messages without touching session stats.
+
+    Args:
+        messages: Message documents; ones already registered are skipped
+
+    Returns:
+        Number of messages skipped because their session is not registered
+    """
+    return await asyncio.to_thread(_register_messages, messages)
+
+
+async def update_registered_session(session_id: str, data: Dict[str, Any]) -> bool:
+    """
+    Apply the relational fields (title, is_active) of a session update.
+
+    Returns:
+        False if the session is not in the index
+    """
+    return await asyncio.to_thread(_update_session, session_id, data)
+
+
+async def delete_registered_session(session_id: str) -> bool:
+    """
+    Remove a session and its message rows from the index.
+
+    Returns:
+        False if the session is not in the index
+    """
+    return await asyncio.to_thread(_delete_session, session_id)
+
+
+async def delete_registered_sessions(session_ids: List[str]) -> int:
+    """
+    Remove a batch of sessions and their message rows from the index.
+
+    Returns:
+        Number of sessions removed
+    """
+    return await asyncio.to_thread(
+        _delete_sessions_where, ChatSession.session_id.in_(session_ids)
+    )
+
+
+async def delete_user_sessions(user_ids: List[int]) -> int:
+    """
+    Remove every session of the given users from the index.
+
+    Returns:
+        Number of sessions removed
+    """
+    return await asyncio.to_thread(
+        _delete_sessions_where, ChatSession.user_id.in_(user_ids)
+    )
+
+
+async def purge_user_sessions(user_id: int, batch_size: int = 1000) -> int:
+    """
+    Remove all of a user's sessions and message rows, a batch at a time.
+
+    Returns:
+        Number of sessions removed
+    """
+    return await asyncio.to_thread(_purge_user, user_id, batch_size)
+
+
+async def existing_user_ids(user_ids: List[int]) -> Set[int]:
+    """The subset of user_ids that still have an account."""
+    return await asyncio.to_thread(_existing_user_ids, user_ids)
+
+
+async def get_session_owner(session_id: str) -> Optional[int]:
+    """
+    Look up who owns a session.
+
+    Returns:
+        The owner's user ID, or None if the session is not in the index
+    """
+    return await asyncio.to_thread(_get_session_owner, session_id)
+
+
+async def session_is_current(session: Dict[str, Any]) -> bool:
+    """
+    Whether a session copy still matches its registered listing stats.
+
+    Every appended message and title change moves the row's message count
+    or update time, so a copy that matches both has missed no writes.
+    """
+    version = await asyncio.to_thread(_session_version, session["session_id"])
+    if version is None:
+        return False
+    message_count, updated_at = version
+    return message_count == (
+        session.get("message_count") or 0
+    ) and updated_at == _to_datetime(session.get("updated_at"))
+
+
+async def list_user_sessions(
+    user_id: int, limit: int = 50, search_after: Optional[List[Any]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[List[Any]]]:
+    """
+    List a user's sessions, most recently updated first.
+
+    Served by the (user_id, updated_at) index with keyset pagination.
+
+    Args:
+        user_id: Owner of the sessions
+        limit: Page size
+        search_after: Sort values of the last session on the previous page
+
+    Returns:
+        The page of sessions and the sort values to continue from, or None
+        after the last page
+
+    Raises:
+        ValueError: If search_after is not a pair of sort values from a previous page
+    """
+    after = None
+    if search_after is not None:
+        try:
+            updated_at, row_id = search_after
+            after = (datetime.fromisoformat(updated_at), int(row_id))
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+    return await asyncio.to_thread(_list_user_sessions, user_id, limit, after)
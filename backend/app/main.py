@@ -1,15 +1,23 @@
 import logging
+
 from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.exceptions import RequestValidationError
-from app.api import auth, chat, websockets
-from app.core.config import settings
-from app.core.logging import setup_logging
-from app.db.elasticsearch import get_elasticsearch_client
 
 # Import models package first to ensure relationships are set up
 import app.models
+from app.api import admin, auth, chat, websockets
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.passwords import password_hasher
+from app.db.bulk import bulk_writer
+from app.db.elasticsearch import close_elasticsearch, init_elasticsearch
+from app.services.chat import chat_service
+from app.services.claude import claude_service
+from app.services.purge import user_history_purge
+from app.services.retention import retention_job
+from app.utils import metrics
 
 # Set up logging
 setup_logging()
@@ -46,11 +54,19 @@ app.include_router(
     prefix=f"{settings.API_V1_STR}/chat",
     tags=["websockets"],
 )
+app.include_router(
+    admin.router,
+    prefix=f"{settings.API_V1_STR}/admin",
+    tags=["admin"],
+)
 
 # Log available routes for debugging
 for route in app.routes:
-    logger.info(f"Available route: {route.path} [{', '.join(route.methods) if hasattr(route, 'methods') else 'WebSocket'}]")
-    
+    logger.info(
+        f"Available route: {route.path} "
+        f"[{', '.join(route.methods) if hasattr(route, 'methods') else 'WebSocket'}]"
+    )
+
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
@@ -71,6 +87,14 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """
+    In-process counters for this worker.
+    """
+    return metrics.snapshot()
+
+
 @app.on_event("startup")
 async def startup_event():
     """
@@ -79,12 +103,22 @@ async def startup_event():
     logger.info("Starting up application")
     # Initialize Elasticsearch
     try:
-        es_client = get_elasticsearch_client()
-        logger.info("Connected to Elasticsearch")
+        es_client = await init_elasticsearch()
+        if es_client:
+            logger.info("Connected to Elasticsearch")
+            if settings.ES_BULK_ENABLED:
+                bulk_writer.start(es_client)
+            if settings.RETENTION_ENABLED:
+                retention_job.start()
     except Exception as e:
         logger.error(f"Error connecting to Elasticsearch: {e}")
         # Continue anyway - the application can work without Elasticsearch
 
+    # Open the pooled Claude API client shared by all requests on this worker
+    await claude_service.startup()
+    # Spawn the bcrypt processes now rather than on the first login
+    password_hasher.start()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -92,8 +126,19 @@ async def shutdown_event():
     Run on application shutdown.
     """
     logger.info("Shutting down application")
+    await retention_job.close()
+    await user_history_purge.close()
+    # Let turns finish persisting, then flush buffered chat writes before the
+    # client goes away. Background summaries still call Claude, so its client
+    # closes after them.
+    await chat_service.close()
+    await claude_service.close()
+    password_hasher.close()
+    await bulk_writer.close()
+    await close_elasticsearch()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.sql import func
 
 from app.db.postgresql import Base
@@ -7,33 +16,46 @@ from app.db.postgresql import Base
 class ChatSession(Base):
     """
     SQLAlchemy model for a chat session.
-    
+
     Note: While chat sessions and messages are primarily stored in Elasticsearch,
     we maintain a lightweight reference table in PostgreSQL for relational queries,
-    access control, and to handle cases where Elasticsearch might be temporarily unavailable.
+    access control, and to handle cases where Elasticsearch might be temporarily
+    unavailable.
     """
+
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Serves the per-user listing, newest first
+        Index("ix_chat_sessions_user_id_updated_at", "user_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
+    # Listing stats, kept in step with the session document in Elasticsearch
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_preview = Column(Text, nullable=True)
+    last_activity = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships are set in __init__.py
     # user = relationship("User", back_populates="chat_sessions")
-    # messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
+    # messages = relationship(
+    #     "ChatMessage", back_populates="session", cascade="all, delete-orphan"
+    # )
 
 
 class ChatMessage(Base):
     """
     SQLAlchemy model for individual chat messages.
-    
+
     This model maintains a reference to messages stored in Elasticsearch,
     but doesn't store the full message content to avoid duplication.
     """
+
     __tablename__ = "chat_messages"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -45,4 +67,4 @@ class ChatMessage(Base):
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationship is set in __init__.py
-    # session = relationship("ChatSession", back_populates="messages")
\ No newline at end of file
+    # session = relationship("ChatSession", back_populates="messages")
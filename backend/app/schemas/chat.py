@@ -1,5 +1,6 @@
-from typing import List, Optional, Dict, Any
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -15,7 +16,11 @@ class MessageCreate(MessageBase):
 class Message(MessageBase):
     id: str
     timestamp: datetime
-    
+    token_count: Optional[int] = None
+    usage: Optional[Dict[str, int]] = None
+    model: Optional[str] = None
+    routing: Optional[Dict[str, str]] = None
+
     class Config:
         from_attributes = True
 
@@ -38,14 +43,39 @@ class ChatSession(ChatSessionBase):
     created_at: datetime
     updated_at: datetime
     messages: List[Message] = []
-    
+    usage: Optional[Dict[str, int]] = None
+    message_count: Optional[int] = None
+    last_message_preview: Optional[str] = None
+    last_activity: Optional[datetime] = None
+
     class Config:
         from_attributes = True
         validate_by_name = True  # Required for alias to work
 
+
+class ChatSessionSummary(ChatSessionBase):
+    """A session as shown in the listing, without its messages."""
+
+    id: str = Field(..., alias="session_id")
+    user_id: int
+    created_at: datetime
+    updated_at: datetime
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    last_activity: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+        validate_by_name = True
+
+
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
+    # Client-generated id; resends with the same id are deduplicated
+    client_message_id: Optional[str] = Field(None, max_length=128)
+    # Optional model tier hint: "fast" or "strong"
+    model_hint: Optional[str] = None
 
 
 class ChatResponse(BaseModel):
@@ -53,5 +83,29 @@ class ChatResponse(BaseModel):
     session_id: str
 
 
+class MessagePage(BaseModel):
+    # Chronological; pass the first id as ?before= or the last as ?after=
+    messages: List[Message] = []
+    has_more: bool = False
+
+
+class MessageSearchHit(BaseModel):
+    message_id: str
+    session_id: str
+    session_title: Optional[str] = None
+    role: str
+    timestamp: datetime
+    score: Optional[float] = None
+    # Matching fragments of the content, terms wrapped in <mark></mark>
+    highlights: List[str] = []
+
+
+class MessageSearchResults(BaseModel):
+    results: List[MessageSearchHit] = []
+    next_cursor: Optional[str] = None
+
+
 class ChatHistory(BaseModel):
-    sessions: List[ChatSession] = []
\ No newline at end of file
+    sessions: List[ChatSessionSummary] = []
+    # Pass back as ?cursor= to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
@@ -1,53 +1,73 @@
+import logging
 from datetime import timedelta
 from typing import Optional
-import logging
 
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
 
+from app.core.config import settings
+from app.core.passwords import password_hasher
 from app.core.security import (
-    get_password_hash,
-    verify_password,
     create_access_token,
     get_user_by_email,
 )
-from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
 
 logger = logging.getLogger(__name__)
 
+
 class AuthService:
-    def create_user(self, db: Session, user_in: UserCreate) -> User:
+    # Database calls are synchronous and run in the threadpool; bcrypt runs in
+    # the password hashing process pool, so neither blocks the event loop
+
+    @staticmethod
+    def _check_available(db: Session, user_in: UserCreate) -> None:
+        # Check if user with email or username exists
+        existing_email_user = db.query(User).filter(User.email == user_in.email).first()
+        if existing_email_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this email already exists",
+            )
+
+        existing_username_user = (
+            db.query(User).filter(User.username == user_in.username).first()
+        )
+        if existing_username_user:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="User with this username already exists",
+            )
+
+    @staticmethod
+    def _save(db: Session, user: User) -> None:
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+
+    async def create_user(self, db: Session, user_in: UserCreate) -> User:
         """
         Create a new user.
-        
+
         Args:
             db: Database session
             user_in: User creation data
-            
+
         Returns:
             Created user
+
+        Raises:
+            HTTPException: 503 if password hashing is saturated
         """
         try:
-            # Check if user with email or username exists
-            existing_email_user = db.query(User).filter(User.email == user_in.email).first()
-            if existing_email_user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User with this email already exists",
-                )
-            
-            existing_username_user = db.query(User).filter(User.username == user_in.username).first()
-            if existing_username_user:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="User with this username already exists",
-                )
-            
+            # Before hashing, so taken names don't cost a bcrypt round
+            await run_in_threadpool(self._check_available, db, user_in)
+
             # Create new user
-            hashed_password = get_password_hash(user_in.password)
+            hashed_password = await password_hasher.hash(user_in.password)
             user = User(
                 email=user_in.email,
                 username=user_in.username,
@@ -55,15 +75,13 @@ class AuthService:
                 is_active=True,
                 is_superuser=False,  # Ignore user_in.is_superuser for security
             )
-            
-            db.add(user)
-            db.commit()
-            db.refresh(user)
+
+            await run_in_threadpool(self._save, db, user)
             logger.info(f"Created new user: {user.username} ({user.id})")
             return user
-            
+
         except IntegrityError as e:
-            db.rollback()
+            await run_in_threadpool(db.rollback)
             logger.error(f"Database integrity error creating user: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -73,43 +91,69 @@ class AuthService:
             # Re-raise HTTP exceptions
             raise
         except Exception as e:
-            db.rollback()
+            await run_in_threadpool(db.rollback)
             logger.error(f"Unexpected error creating user: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Unexpected error: {str(e)}",
             )
-    
-    def authenticate(self, db: Session, email: str, password: str) -> Optional[User]:
+
+    async def authenticate(
+        self, db: Session, email: str, password: str
+    ) -> Optional[User]:
         """
         Authenticate a user.
-        
+
+        A hash made with an outdated work factor is replaced on success.
+
         Args:
             db: Database session
             email: User email
             password: User password
-            
+
         Returns:
             Authenticated user or None
+
+        Raises:
+            HTTPException: 503 if password hashing is saturated
         """
         try:
-            user = get_user_by_email(db, email)
+            user = await run_in_threadpool(get_user_by_email, db, email)
             if not user:
                 return None
-            if not verify_password(password, user.hashed_password):
+            verified, new_hash = await password_hasher.verify_and_update(
+                password, user.hashed_password
+            )
+            if not verified:
                 return None
+            if new_hash:
+                await self._upgrade_hash(db, user, new_hash)
             return user
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Authentication error: {str(e)}", exc_info=True)
             return None
-    
+
+    async def _upgrade_hash(self, db: Session, user: User, new_hash: str) -> None:
+        # The login succeeds either way; the upgrade is retried next time
+        user.hashed_password = new_hash
+        try:
+            await run_in_threadpool(self._save, db, user)
+            logger.info(f"Upgraded password hash for user {user.id}")
+        except Exception as e:
+            await run_in_threadpool(db.rollback)
+            logger.warning(
+                f"Could not upgrade password hash for user {user.id}: {str(e)}"
+            )
+
     def get_access_token(self, user_id: int) -> dict:
         """
         Generate a new access token for a user.
-        
+
         Args:
             user_id: ID of the user
-            
+
         Returns:
             Access token data
         """
@@ -120,43 +164,46 @@ class AuthService:
             ),
             "token_type": "bearer",
         }
-    
-    def update_user(self, db: Session, user_id: int, user_in: UserUpdate) -> User:
+
+    async def update_user(self, db: Session, user_id: int, user_in: UserUpdate) -> User:
         """
         Update a user.
-        
+
         Args:
             db: Database session
             user_id: ID of the user to update
             user_in: User update data
-            
+
         Returns:
             Updated user
         """
         try:
-            user = db.query(User).filter(User.id == user_id).first()
+            user = await run_in_threadpool(
+                lambda: db.query(User).filter(User.id == user_id).first()
+            )
             if not user:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="User not found",
                 )
-            
+
             update_data = user_in.dict(exclude_unset=True)
-            
+
             # Hash password if provided
             if "password" in update_data:
-                update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
-            
+                update_data["hashed_password"] = await password_hasher.hash(
+                    update_data.pop("password")
+                )
+
             # Update user
             for field, value in update_data.items():
                 setattr(user, field, value)
-            
-            db.commit()
-            db.refresh(user)
+
+            await run_in_threadpool(self._save, db, user)
             return user
-            
+
         except IntegrityError as e:
-            db.rollback()
+            await run_in_threadpool(db.rollback)
             logger.error(f"Database integrity error updating user: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -165,7 +212,7 @@ class AuthService:
         except HTTPException:
             raise
         except Exception as e:
-            db.rollback()
+            await run_in_threadpool(db.rollback)
             logger.error(f"Unexpected error updating user: {str(e)}", exc_info=True)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -174,4 +221,4 @@ class AuthService:
 
 
 # Singleton instance
-auth_service = AuthService()
\ No newline at end of file
+auth_service = AuthService()
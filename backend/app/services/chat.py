@@ -1,22 +1,159 @@
+import asyncio
 import logging
 import uuid
-import asyncio
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Any, AsyncIterator, Coroutine, Dict, List, Optional, Set, Tuple
 
+from app.core.config import settings
+from app.db.archive import delete_session_archive
 from app.db.elasticsearch import (
-    save_chat_session,
+    PREVIEW_CHARS,
+    append_chat_message,
+    delete_chat_session,
+    get_chat_message,
     get_chat_session,
+    get_chat_session_meta,
+    get_session_messages_page,
+    get_session_titles,
+    increment_session_usage,
+    save_chat_session,
+    search_user_messages,
     update_chat_session,
-    get_chat_sessions_by_user,
-    delete_chat_session,
+)
+from app.db.session_registry import (
+    delete_registered_session,
+    get_session_owner,
+    list_user_sessions,
+    record_chat_message,
+    register_chat_session,
+    session_is_current,
+    update_registered_session,
 )
 from app.services.claude import claude_service
+from app.services.idempotency import idempotency_store
+from app.services.model_routing import model_router
+from app.utils import metrics
+from app.utils.cache import TTLCache
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.tokenizer import estimate_message_tokens
 
 logger = logging.getLogger(__name__)
 
+
 class ChatService:
-    async def create_chat_session(self, user_id: int, title: Optional[str] = None) -> Dict[str, Any]:
+    def __init__(self) -> None:
+        self._background_tasks: Set[asyncio.Task] = set()
+        self._summarizing: Set[str] = set()
+        # Last queued write per session; the next one waits for it so a
+        # session's messages reach Elasticsearch in the order they were made
+        self._session_writes: Dict[str, asyncio.Task] = {}
+        # Full sessions (with messages) this worker has read or written.
+        # Entries are the same dicts the turn pipeline mutates, so appends,
+        # title and summary updates are reflected without another read.
+        # Before use, an entry is checked against the session's row in
+        # PostgreSQL, so writes made by another worker are not missed. It
+        # also expires SESSION_CACHE_TTL_SECONDS after it was loaded, however
+        # busy the session.
+        self._session_cache: TTLCache[Dict[str, Any]] = TTLCache(
+            max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS,
+        )
+
+    def _cache_session(self, session: Dict[str, Any]) -> None:
+        if settings.SESSION_CACHE_ENABLED:
+            self._session_cache.set(session["session_id"], session)
+
+    async def _cached_session(
+        self, session_id: str, user_id: int
+    ) -> Optional[Dict[str, Any]]:
+        if not settings.SESSION_CACHE_ENABLED:
+            return None
+        session = self._session_cache.get(session_id)
+        if session is not None and session["user_id"] == user_id:
+            if await self._is_current(session):
+                metrics.increment("session_cache.hits")
+                return session
+            metrics.increment("session_cache.stale")
+            self._session_cache.delete(session_id)
+        metrics.increment("session_cache.misses")
+        return None
+
+    async def _is_current(self, session: Dict[str, Any]) -> bool:
+        """Whether a cached session has missed no writes made elsewhere."""
+        if session["session_id"] in self._session_writes:
+            # This worker's own writes are in flight; the copy is ahead of
+            # PostgreSQL until they land
+            return True
+        try:
+            return await session_is_current(session)
+        except Exception as e:
+            logger.warning(
+                f"Could not validate cached session {session['session_id']}: {e}"
+            )
+            return False
+
+    def evict_session(self, session_id: str) -> None:
+        """Drop a session from this worker's cache, e.g. after it was archived."""
+        self._session_cache.delete(session_id)
+
+    def evict_user(self, user_id: int) -> None:
+        """Drop all of a user's sessions from this worker's cache."""
+        self._session_cache.delete_where(lambda session: session["user_id"] == user_id)
+
+    async def _load_session(
+        self, session_id: str, user_id: int
+    ) -> Optional[Dict[str, Any]]:
+        """Get a full session, from this worker's cache when possible."""
+        session = await self._cached_session(session_id, user_id)
+        if session is None:
+            session = await get_chat_session(session_id, user_id)
+            if session:
+                self._cache_session(session)
+        return session
+
+    def _spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        # Keep a reference so fire-and-forget tasks aren't garbage collected
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    def _write_in_order(
+        self, session_id: str, coro: Coroutine[Any, Any, Any]
+    ) -> asyncio.Task:
+        """Run a session write in the background, after earlier writes to it."""
+        previous = self._session_writes.get(session_id)
+
+        async def run() -> Any:
+            if previous is not None:
+                # The earlier write's outcome belongs to whoever queued it
+                await asyncio.gather(previous, return_exceptions=True)
+            return await coro
+
+        task = self._spawn(run())
+        self._session_writes[session_id] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if self._session_writes.get(session_id) is done:
+                del self._session_writes[session_id]
+
+        task.add_done_callback(forget)
+        return task
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Wait for background writes and summaries still in flight."""
+        if not self._background_tasks:
+            return
+        _, pending = await asyncio.wait(set(self._background_tasks), timeout=timeout)
+        if pending:
+            logger.error(
+                f"Chat service shut down with {len(pending)} background tasks "
+                "unfinished"
+            )
+
+    async def create_chat_session(
+        self, user_id: int, title: Optional[str] = None
+    ) -> Dict[str, Any]:
         session_id = str(uuid.uuid4())
         now = datetime.utcnow().isoformat()
         if not title:
@@ -26,74 +163,704 @@ class ChatService:
             "user_id": user_id,
             "title": title,
             "messages": [],
+            "message_count": 0,
+            "last_message_preview": None,
+            "last_activity": now,
             "created_at": now,
-            "updated_at": now
+            "updated_at": now,
         }
-        save_chat_session(chat_session)
+        await save_chat_session(chat_session)
+        await register_chat_session(chat_session)
+        # Set by the getters on loaded sessions; not part of the document
+        chat_session["embedded_message_count"] = 0
+        self._cache_session(chat_session)
         logger.info(f"Created chat session {session_id} for user {user_id}")
         return chat_session
 
-    async def get_user_chat_sessions(self, user_id: int) -> List[Dict[str, Any]]:
-        return get_chat_sessions_by_user(user_id)
+    async def get_user_chat_sessions(
+        self, user_id: int, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List a user's sessions without their messages, one page at a time.
 
-    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        return get_chat_session(session_id)
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        sessions, search_after = await list_user_sessions(
+            user_id, limit, decode_cursor(cursor)
+        )
+        return sessions, encode_cursor(search_after)
 
-    async def delete_chat_session(self, session_id: str) -> bool:
-        return delete_chat_session(session_id)
+    async def get_session_owner(self, session_id: str, user_id: int) -> Optional[int]:
+        """
+        Look up a session's owner for an authorization check.
 
-    async def add_message_to_session(self, session_id: str, role: str, content: str) -> Dict[str, Any]:
-        session = get_chat_session(session_id)
+        Answered from PostgreSQL. A session missing there may predate the
+        relational index; it is looked up in Elasticsearch under the caller's
+        routing and registered if found.
+
+        Returns:
+            The owner's user ID, or None if the session does not exist
+        """
+        owner = await get_session_owner(session_id)
+        if owner is not None:
+            return owner
+        session = await get_chat_session_meta(session_id, user_id)
+        if not session:
+            return None
+        await register_chat_session(session)
+        return session["user_id"]
+
+    async def get_session(
+        self, session_id: str, user_id: int, include_messages: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        if not include_messages:
+            # A cached full session is just as good; don't cache the partial one
+            return await self._cached_session(
+                session_id, user_id
+            ) or await get_chat_session_meta(session_id, user_id)
+        return await self._load_session(session_id, user_id)
+
+    async def get_session_messages(
+        self,
+        session: Dict[str, Any],
+        limit: int = 50,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get one page of a session's messages, anchored on message IDs.
+
+        Args:
+            session: Session from get_session(include_messages=False)
+            limit: Maximum number of messages to return
+            before: Return the messages preceding this message ID
+            after: Return the messages following this message ID
+
+        Returns:
+            Tuple of the messages in chronological order and whether more
+            messages exist beyond the page
+
+        Raises:
+            ValueError: If a cursor is not a message of this session
+        """
+        session_id, user_id = session["session_id"], session["user_id"]
+        if session.get("embedded_message_count"):
+            # Sessions with embedded messages predate the messages index;
+            # page them in memory
+            full_session = await self._load_session(session_id, user_id)
+            return self._page_messages(
+                full_session["messages"] if full_session else [], limit, before, after
+            )
+
+        bounds = {}
+        for name, message_id in (("before", before), ("after", after)):
+            if message_id:
+                anchor = await get_chat_message(session_id, user_id, message_id)
+                if not anchor:
+                    raise ValueError(f"Message {message_id} not found in this session")
+                bounds[name] = [anchor["timestamp"], anchor["id"]]
+        return await get_session_messages_page(session_id, user_id, limit, **bounds)
+
+    async def search_messages(
+        self,
+        user_id: int,
+        query: str,
+        limit: int = 20,
+        role: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Search a user's messages and attach the title of each hit's session.
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        matches, search_after = await search_user_messages(
+            user_id,
+            query,
+            limit=limit,
+            role=role,
+            start=start.isoformat() if start else None,
+            end=end.isoformat() if end else None,
+            search_after=decode_cursor(cursor),
+        )
+        titles = await get_session_titles(
+            user_id, list({match["session_id"] for match in matches})
+        )
+        for match in matches:
+            match["session_title"] = titles.get(match["session_id"])
+        return matches, encode_cursor(search_after)
+
+    @staticmethod
+    def _page_messages(
+        messages: List[Dict[str, Any]],
+        limit: int,
+        before: Optional[str],
+        after: Optional[str],
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        ids = [message["id"] for message in messages]
+        start, end = 0, len(messages)
+        for message_id in (before, after):
+            if message_id and message_id not in ids:
+                raise ValueError(f"Message {message_id} not found in this session")
+        if after:
+            start = ids.index(after) + 1
+        if before:
+            end = ids.index(before)
+        window = messages[start:end]
+        if after and not before:
+            return window[:limit], len(window) > limit
+        return window[-limit:], len(window) > limit
+
+    async def delete_chat_session(self, session_id: str, user_id: int) -> bool:
+        # Let a turn still being persisted land first, or it would recreate stats
+        # on a deleted session
+        pending = self._session_writes.get(session_id)
+        if pending is not None:
+            await asyncio.gather(pending, return_exceptions=True)
+        self._session_cache.delete(session_id)
+        deleted = await delete_chat_session(session_id, user_id)
+        if deleted:
+            # An archived session only exists as its file and its row
+            await delete_session_archive(session_id, user_id)
+            await delete_registered_session(session_id)
+        return deleted
+
+    async def add_message_to_session(
+        self,
+        session_id: str,
+        user_id: int,
+        role: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        session = await self._load_session(session_id, user_id)
         if not session:
             raise ValueError(f"Chat session {session_id} not found")
-        message_id = str(uuid.uuid4())
+        await self._append_message(session, role, content, metadata)
+        return session
+
+    async def _append_message(
+        self,
+        session: Dict[str, Any],
+        role: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Add one message to the in-memory session and persist it."""
+        message = self._add_message(session, role, content, metadata)
+        await self._write_in_order(
+            session["session_id"], self._persist_or_discard(session, message)
+        )
+        return message
+
+    def _add_message(
+        self,
+        session: Dict[str, Any],
+        role: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Add one message to the in-memory (and cached) session, unpersisted."""
         timestamp = datetime.utcnow().isoformat()
         message = {
-            "id": message_id,
+            "id": str(uuid.uuid4()),
             "role": role,
             "content": content,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "token_count": estimate_message_tokens(content),
+            **(metadata or {}),
         }
         session.setdefault("messages", []).append(message)
-        session["updated_at"] = timestamp
-        save_chat_session(session)
-        logger.info(f"Added {role} message to session {session_id}")
-        return session
+        session["message_count"] = len(session["messages"])
+        session["last_message_preview"] = content[:PREVIEW_CHARS]
+        session["last_activity"] = session["updated_at"] = timestamp
+        if self._session_cache.get(session["session_id"]) is not session:
+            self._cache_session(session)
+        return message
 
-    async def update_chat_session(self, session_id: str, update_data: Dict[str, Any]) -> bool:
-        return update_chat_session(session_id, update_data)
+    async def _persist_message(
+        self, session: Dict[str, Any], message: Dict[str, Any]
+    ) -> None:
+        # Elasticsearch first: the relational index never lists a message
+        # that was not stored
+        await append_chat_message(session["session_id"], session["user_id"], message)
+        await record_chat_message(session, message)
+        logger.info(
+            f"Added {message['role']} message to session {session['session_id']}"
+        )
 
-    async def process_user_message(self, user_id: int, message: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+    async def _persist_or_discard(
+        self, session: Dict[str, Any], message: Dict[str, Any]
+    ) -> None:
+        """Persist a message added with _add_message; take it back out on failure."""
         try:
-            if session_id:
-                session = get_chat_session(session_id)
-                if not session:
-                    logger.warning(f"Session {session_id} not found, creating new session")
-                    session = await self.create_chat_session(user_id)
-            else:
-                session = await self.create_chat_session(user_id)
+            await self._persist_message(session, message)
+        except BaseException:
+            # Don't let a message that was never stored become context for
+            # the next turn
+            if message in session.get("messages", []):
+                session["messages"].remove(message)
+            self._session_cache.delete(session["session_id"])
+            raise
 
-            await self.add_message_to_session(session["session_id"], "user", message)
-            chat_history = [{"role": msg["role"], "content": msg["content"]} for msg in session["messages"]]
+    async def update_chat_session(
+        self, session_id: str, user_id: int, update_data: Dict[str, Any]
+    ) -> bool:
+        """
+        Update fields of a session, restoring it first if it was archived.
 
-            try:
-                assistant_response = await asyncio.wait_for(
-                    claude_service.chat(user_message=message, chat_history=chat_history[:-1]), timeout=20
+        Returns:
+            False if the session does not exist
+        """
+        updated = await update_chat_session(session_id, user_id, update_data)
+        if not updated and await get_chat_session_meta(session_id, user_id):
+            # Reading an archived session restored it; update the restored copy
+            updated = await update_chat_session(session_id, user_id, update_data)
+        if not updated:
+            return False
+        await update_registered_session(session_id, update_data)
+        cached = self._session_cache.get(session_id)
+        if cached is not None:
+            cached.update(update_data)
+        return True
+
+    async def _record_session_usage(
+        self, session: Dict[str, Any], usage: Dict[str, int], message_id: str
+    ) -> None:
+        session_id = session["session_id"]
+        try:
+            await increment_session_usage(
+                session_id, session["user_id"], usage, message_id
+            )
+            totals = session.setdefault("usage", {})
+            for key, value in usage.items():
+                totals[key] = (totals.get(key) or 0) + value
+            logger.info(
+                f"Session {session_id} usage: input={usage['input_tokens']} "
+                f"cache_write={usage['cache_creation_input_tokens']} "
+                f"cache_read={usage['cache_read_input_tokens']}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to record usage for session {session_id}: {e}")
+
+    async def _resolve_session(
+        self, user_id: int, session_id: Optional[str]
+    ) -> Dict[str, Any]:
+        if session_id:
+            session = await self._load_session(session_id, user_id)
+            if session:
+                return session
+            logger.warning(f"Session {session_id} not found, creating new session")
+        return await self.create_chat_session(user_id)
+
+    @staticmethod
+    def _history(session: Dict[str, Any]) -> List[Dict[str, Any]]:
+        messages = session["messages"]
+        if settings.CONTEXT_SUMMARY_ENABLED and session.get("summary"):
+            # Turns already folded into the summary are not resent verbatim
+            messages = messages[session.get("summary_message_count", 0) :]
+        return [
+            {
+                "role": msg["role"],
+                "content": msg["content"],
+                "token_count": msg.get("token_count"),
+            }
+            for msg in messages
+        ]
+
+    @staticmethod
+    def _summary(session: Dict[str, Any]) -> Optional[str]:
+        if settings.CONTEXT_SUMMARY_ENABLED:
+            return session.get("summary")
+        return None
+
+    def _schedule_summary(self, session: Dict[str, Any]) -> None:
+        """Fold older turns into the session summary in the background."""
+        if not settings.CONTEXT_SUMMARY_ENABLED:
+            return
+        session_id = session["session_id"]
+        foldable = len(session["messages"]) - settings.CONTEXT_SUMMARY_KEEP_MESSAGES
+        pending = foldable - session.get("summary_message_count", 0)
+        if (
+            pending < settings.CONTEXT_SUMMARY_BATCH_MESSAGES
+            or session_id in self._summarizing
+        ):
+            return
+        self._summarizing.add(session_id)
+        self._spawn(self._update_summary(session_id, session["user_id"]))
+
+    async def _update_summary(self, session_id: str, user_id: int) -> None:
+        try:
+            session = await self._load_session(session_id, user_id)
+            if not session:
+                return
+            folded = session.get("summary_message_count", 0)
+            fold_upto = (
+                len(session["messages"]) - settings.CONTEXT_SUMMARY_KEEP_MESSAGES
+            )
+            if fold_upto <= folded:
+                return
+            summary = await claude_service.summarize(
+                session.get("summary"), session["messages"][folded:fold_upto]
+            )
+            await self.update_chat_session(
+                session_id,
+                user_id,
+                {"summary": summary, "summary_message_count": fold_upto},
+            )
+            logger.info(
+                f"Updated summary for session {session_id} through message {fold_upto}"
+            )
+        except Exception as e:
+            logger.error(
+                f"Failed to update summary for session {session_id}: {e}", exc_info=True
+            )
+        finally:
+            self._summarizing.discard(session_id)
+
+    @staticmethod
+    def _new_title(session: Dict[str, Any], message: str) -> Optional[str]:
+        """Title taken from the first user message, or None to keep the current one."""
+        if len(session["messages"]) <= 2 and session["title"].startswith("Chat "):
+            return message[:30] + "..." if len(message) > 30 else message
+        return None
+
+    def _finish_turn(
+        self,
+        session: Dict[str, Any],
+        message: str,
+        reply: Dict[str, Any],
+        routing: Dict[str, str],
+        assistant_response: str,
+    ) -> Dict[str, Any]:
+        """
+        Add the assistant reply to the session and persist the rest of the turn
+        in the background, so the caller can answer the client right away.
+
+        Returns:
+            The assistant message
+        """
+        assistant_message = self._add_message(
+            session,
+            "assistant",
+            assistant_response,
+            metadata=self._assistant_metadata(reply, routing),
+        )
+        title = self._new_title(session, message)
+        if title:
+            session["title"] = title
+        self._write_in_order(
+            session["session_id"],
+            self._persist_turn(session, assistant_message, reply.get("usage"), title),
+        )
+        return assistant_message
+
+    async def _persist_turn(
+        self,
+        session: Dict[str, Any],
+        assistant_message: Dict[str, Any],
+        usage: Optional[Dict[str, int]],
+        title: Optional[str],
+    ) -> None:
+        session_id = session["session_id"]
+        try:
+            await self._persist_message(session, assistant_message)
+            if usage:
+                await self._record_session_usage(
+                    session, usage, assistant_message["id"]
                 )
-            except asyncio.TimeoutError:
-                assistant_response = "[Timeout] Claude took too long to respond."
+            if title:
+                await self.update_chat_session(
+                    session_id, session["user_id"], {"title": title}
+                )
+        except Exception as e:
+            # The client already has the reply; drop the cached copy so later
+            # reads reflect what was actually stored
+            metrics.increment("chat.turn_persist_failures")
+            self._session_cache.delete(session_id)
+            logger.error(
+                f"Failed to persist turn in session {session_id}: {e}", exc_info=True
+            )
+            return
+        self._schedule_summary(session)
+
+    def _start_turn(self, session: Dict[str, Any], message: str) -> asyncio.Task:
+        """Add the user message and start persisting it; await the returned task."""
+        user_message = self._add_message(session, "user", message)
+        return self._write_in_order(
+            session["session_id"], self._persist_or_discard(session, user_message)
+        )
 
-            await self.add_message_to_session(session["session_id"], "assistant", assistant_response)
+    def _route(
+        self, user_id: int, session: Dict[str, Any], message: str, hint: Optional[str]
+    ) -> Dict[str, str]:
+        # The new user message is already part of the session
+        return model_router.route(user_id, message, len(session["messages"]) - 1, hint)
+
+    @staticmethod
+    def _assistant_metadata(
+        reply: Dict[str, Any], routing: Dict[str, str]
+    ) -> Dict[str, Any]:
+        metadata: Dict[str, Any] = {
+            "routing": routing,
+            "model": reply.get("model", routing["model"]),
+        }
+        if reply.get("usage"):
+            metadata["usage"] = reply["usage"]
+        return metadata
+
+    @staticmethod
+    def _reply(
+        session: Dict[str, Any], assistant_message: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        return {
+            "session_id": session["session_id"],
+            "message": assistant_message["content"],
+            "timestamp": assistant_message["timestamp"],
+        }
+
+    async def process_user_message(
+        self,
+        user_id: int,
+        message: str,
+        session_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        model_hint: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run one chat turn and return the assistant's reply.
+
+        With an idempotency key, concurrent duplicates share the in-flight turn
+        and repeats within the retention window get the stored reply back
+        instead of calling Claude again. A turn that timed out is not stored,
+        so a retry asks Claude again.
+
+        Returns:
+            Dict with the ``session_id``, ``message`` and ``timestamp`` of the reply
+        """
+        if not idempotency_key:
+            reply, _ = await self._process_user_message(
+                user_id, message, session_id, model_hint
+            )
+            return reply
+
+        key = idempotency_store.make_key(user_id, idempotency_key)
+        replay = await idempotency_store.acquire(
+            key, idempotency_store.fingerprint(session_id, message)
+        )
+        if replay is not None:
+            return replay
+
+        try:
+            reply, timed_out = await self._process_user_message(
+                user_id, message, session_id, model_hint
+            )
+        except BaseException as e:
+            idempotency_store.release(key, e)
+            raise
+        if timed_out:
+            idempotency_store.release(key)
+        else:
+            idempotency_store.complete(key, reply)
+        return reply
+
+    async def _process_user_message(
+        self,
+        user_id: int,
+        message: str,
+        session_id: Optional[str] = None,
+        model_hint: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Run one chat turn; returns the reply and whether Claude timed out."""
+        session = None
+        try:
+            session = await self._resolve_session(user_id, session_id)
 
-            if len(session["messages"]) <= 2 and session["title"].startswith("Chat "):
-                title = message[:30] + "..." if len(message) > 30 else message
-                update_chat_session(session["session_id"], {"title": title})
-                session["title"] = title
+            # The user message is written while Claude works on the reply
+            user_write = self._start_turn(session, message)
+            chat_history = self._history(session)
+            routing = self._route(user_id, session, message, model_hint)
 
+            upstream = asyncio.ensure_future(
+                asyncio.wait_for(
+                    claude_service.chat(
+                        user_message=message,
+                        chat_history=chat_history[:-1],
+                        summary=self._summary(session),
+                        user_id=user_id,
+                        model=routing["model"],
+                    ),
+                    timeout=settings.CHAT_RESPONSE_TIMEOUT,
+                )
+            )
+            try:
+                await user_write
+            except BaseException:
+                upstream.cancel()
+                raise
+
+            reply: Dict[str, Any] = {}
+            timed_out = False
+            try:
+                reply = await upstream
+                assistant_response = reply["text"]
+            except asyncio.TimeoutError:
+                timed_out = True
+                assistant_response = "[Timeout] Claude took too long to respond."
+
+            assistant_message = self._finish_turn(
+                session, message, reply, routing, assistant_response
+            )
             logger.info(f"Processed message in session {session['session_id']}")
-            return get_chat_session(session["session_id"])
+            return self._reply(session, assistant_message), timed_out
 
         except Exception as e:
             logger.error(f"Error processing user message: {e}", exc_info=True)
-            await self.add_message_to_session(session["session_id"], "system", f"Error: {str(e)}")
-            raise
\ No newline at end of file
+            if session:
+                await self._append_message(session, "system", f"Error: {str(e)}")
+            raise
+
+    async def stream_user_message(
+        self,
+        user_id: int,
+        message: str,
+        session_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        model_hint: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of process_user_message.
+
+        Yields a ``start`` event once the session is known, one ``delta`` event
+        per text chunk from Claude, and a final ``done`` event once the full
+        assistant reply is in; it is persisted in the background. If the client
+        disconnects first, the text generated so far is persisted instead. A
+        duplicate of an idempotent turn replays the stored reply as a single
+        delta.
+        """
+        key = None
+        if idempotency_key:
+            key = idempotency_store.make_key(user_id, idempotency_key)
+            replay = await idempotency_store.acquire(
+                key, idempotency_store.fingerprint(session_id, message)
+            )
+            if replay is not None:
+                yield {"type": "start", "session_id": replay["session_id"]}
+                yield {
+                    "type": "delta",
+                    "session_id": replay["session_id"],
+                    "delta": replay["message"],
+                }
+                yield {"type": "done", **replay}
+                return
+
+        stream = self._stream_user_message(user_id, message, session_id, model_hint)
+        try:
+            async for event in stream:
+                if key and event["type"] == "done":
+                    idempotency_store.complete(
+                        key, {k: v for k, v in event.items() if k != "type"}
+                    )
+                yield event
+        except BaseException as e:
+            if key:
+                idempotency_store.release(key, e)
+            raise
+        finally:
+            # Close the inner stream now, not when it is garbage collected, so
+            # a disconnect persists the partial reply before the next turn
+            await stream.aclose()
+
+    async def _stream_user_message(
+        self,
+        user_id: int,
+        message: str,
+        session_id: Optional[str] = None,
+        model_hint: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        session = None
+        user_write: Optional[asyncio.Task] = None
+        routing: Dict[str, str] = {}
+        reply: Dict[str, Any] = {}
+        chunks: List[str] = []
+        finished = False
+        try:
+            session = await self._resolve_session(user_id, session_id)
+            yield {"type": "start", "session_id": session["session_id"]}
+
+            user_write = self._start_turn(session, message)
+            chat_history = self._history(session)
+            routing = self._route(user_id, session, message, model_hint)
+
+            async for event in claude_service.chat_stream(
+                user_message=message,
+                chat_history=chat_history[:-1],
+                summary=self._summary(session),
+                user_id=user_id,
+                model=routing["model"],
+            ):
+                # Nothing is sent to the client until the user message is stored;
+                # by the first chunk the write has normally long finished
+                await user_write
+                if event["type"] == "delta":
+                    chunks.append(event["text"])
+                    yield {
+                        "type": "delta",
+                        "session_id": session["session_id"],
+                        "delta": event["text"],
+                    }
+                else:
+                    reply = event
+
+            await user_write
+            assistant_response = reply.get("text") or "No response received"
+            assistant_message = self._finish_turn(
+                session, message, reply, routing, assistant_response
+            )
+            finished = True
+
+            logger.info(f"Streamed message in session {session['session_id']}")
+            yield {
+                "type": "done",
+                "session_id": session["session_id"],
+                "message": assistant_response,
+                "timestamp": assistant_message["timestamp"],
+            }
+
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client went away mid-stream; keep what Claude wrote so far
+            text = reply.get("text") or "".join(chunks)
+            if (
+                session
+                and user_write
+                and routing
+                and not finished
+                and text
+                and self._stored(user_write)
+            ):
+                self._finish_turn(session, message, reply, routing, text)
+                logger.info(
+                    f"Client left stream in session {session['session_id']}; persisted "
+                    f"{len(text)} chars"
+                )
+            raise
+
+        except Exception as e:
+            logger.error(f"Error streaming user message: {e}", exc_info=True)
+            if session:
+                await self._append_message(session, "system", f"Error: {str(e)}")
+            raise
+
+    @staticmethod
+    def _stored(write: asyncio.Task) -> bool:
+        """Whether a write succeeded or is still running (later writes queue on it)."""
+        return not write.done() or (not write.cancelled() and write.exception() is None)
+
+
+# Singleton instance shared by the REST and WebSocket routes, so both use
+# one session cache and one set of background tasks per worker
+chat_service = ChatService()
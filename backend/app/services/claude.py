@@ -1,54 +1,370 @@
-import logging
+import asyncio
 import json
-from typing import Dict, List, Any, Optional
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 import httpx
+
 from app.core.config import settings
+from app.services.context import CONVERSATION_ROLES, context_manager
+from app.services.response_cache import response_cache
+from app.utils import metrics
+from app.utils.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    backoff_delay,
+    parse_retry_after,
+)
+from app.utils.tokenizer import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
-ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+ANTHROPIC_API_URL = f"{settings.CLAUDE_API_BASE_URL.rstrip('/')}/v1/messages"
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Earlier parts of this conversation have been condensed into the summary "
+    "below. Treat it as shared context when answering.\n\n"
+    "<conversation_summary>\n{summary}\n</conversation_summary>"
+)
+
+SUMMARY_UPDATE_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an "
+    "assistant. Update the existing summary with the new turns below. Keep facts, "
+    "decisions, names, numbers and open questions; drop pleasantries. Reply with "
+    "the updated summary only.\n\n"
+    "<existing_summary>\n{summary}\n</existing_summary>\n\n"
+    "<new_turns>\n{transcript}\n</new_turns>"
+)
+
+
+# Usage counters reported by the Messages API
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Transient upstream failures worth retrying; 529 is "overloaded"
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+# The provider is shedding load for this model: a fallback model may still serve
+OVERLOAD_STATUS_CODES = {429, 529}
+
+
+class ClaudeStreamError(Exception):
+    """Raised when the upstream sends an error event mid-stream."""
 
 
 class ClaudeService:
-    def __init__(self, api_key: str = settings.CLAUDE_API_KEY, model: str = settings.CLAUDE_MODEL):
+    def __init__(
+        self, api_key: str = settings.CLAUDE_API_KEY, model: str = settings.CLAUDE_MODEL
+    ):
         self.api_key = api_key
         self.model = model
         self.headers = {
             "x-api-key": self.api_key,
             "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
+            "content-type": "application/json",
+        }
+        self._client: Optional[httpx.AsyncClient] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def _create_client(self) -> httpx.AsyncClient:
+        http2 = settings.CLAUDE_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning(
+                    "CLAUDE_HTTP2 is enabled but the 'h2' package is not installed, "
+                    "using HTTP/1.1"
+                )
+                http2 = False
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.CLAUDE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CLAUDE_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.CLAUDE_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.CLAUDE_CONNECT_TIMEOUT,
+                read=settings.CLAUDE_READ_TIMEOUT,
+                write=settings.CLAUDE_CONNECT_TIMEOUT,
+                pool=settings.CLAUDE_POOL_TIMEOUT,
+            ),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared upstream client, created lazily if startup() was not called."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    async def startup(self) -> None:
+        """Open the pooled upstream client."""
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+            logger.info("Claude HTTP client started")
+
+    async def close(self) -> None:
+        """Close the pooled upstream client and release its connections."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+            logger.info("Claude HTTP client closed")
+        self._client = None
+
+    def _breaker(self, model: str) -> CircuitBreaker:
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                failure_threshold=settings.CLAUDE_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CLAUDE_CIRCUIT_RESET_SECONDS,
+            )
+            self._breakers[model] = breaker
+        return breaker
+
+    async def _send(self, body: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """
+        POST a request body upstream with retries, circuit breaking and fallback.
+
+        Transient failures are retried with jittered exponential backoff that
+        honors retry-after. A model whose circuit is open is skipped without a
+        request, and if the primary model is overloaded (429/529) or its circuit
+        is open the configured fallback model is tried instead.
+
+        Args:
+            body: Messages API request body
+            stream: Whether to return an open streaming response
+
+        Returns:
+            The upstream response; non-retryable errors are returned for the
+            caller to raise. Streaming responses must be closed by the caller.
+        """
+        models = [body["model"]]
+        if (
+            settings.CLAUDE_FALLBACK_MODEL
+            and settings.CLAUDE_FALLBACK_MODEL != body["model"]
+        ):
+            models.append(settings.CLAUDE_FALLBACK_MODEL)
+
+        last_error: Exception = CircuitOpenError("No upstream model available")
+        for model in models:
+            breaker = self._breaker(model)
+            if not breaker.allow_request():
+                logger.warning(f"Circuit breaker open for model {model}, failing fast")
+                metrics.increment("claude.circuit_rejections")
+                last_error = CircuitOpenError(f"Circuit breaker open for model {model}")
+                continue
+            if model != body["model"]:
+                logger.warning(f"Falling back from {body['model']} to {model}")
+                metrics.increment("claude.fallbacks")
+
+            request_body = {**body, "model": model}
+            for attempt in range(settings.CLAUDE_MAX_RETRIES + 1):
+                retry_after = None
+                try:
+                    request = self.client.build_request(
+                        "POST",
+                        ANTHROPIC_API_URL,
+                        headers=self.headers,
+                        json=request_body,
+                    )
+                    response = await self.client.send(request, stream=stream)
+                except httpx.RequestError as e:
+                    breaker.record_failure()
+                    last_error = e
+                else:
+                    if response.status_code not in RETRYABLE_STATUS_CODES:
+                        if not response.is_server_error:
+                            breaker.record_success()
+                        return response
+                    breaker.record_failure()
+                    await response.aread()
+                    await response.aclose()
+                    last_error = httpx.HTTPStatusError(
+                        f"Claude API returned {response.status_code}",
+                        request=request,
+                        response=response,
+                    )
+                    retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+                if (
+                    attempt == settings.CLAUDE_MAX_RETRIES
+                    or not breaker.allow_request()
+                ):
+                    break
+                if (
+                    retry_after is not None
+                    and retry_after > settings.CLAUDE_RETRY_MAX_DELAY
+                ):
+                    logger.warning(
+                        f"Upstream asked to wait {retry_after:.1f}s for {model}, not "
+                        "retrying"
+                    )
+                    break
+                delay = backoff_delay(
+                    attempt,
+                    settings.CLAUDE_RETRY_BASE_DELAY,
+                    settings.CLAUDE_RETRY_MAX_DELAY,
+                    retry_after,
+                )
+                metrics.increment("claude.retries")
+                logger.warning(
+                    f"Retrying Claude request for {model} in {delay:.2f}s after: "
+                    f"{last_error}"
+                )
+                await asyncio.sleep(delay)
+
+            overloaded = (
+                isinstance(last_error, httpx.HTTPStatusError)
+                and last_error.response.status_code in OVERLOAD_STATUS_CODES
+            )
+            if not overloaded:
+                break
+        raise last_error
+
+    def _request_body(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        system: Optional[str] = None,
+        stream: bool = False,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
         }
-    
+        if settings.PROMPT_CACHE_ENABLED:
+            system, messages = self._with_cache_breakpoints(system, messages)
+            body["messages"] = messages
+        if system:
+            body["system"] = system
+        if stream:
+            body["stream"] = True
+        return body
+
+    @staticmethod
+    def _with_cache_breakpoints(
+        system: Optional[str], messages: List[Dict[str, Any]]
+    ) -> Tuple[Any, List[Dict[str, Any]]]:
+        """
+        Mark the stable prompt prefix for provider-side prompt caching.
+
+        The system prompt and everything up to the turn before the new user
+        message are identical on the next request, so breakpoints go on the
+        system block and on the last history message. Prompts shorter than the
+        provider minimum are simply not cached.
+
+        Args:
+            system: Optional system prompt
+            messages: Messages ending with the new user turn
+
+        Returns:
+            Tuple of (system blocks or None, messages with breakpoints)
+        """
+        if system:
+            system = [{"type": "text", "text": system, "cache_control": CACHE_CONTROL}]
+        if len(messages) > 1:
+            messages = list(messages)
+            stable = messages[-2]
+            content = stable["content"]
+            if isinstance(content, str):
+                blocks = [{"type": "text", "text": content}]
+            else:
+                blocks = [dict(block) for block in content]
+            blocks[-1]["cache_control"] = CACHE_CONTROL
+            messages[-2] = {"role": stable["role"], "content": blocks}
+        return system, messages
+
+    @staticmethod
+    def _normalize_usage(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        usage = usage or {}
+        return {field: int(usage.get(field) or 0) for field in USAGE_FIELDS}
+
+    def _record_usage(
+        self, usage: Optional[Dict[str, Any]], model: str
+    ) -> Dict[str, int]:
+        """Log token usage and add it to the upstream metrics."""
+        usage = self._normalize_usage(usage)
+        metrics.increment("claude.requests")
+        for field, value in usage.items():
+            metrics.increment(f"claude.{field}", value)
+        if usage["cache_read_input_tokens"]:
+            metrics.increment("claude.cache_hits")
+        logger.info(
+            f"Claude usage ({model}): input={usage['input_tokens']} "
+            f"output={usage['output_tokens']} "
+            f"cache_write={usage['cache_creation_input_tokens']} "
+            f"cache_read={usage['cache_read_input_tokens']}"
+        )
+        return usage
+
+    def _cache_key(
+        self,
+        cache_scope: Optional[str],
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        system: Optional[str],
+        model: Optional[str] = None,
+    ) -> Optional[str]:
+        if not cache_scope or not settings.RESPONSE_CACHE_ENABLED:
+            return None
+        return response_cache.make_key(
+            cache_scope, model or self.model, messages, max_tokens, system
+        )
+
     async def generate_response(
-        self, messages: List[Dict[str, str]], max_tokens: int = 1024
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1024,
+        system: Optional[str] = None,
+        cache_scope: Optional[str] = None,
+        model: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Generate a response from Claude.
-        
+
         Args:
             messages: A list of message objects with role and content
             max_tokens: Maximum number of tokens to generate
-            
+            system: Optional system prompt
+            cache_scope: Response cache scope; None bypasses the cache
+            model: Model to use instead of the service default
+
         Returns:
             Dict containing the assistant's response
         """
+        model = model or self.model
+        cache_key = self._cache_key(cache_scope, messages, max_tokens, system, model)
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                logger.info(
+                    f"Claude response served from cache, id: {cached.get('id')}"
+                )
+                return {**cached, "cached": True}
+
         # Format messages for Claude API
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    ANTHROPIC_API_URL,
-                    headers=self.headers,
-                    json={
-                        "model": self.model,
-                        "messages": messages,
-                        "max_tokens": max_tokens
-                    }
-                )
-                response.raise_for_status()
-                result = response.json()
-                logger.info(f"Claude response received, id: {result.get('id')}")
-                return result
+            response = await self._send(
+                self._request_body(messages, max_tokens, system, model=model)
+            )
+            response.raise_for_status()
+            result = response.json()
+            logger.info(
+                f"Claude response received, id: {result.get('id')}, http: "
+                f"{response.http_version}"
+            )
+            self._record_usage(result.get("usage"), result.get("model", model))
+            if cache_key:
+                await response_cache.set(cache_key, result)
+            return result
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error when calling Claude API: {e}")
             try:
@@ -60,36 +376,240 @@ class ClaudeService:
         except httpx.RequestError as e:
             logger.error(f"Request error when calling Claude API: {e}")
             raise
+        except CircuitOpenError as e:
+            logger.error(f"Claude API unavailable: {e}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error when calling Claude API: {e}")
             raise
 
+    async def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int = 1024,
+        system: Optional[str] = None,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a response from Claude as server-sent events.
+
+        Args:
+            messages: A list of message objects with role and content
+            max_tokens: Maximum number of tokens to generate
+            system: Optional system prompt
+            model: Model to use instead of the service default
+
+        Yields:
+            Decoded event payloads (message_start, content_block_delta, ...)
+        """
+        try:
+            # Retries and fallback only apply until the stream is established;
+            # once events are flowing a failure is surfaced to the caller
+            body = self._request_body(
+                messages, max_tokens, system, stream=True, model=model
+            )
+            response = await self._send(body, stream=True)
+            try:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    event = json.loads(line[len("data:") :].strip())
+                    if event.get("type") == "error":
+                        raise ClaudeStreamError(
+                            event.get("error", {}).get("message", "Stream error")
+                        )
+                    if event.get("type") == "message_start":
+                        logger.info(
+                            f"Claude stream started, id: {event['message'].get('id')}"
+                        )
+                    yield event
+                    if event.get("type") == "message_stop":
+                        break
+            finally:
+                await response.aclose()
+        except httpx.HTTPStatusError as e:
+            logger.error(f"HTTP error when streaming from Claude API: {e}")
+            logger.error(f"API response: {e.response.text}")
+            raise
+        except httpx.RequestError as e:
+            logger.error(f"Request error when streaming from Claude API: {e}")
+            raise
+        except CircuitOpenError as e:
+            logger.error(f"Claude API unavailable: {e}")
+            raise
+
+    async def chat_stream(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        summary: Optional[str] = None,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of chat that yields text deltas as they arrive.
+
+        Args:
+            user_message: The user's message
+            chat_history: Optional list of previous messages, trimmed to the
+                context token budget
+            summary: Optional running summary of earlier turns
+            user_id: ID of the requesting user, used to scope the response cache
+            model: Model chosen for this turn, defaults to the service model
+
+        Yields:
+            {"type": "delta", "text": ...} for each chunk of the reply, then a
+            final {"type": "done", "text", "model", "usage"} event
+        """
+        messages, system = self._build_prompt(user_message, chat_history, summary)
+        max_tokens = 1024
+        model = model or self.model
+        cache_key = self._cache_key(
+            response_cache.scope_for(user_id), messages, max_tokens, system, model
+        )
+        if cache_key:
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                text = cached["content"][0]["text"]
+                yield {"type": "delta", "text": text}
+                yield {
+                    "type": "done",
+                    "text": text,
+                    "model": cached.get("model", model),
+                    "usage": self._normalize_usage(None),
+                    "cached": True,
+                }
+                return
+
+        chunks: List[str] = []
+        usage: Dict[str, Any] = {}
+        stop_reason = None
+        async for event in self.stream_response(
+            messages, max_tokens=max_tokens, system=system, model=model
+        ):
+            event_type = event.get("type")
+            if event_type == "message_start":
+                model = event["message"].get("model", model)
+                usage.update(event["message"].get("usage") or {})
+            elif event_type == "message_delta":
+                usage.update(event.get("usage") or {})
+                stop_reason = event.get("delta", {}).get("stop_reason", stop_reason)
+            elif event_type == "content_block_delta":
+                delta = event.get("delta", {})
+                if delta.get("type") == "text_delta" and delta.get("text"):
+                    chunks.append(delta["text"])
+                    yield {"type": "delta", "text": delta["text"]}
+        text = "".join(chunks) or "No response received"
+        usage = self._record_usage(usage, model)
+        if cache_key and chunks:
+            await response_cache.set(
+                cache_key,
+                {
+                    "model": model,
+                    "content": [{"type": "text", "text": text}],
+                    "stop_reason": stop_reason,
+                    "usage": usage,
+                },
+            )
+        yield {"type": "done", "text": text, "model": model, "usage": usage}
+
+    def _build_prompt(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        summary: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        system = None
+        budget = context_manager.max_input_tokens
+        if summary:
+            system = SUMMARY_SYSTEM_PROMPT.format(summary=summary)
+            budget = max(budget - estimate_tokens(system), 0)
+        messages = context_manager.build_messages(
+            user_message, chat_history, max_input_tokens=budget
+        )
+        return messages, system
+
     async def chat(
-        self, user_message: str, chat_history: Optional[List[Dict[str, str]]] = None
-    ) -> str:
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        summary: Optional[str] = None,
+        user_id: Optional[int] = None,
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
         Send a message to Claude and get a response, with optional chat history.
-        
+
         Args:
             user_message: The user's message
-            chat_history: Optional list of previous messages
-            
+            chat_history: Optional list of previous messages, trimmed to the
+                context token budget
+            summary: Optional running summary of turns no longer in chat_history
+            user_id: ID of the requesting user, used to scope the response cache
+            model: Model chosen for this turn, defaults to the service model
+
         Returns:
-            The assistant's response text
+            Dict with the assistant's response text, the model that produced
+            it and the token usage (including prompt-cache reads and writes)
         """
-        messages = chat_history or []
-        messages.append({"role": "user", "content": user_message})
+        messages, system = self._build_prompt(user_message, chat_history, summary)
+        model = model or self.model
+        result = await self.generate_response(
+            messages,
+            system=system,
+            cache_scope=response_cache.scope_for(user_id),
+            model=model,
+        )
+        assistant_message = result.get("content", [{"text": "No response received"}])[
+            0
+        ]["text"]
+        cached = bool(result.get("cached"))
+
+        return {
+            "text": assistant_message,
+            "model": result.get("model", model),
+            # A cache hit cost nothing upstream
+            "usage": self._normalize_usage(None if cached else result.get("usage")),
+            "cached": cached,
+        }
 
-        # Remove messages over token limit if needed (simplified)
-        # In a real app, you'd implement more sophisticated token management
-        if len(messages) > 10:
-            messages = messages[-10:]
-        
-        result = await self.generate_response(messages)
-        assistant_message = result.get("content", [{"text": "No response received"}])[0]["text"]
-        
-        return assistant_message
+    async def summarize(
+        self, previous_summary: Optional[str], messages: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Fold a batch of older turns into the running conversation summary.
+
+        Args:
+            previous_summary: The current summary, if any
+            messages: Turns not yet covered by the summary, oldest first
+
+        Returns:
+            The updated summary text
+        """
+        transcript = "\n\n".join(
+            f"{msg['role'].upper()}: {msg['content']}"
+            for msg in messages
+            if msg.get("role") in CONVERSATION_ROLES
+        )
+        prompt = SUMMARY_UPDATE_PROMPT.format(
+            summary=previous_summary or "(none yet)", transcript=transcript
+        )
+        model = self.model
+        if settings.MODEL_ROUTING_ENABLED and settings.CLAUDE_FAST_MODEL:
+            # Summaries are a cheap, latency-insensitive task
+            model = settings.CLAUDE_FAST_MODEL
+        result = await self.generate_response(
+            [{"role": "user", "content": prompt}],
+            max_tokens=settings.CONTEXT_SUMMARY_MAX_TOKENS,
+            model=model,
+        )
+        return result.get("content", [{"text": previous_summary or ""}])[0][
+            "text"
+        ].strip()
 
 
 # Singleton instance
-claude_service = ClaudeService()
\ No newline at end of file
+claude_service = ClaudeService()
@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.utils.tokenizer import estimate_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Roles accepted by the Messages API; stored system/error notes are skipped
+CONVERSATION_ROLES = ("user", "assistant")
+
+
+class ContextWindowManager:
+    def __init__(self, max_input_tokens: int = settings.CONTEXT_MAX_INPUT_TOKENS):
+        self.max_input_tokens = max_input_tokens
+
+    @staticmethod
+    def message_tokens(message: Dict[str, Any]) -> int:
+        """
+        Token count for a message, using the stored count when available.
+
+        Args:
+            message: Message dict with content and optional token_count
+
+        Returns:
+            Approximate token count
+        """
+        token_count = message.get("token_count")
+        if token_count is None:
+            token_count = estimate_message_tokens(message["content"])
+        return token_count
+
+    def build_messages(
+        self,
+        user_message: str,
+        chat_history: Optional[List[Dict[str, Any]]] = None,
+        max_input_tokens: Optional[int] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Select as much recent history as fits in the token budget.
+
+        Args:
+            user_message: The new user message, always included
+            chat_history: Previous messages, oldest first
+            max_input_tokens: Override for the configured budget
+
+        Returns:
+            Messages to send to Claude, starting with a user turn
+        """
+        budget = self.max_input_tokens if max_input_tokens is None else max_input_tokens
+        used = estimate_message_tokens(user_message)
+
+        selected: List[Dict[str, Any]] = []
+        for message in reversed(chat_history or []):
+            if message.get("role") not in CONVERSATION_ROLES:
+                continue
+            tokens = self.message_tokens(message)
+            if used + tokens > budget:
+                break
+            used += tokens
+            selected.append(message)
+        selected.reverse()
+
+        # The conversation sent upstream must open with a user turn
+        while selected and selected[0]["role"] != "user":
+            used -= self.message_tokens(selected.pop(0))
+
+        messages = [
+            {"role": msg["role"], "content": msg["content"]} for msg in selected
+        ]
+        messages.append({"role": "user", "content": user_message})
+        logger.debug(f"Context window: {len(messages)} messages, ~{used} tokens")
+        return messages
+
+
+# Singleton instance
+context_manager = ContextWindowManager()
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when an idempotency key is reused for a different message."""
+
+
+class IdempotencyStore:
+    """
+    Single-flight deduplication of chat turns keyed by a client-supplied key.
+
+    The first request for a key does the work; concurrent duplicates wait for
+    its result, and later duplicates get the completed result replayed until it
+    expires. Failed attempts are not remembered, so a retry runs again. State
+    is per worker process.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = settings.IDEMPOTENCY_MAX_ENTRIES,
+    ):
+        self._completed: TTLCache[Tuple[str, Dict[str, Any]]] = TTLCache(
+            max_entries=max_entries, ttl_seconds=ttl_seconds
+        )
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def make_key(user_id: int, client_key: str) -> str:
+        return f"{user_id}:{client_key}"
+
+    @staticmethod
+    def fingerprint(session_id: Optional[str], message: str) -> str:
+        return hashlib.sha256(
+            f"{session_id or ''}\x00{message}".encode("utf-8")
+        ).hexdigest()
+
+    async def acquire(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a key or get the result of an earlier request with the same key.
+
+        Args:
+            key: Key from make_key()
+            fingerprint: Fingerprint of the request payload
+
+        Returns:
+            The stored result for a duplicate request, or None if the caller now
+            owns the key and must call complete() or release()
+
+        Raises:
+            IdempotencyConflictError: If the key was used for a different request
+        """
+        while True:
+            entry = self._completed.get(key)
+            if entry is not None:
+                self._check(key, entry[0], fingerprint)
+                metrics.increment("idempotency.replays")
+                logger.info(f"Replaying completed result for idempotency key {key}")
+                return entry[1]
+
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                self._in_flight[key] = (
+                    fingerprint,
+                    asyncio.get_running_loop().create_future(),
+                )
+                return None
+
+            self._check(key, in_flight[0], fingerprint)
+            metrics.increment("idempotency.joined")
+            logger.info(f"Waiting for in-flight request with idempotency key {key}")
+            try:
+                return await asyncio.shield(in_flight[1])
+            except Exception:
+                # The original attempt failed; loop around and take over the key
+                continue
+
+    def complete(self, key: str, result: Dict[str, Any]) -> None:
+        """Store the result for a key and wake up waiting duplicates."""
+        fingerprint, future = self._in_flight.pop(key, (None, None))
+        if fingerprint is not None:
+            self._completed.set(key, (fingerprint, result))
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def release(self, key: str, error: Optional[BaseException] = None) -> None:
+        """Give up a key after a failed attempt so it can be retried."""
+        _, future = self._in_flight.pop(key, (None, None))
+        if future is not None and not future.done():
+            if not isinstance(error, Exception):
+                error = RuntimeError("Request was cancelled")
+            future.set_exception(error)
+            # Nobody may be waiting; mark the exception as retrieved
+            future.exception()
+
+    @staticmethod
+    def _check(key: str, stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise IdempotencyConflictError(
+                f"Idempotency key {key.split(':', 1)[-1]} was already used for a "
+                "different message"
+            )
+
+
+# Singleton instance
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,71 @@
+import logging
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FAST_TIER = "fast"
+STRONG_TIER = "strong"
+TIERS = (FAST_TIER, STRONG_TIER)
+
+
+class ModelRouter:
+    """
+    Pick a model tier for each chat turn.
+
+    Rules are applied in order: a per-user tier pin, an explicit client hint,
+    then content heuristics (code, message length, session depth). Anything
+    not clearly trivial goes to the strong model.
+    """
+
+    def model_for_tier(self, tier: str) -> str:
+        if tier == FAST_TIER and settings.CLAUDE_FAST_MODEL:
+            return settings.CLAUDE_FAST_MODEL
+        return settings.CLAUDE_MODEL
+
+    def _decision(self, tier: str, reason: str) -> Dict[str, str]:
+        return {"model": self.model_for_tier(tier), "tier": tier, "reason": reason}
+
+    def route(
+        self,
+        user_id: int,
+        message: str,
+        session_depth: int,
+        hint: Optional[str] = None,
+    ) -> Dict[str, str]:
+        """
+        Route a chat turn to a model.
+
+        Args:
+            user_id: ID of the user sending the message
+            message: The new user message
+            session_depth: Number of messages already in the session
+            hint: Optional client-requested tier ("fast" or "strong")
+
+        Returns:
+            Dict with the chosen model, its tier and the rule that decided it
+        """
+        if not settings.MODEL_ROUTING_ENABLED or not settings.CLAUDE_FAST_MODEL:
+            decision = self._decision(STRONG_TIER, "routing_disabled")
+        elif settings.ROUTING_USER_TIERS.get(user_id) in TIERS:
+            decision = self._decision(settings.ROUTING_USER_TIERS[user_id], "user_tier")
+        elif hint in TIERS:
+            decision = self._decision(hint, "client_hint")
+        elif "```" in message:
+            decision = self._decision(STRONG_TIER, "code")
+        elif len(message) > settings.ROUTING_FAST_MAX_CHARS:
+            decision = self._decision(STRONG_TIER, "message_length")
+        elif session_depth > settings.ROUTING_FAST_MAX_DEPTH:
+            decision = self._decision(STRONG_TIER, "session_depth")
+        else:
+            decision = self._decision(FAST_TIER, "short_message")
+        logger.debug(
+            f"Routed turn for user {user_id} to {decision['model']} "
+            f"({decision['reason']})"
+        )
+        return decision
+
+
+# Singleton instance
+model_router = ModelRouter()
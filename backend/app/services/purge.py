@@ -0,0 +1,141 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+from app.core.config import settings
+from app.db.archive import delete_user_archives
+from app.db.elasticsearch import forget_recent_writes, get_task, start_user_delete
+from app.db.session_registry import purge_user_sessions
+from app.services.chat import chat_service
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# How often the cleanup checks whether the sessions have been deleted
+POLL_INTERVAL = 2.0
+
+
+class UserHistoryPurge:
+    """
+    Delete all of a user's chat history without blocking the API.
+
+    Elasticsearch does the heavy lifting in throttled, sliced delete_by_query
+    tasks whose progress is read back through the tasks API. Once both tasks
+    have finished without failures, a background task on this worker removes
+    the PostgreSQL rows and archived sessions. If either task fails, the
+    rows stay, so the sessions left in Elasticsearch are still listed and the
+    purge can be run again.
+
+    Before the rows go, the cleanup waits out the session cache TTL: by then
+    no worker still holds one of the user's sessions in its cache, so none
+    can write to it and re-register its row afterwards.
+    """
+
+    def __init__(self) -> None:
+        self._cleanups: Set[asyncio.Task] = set()
+
+    async def start(self, user_id: int) -> Dict[str, Any]:
+        """
+        Start purging a user's chat history.
+
+        Returns:
+            The user ID and the Elasticsearch task IDs to poll for progress
+        """
+        self._evict(user_id)
+        tasks = await start_user_delete(user_id)
+        cleanup = asyncio.create_task(self._clean_up(user_id, tasks))
+        self._cleanups.add(cleanup)
+        cleanup.add_done_callback(self._cleanups.discard)
+        metrics.increment("chat_history.purges")
+        return {"user_id": user_id, "tasks": tasks}
+
+    @staticmethod
+    def _evict(user_id: int) -> None:
+        chat_service.evict_user(user_id)
+        forget_recent_writes(user_id)
+
+    async def _wait_for(self, task_id: str) -> Optional[str]:
+        """Wait for a delete_by_query task; returns why it failed, or None."""
+        while True:
+            task = await get_task(task_id)
+            if task is None:
+                return "task not found"
+            if task.get("completed"):
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+        if task.get("error"):
+            return str(task["error"])
+        failures = (task.get("response") or {}).get("failures") or []
+        if failures:
+            return f"{len(failures)} failures, first: {failures[0]}"
+        return None
+
+    async def _clean_up(self, user_id: int, tasks: Dict[str, str]) -> None:
+        try:
+            for name, task_id in tasks.items():
+                error = await self._wait_for(task_id)
+                if error:
+                    logger.error(
+                        f"Purge of user {user_id} {name} failed, keeping their rows: "
+                        f"{error}"
+                    )
+                    return
+            if settings.SESSION_CACHE_ENABLED:
+                await asyncio.sleep(settings.SESSION_CACHE_TTL_SECONDS)
+            self._evict(user_id)
+            purged = await purge_user_sessions(
+                user_id, settings.ADMIN_PURGE_SQL_BATCH_SIZE
+            )
+            await delete_user_archives(user_id)
+            logger.info(
+                f"Purged {purged} session rows and the archives of user {user_id}"
+            )
+        except asyncio.CancelledError:
+            logger.warning(
+                f"Purge cleanup of user {user_id} interrupted; run the purge again to "
+                "finish it"
+            )
+            raise
+        except Exception as e:
+            logger.error(f"Purge cleanup of user {user_id} failed: {e}", exc_info=True)
+
+    async def progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Report the progress of one purge task.
+
+        Returns:
+            Progress summary, or None if Elasticsearch does not know the task
+        """
+        task = await get_task(task_id)
+        if task is None:
+            return None
+        # Finished tasks report their totals in the response, running ones in the status
+        status = task.get("response") or task.get("task", {}).get("status", {})
+        total = status.get("total", 0)
+        done = status.get("deleted", 0) + status.get("version_conflicts", 0)
+        return {
+            "task_id": task_id,
+            "completed": bool(task.get("completed")),
+            "total": total,
+            "deleted": status.get("deleted", 0),
+            "version_conflicts": status.get("version_conflicts", 0),
+            "batches": status.get("batches", 0),
+            "percent": (
+                round(100.0 * done / total, 1)
+                if total
+                else (100.0 if task.get("completed") else 0.0)
+            ),
+            "throttled_millis": status.get("throttled_millis", 0),
+            "failures": len(status.get("failures") or []),
+            "error": task.get("error"),
+        }
+
+    async def close(self) -> None:
+        for cleanup in list(self._cleanups):
+            cleanup.cancel()
+        if self._cleanups:
+            await asyncio.gather(*self._cleanups, return_exceptions=True)
+
+
+# Singleton instance
+user_history_purge = UserHistoryPurge()
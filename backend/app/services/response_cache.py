@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.utils import metrics
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        return _WHITESPACE.sub(" ", content).strip()
+    # Content blocks: ignore cache_control and other transport-only fields
+    return [
+        {"type": block.get("type"), "text": _normalize_content(block.get("text", ""))}
+        for block in content
+    ]
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of upstream Messages API results.
+
+    Keys are a hash of the model, generation parameters and the normalized
+    message list. Lookups hit an in-memory LRU first and then, if configured,
+    a directory of JSON files that survives restarts.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        max_bytes: int = settings.RESPONSE_CACHE_MAX_BYTES,
+        cache_dir: Optional[str] = settings.RESPONSE_CACHE_DIR,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.cache_dir = cache_dir
+        self._memory: TTLCache[Dict[str, Any]] = TTLCache(
+            max_entries=max_entries,
+            ttl_seconds=ttl_seconds,
+            max_bytes=max_bytes,
+            sizeof=lambda value: len(json.dumps(value)),
+        )
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def scope_for(user_id: Optional[int]) -> str:
+        """
+        Cache scope for a chat turn.
+
+        Args:
+            user_id: ID of the user sending the message
+
+        Returns:
+            "global" or a per-user scope depending on RESPONSE_CACHE_SCOPE
+        """
+        if settings.RESPONSE_CACHE_SCOPE == "global" or user_id is None:
+            return "global"
+        return f"user:{user_id}"
+
+    @staticmethod
+    def make_key(
+        scope: str,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        system: Optional[str] = None,
+    ) -> str:
+        """
+        Hash a request into a cache key.
+
+        Args:
+            scope: Cache scope from scope_for()
+            model: Model name
+            messages: Messages as sent upstream
+            max_tokens: Maximum number of tokens to generate
+            system: Optional system prompt
+
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = {
+            "scope": scope,
+            "model": model,
+            "max_tokens": max_tokens,
+            "system": _normalize_content(system) if system else None,
+            "messages": [
+                {"role": msg["role"], "content": _normalize_content(msg["content"])}
+                for msg in messages
+            ],
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            key: Key from make_key()
+
+        Returns:
+            Cached Messages API result, or None on a miss
+        """
+        result = self._memory.get(key)
+        if result is None and self.cache_dir:
+            result = await asyncio.to_thread(self._read_disk, key)
+            if result is not None:
+                metrics.increment("response_cache.disk_hits")
+                self._memory.set(key, result)
+        if result is None:
+            metrics.increment("response_cache.misses")
+            return None
+        metrics.increment("response_cache.hits")
+        return result
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a result in every configured tier.
+
+        Args:
+            key: Key from make_key()
+            result: Messages API result to cache
+        """
+        self._memory.set(key, result)
+        if self.cache_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, result)
+            except OSError as e:
+                logger.warning(f"Failed to write response cache entry {key}: {e}")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("expires_at", 0) < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry["result"]
+
+    def _write_disk(self, key: str, result: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"expires_at": time.time() + self.ttl_seconds, "result": result}, f
+            )
+        os.replace(tmp_path, path)
+
+
+# Singleton instance
+response_cache = ResponseCache()
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.db.archive import (
+    delete_session_archive,
+    delete_user_archives,
+    get_archived_user_ids,
+    write_session_archive,
+)
+from app.db.elasticsearch import (
+    delete_archived_sessions,
+    delete_sessions,
+    delete_user_documents,
+    get_sessions_for_archive,
+    iter_session_user_ids,
+    scan_documents,
+)
+from app.db.postgresql import try_advisory_lock
+from app.db.session_registry import (
+    delete_registered_sessions,
+    delete_user_sessions,
+    existing_user_ids,
+)
+from app.services.chat import chat_service
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Sessions (or users) handled per batch
+BATCH_SIZE = 500
+
+SESSION_KEY_FIELDS = ["session_id", "user_id", "last_activity", "updated_at"]
+
+# PostgreSQL advisory lock ID; one pass at a time across all workers
+RETENTION_LOCK_ID = 720_023
+
+
+class RetentionJob:
+    """
+    Keep the hot sessions index down to sessions that are still in use.
+
+    Each pass, in order:
+
+    * purges sessions that never got a message within
+      RETENTION_EMPTY_SESSION_HOURS of being created;
+    * purges sessions (and archives) of users who no longer exist;
+    * moves sessions idle for RETENTION_IDLE_DAYS, with their messages, to
+      gzip files under ARCHIVE_DIR. They stay in the session listing and
+      are restored into the indices when next opened.
+
+    Runs every RETENTION_INTERVAL_SECONDS in the background when enabled.
+    Every worker runs the loop, but a pass only goes ahead while holding a
+    PostgreSQL advisory lock; the others skip it.
+    """
+
+    def __init__(self, interval: float = settings.RETENTION_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start running passes on the current event loop."""
+        if self.running:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started retention job (interval={self.interval}s)")
+
+    async def close(self) -> None:
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Stopped retention job")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Retention pass failed: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Optional[Dict[str, int]]:
+        """
+        Run one retention pass, unless another worker is running one.
+
+        Returns:
+            Counts of sessions purged as empty, purged as orphaned and
+            archived, or None if the pass was skipped
+        """
+        async with try_advisory_lock(RETENTION_LOCK_ID) as acquired:
+            if not acquired:
+                logger.info("Retention pass already running elsewhere, skipping")
+                return None
+            stats = {
+                "purged_empty": await self.purge_empty_sessions(),
+                "purged_orphaned": await self.purge_orphaned_sessions(),
+                "archived": await self.archive_idle_sessions(),
+            }
+        logger.info(f"Retention pass finished: {stats}")
+        return stats
+
+    async def purge_empty_sessions(self) -> int:
+        cutoff = datetime.utcnow() - timedelta(
+            hours=settings.RETENTION_EMPTY_SESSION_HOURS
+        )
+        query = {
+            "bool": {
+                "filter": [{"range": {"created_at": {"lt": cutoff.isoformat()}}}],
+                "must_not": [
+                    {"range": {"message_count": {"gt": 0}}},
+                    # Sessions from before the messages index embed their messages
+                    {
+                        "nested": {
+                            "path": "messages",
+                            "query": {"exists": {"field": "messages.id"}},
+                        }
+                    },
+                ],
+            }
+        }
+        purged = 0
+        batch: List[Dict[str, Any]] = []
+        async for session in scan_documents(
+            settings.CHAT_INDEX_NAME, query=query, source_includes=SESSION_KEY_FIELDS
+        ):
+            batch.append(session)
+            if len(batch) >= BATCH_SIZE:
+                purged += await self._purge(batch)
+                batch = []
+        if batch:
+            purged += await self._purge(batch)
+        metrics.increment("retention.purged_sessions", purged)
+        return purged
+
+    async def _purge(self, sessions: List[Dict[str, Any]]) -> int:
+        deleted = await delete_sessions(sessions)
+        await delete_registered_sessions(
+            [session["session_id"] for session in sessions]
+        )
+        for session in sessions:
+            chat_service.evict_session(session["session_id"])
+        return deleted
+
+    async def purge_orphaned_sessions(self) -> int:
+        """Remove the sessions and archives of users whose account is gone."""
+        user_ids = set(await get_archived_user_ids())
+        async for user_id in iter_session_user_ids():
+            user_ids.add(user_id)
+
+        purged = 0
+        candidates = sorted(user_ids)
+        for start in range(0, len(candidates), BATCH_SIZE):
+            batch = candidates[start : start + BATCH_SIZE]
+            orphaned = sorted(set(batch) - await existing_user_ids(batch))
+            if not orphaned:
+                continue
+            purged += await delete_user_documents(orphaned)
+            await delete_user_sessions(orphaned)
+            for user_id in orphaned:
+                await delete_user_archives(user_id)
+            logger.info(f"Purged chat data of {len(orphaned)} deleted users")
+        metrics.increment("retention.purged_sessions", purged)
+        return purged
+
+    async def archive_idle_sessions(self) -> int:
+        cutoff = (
+            datetime.utcnow() - timedelta(days=settings.RETENTION_IDLE_DAYS)
+        ).isoformat()
+        query = {
+            "bool": {
+                "should": [
+                    {"range": {"last_activity": {"lt": cutoff}}},
+                    # Sessions from before last_activity was tracked
+                    {
+                        "bool": {
+                            "must_not": {"exists": {"field": "last_activity"}},
+                            "filter": {"range": {"updated_at": {"lt": cutoff}}},
+                        }
+                    },
+                ],
+                "minimum_should_match": 1,
+            }
+        }
+        archived = 0
+        batch: List[Dict[str, Any]] = []
+        async for candidate in scan_documents(
+            settings.CHAT_INDEX_NAME, query=query, source_includes=SESSION_KEY_FIELDS
+        ):
+            batch.append(candidate)
+            if len(batch) >= BATCH_SIZE:
+                archived += await self._archive(batch, cutoff)
+                batch = []
+        if batch:
+            archived += await self._archive(batch, cutoff)
+        metrics.increment("retention.archived_sessions", archived)
+        return archived
+
+    async def _archive(self, candidates: List[Dict[str, Any]], cutoff: str) -> int:
+        try:
+            loaded = await get_sessions_for_archive(candidates)
+        except Exception as e:
+            logger.error(
+                f"Failed to load {len(candidates)} sessions to archive: {e}",
+                exc_info=True,
+            )
+            return 0
+        written: List[Dict[str, Any]] = []
+        for session, key in loaded:
+            # It may have been used since the scan started
+            if (
+                session.get("last_activity") or session.get("updated_at") or ""
+            ) >= cutoff:
+                continue
+            messages = session.pop("messages", [])
+            try:
+                await write_session_archive(session, messages)
+            except Exception as e:
+                logger.error(
+                    f"Failed to archive session {key['session_id']}: {e}", exc_info=True
+                )
+                continue
+            written.append(key)
+        if not written:
+            return 0
+
+        # The session rows in PostgreSQL stay, so archived sessions are still listed
+        try:
+            deleted = set(await delete_archived_sessions(written))
+        except Exception as e:
+            # The archives are rewritten on the next pass
+            logger.error(
+                f"Failed to delete {len(written)} archived sessions: {e}", exc_info=True
+            )
+            return 0
+        for key in written:
+            chat_service.evict_session(key["session_id"])
+            if key["session_id"] not in deleted:
+                # Written to after it was read; the indexed copy is the current one
+                await delete_session_archive(key["session_id"], key["user_id"])
+        if len(deleted) < len(written):
+            metrics.increment(
+                "retention.archive_conflicts", len(written) - len(deleted)
+            )
+            logger.info(
+                f"Kept {len(written) - len(deleted)} sessions that changed while being "
+                "archived"
+            )
+        return len(deleted)
+
+
+# Singleton instance, started on app startup when RETENTION_ENABLED
+retention_job = RetentionJob()
@@ -0,0 +1,300 @@
+import asyncio
+import json
+import logging
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+from app.db.archive import iter_session_archives
+from app.db.elasticsearch import import_documents, scan_documents
+from app.db.session_registry import (
+    existing_user_ids,
+    register_chat_messages,
+    register_chat_sessions,
+)
+
+logger = logging.getLogger(__name__)
+
+# gzip container for zlib (de)compressobj
+GZIP_WBITS = 31
+# Emit compressed output in chunks of roughly this size
+EXPORT_CHUNK_BYTES = 64 * 1024
+# Decompress imports this much at a time, so one small chunk cannot expand
+# into an arbitrary amount of memory
+IMPORT_INFLATE_BYTES = 1024 * 1024
+
+
+class ChatTransfer:
+    """
+    Export and import of chat histories as gzip-compressed NDJSON.
+
+    Each line is ``{"type": "session" | "message", "doc": {...}}`` holding
+    the Elasticsearch source as stored. An export writes every session before
+    any message, so an import has registered a session by the time its
+    messages arrive. Both directions stream, so memory use does not depend on
+    the size of the history. Sessions archived by the retention job are
+    exported from their archive files along with the indexed ones.
+    """
+
+    def __init__(
+        self,
+        bulk_actions: int = settings.IMPORT_BULK_ACTIONS,
+        concurrency: int = settings.IMPORT_CONCURRENCY,
+        max_bytes: int = settings.IMPORT_MAX_BYTES,
+        max_line_bytes: int = settings.IMPORT_MAX_LINE_BYTES,
+    ):
+        self.bulk_actions = bulk_actions
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.max_line_bytes = max_line_bytes
+
+    async def export_history(
+        self, user_id: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Stream sessions and messages as gzip-compressed NDJSON.
+
+        Args:
+            user_id: Only this user's history, or None for the whole cluster
+
+        Yields:
+            Chunks of the gzip stream
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS)
+        pending: List[bytes] = []
+        pending_bytes = 0
+        counts = {"session": 0, "message": 0}
+        for kind, index in (
+            ("session", settings.CHAT_INDEX_NAME),
+            ("message", settings.CHAT_MESSAGES_INDEX_NAME),
+        ):
+            async for document in self._documents(kind, index, user_id):
+                line = (
+                    json.dumps(
+                        {"type": kind, "doc": document}, separators=(",", ":")
+                    ).encode("utf-8")
+                    + b"\n"
+                )
+                chunk = compressor.compress(line)
+                counts[kind] += 1
+                if chunk:
+                    pending.append(chunk)
+                    pending_bytes += len(chunk)
+                if pending_bytes >= EXPORT_CHUNK_BYTES:
+                    yield b"".join(pending)
+                    pending, pending_bytes = [], 0
+        pending.append(compressor.flush())
+        yield b"".join(pending)
+        logger.info(
+            f"Exported {counts['session']} sessions and {counts['message']} messages"
+            f" ({'user ' + str(user_id) if user_id is not None else 'all users'})"
+        )
+
+    @staticmethod
+    async def _documents(
+        kind: str, index: str, user_id: Optional[int]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Indexed documents of one kind, then the archived ones."""
+        async for document in scan_documents(index, user_id):
+            yield document
+        # Archives are read once per kind, so sessions still precede messages
+        async for archive in iter_session_archives(user_id):
+            session = archive["session"]
+            if kind == "session":
+                yield session
+                continue
+            for message in archive["messages"]:
+                yield {
+                    **message,
+                    "session_id": session["session_id"],
+                    "user_id": session["user_id"],
+                }
+
+    async def import_history(self, chunks: AsyncIterator[bytes]) -> Dict[str, int]:
+        """
+        Load a gzip-compressed NDJSON export through the _bulk API.
+
+        Up to ``concurrency`` bulk requests of ``bulk_actions`` documents are
+        in flight at once; reading the input pauses until one completes.
+        Sessions are overwritten, messages that already exist are kept.
+        Documents of users without an account are skipped, in both stores.
+
+        Args:
+            chunks: The gzip stream, in chunks of any size
+
+        Returns:
+            Counts of sessions and messages written, already present, failed,
+            skipped for an unknown user, and messages whose session could
+            not be registered
+
+        Raises:
+            ValueError: If the input is not a valid export
+            HTTPException: 413 if the input or one of its lines is too large
+        """
+        stats = {
+            "sessions": 0,
+            "messages": 0,
+            "existing": 0,
+            "failed": 0,
+            "skipped": 0,
+            "unregistered": 0,
+        }
+        slots = asyncio.Semaphore(self.concurrency)
+        in_flight: Set[asyncio.Task] = set()
+
+        async def send(kind: str, documents: List[Dict[str, Any]]) -> None:
+            try:
+                await self._import_batch(kind, documents, stats)
+            finally:
+                slots.release()
+
+        async def submit(kind: str, documents: List[Dict[str, Any]]) -> None:
+            await slots.acquire()
+            task = asyncio.create_task(send(kind, documents))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        async def wait_in_flight() -> None:
+            if in_flight:
+                await asyncio.gather(*in_flight)
+
+        batch: List[Dict[str, Any]] = []
+        batch_kind = "session"
+        try:
+            async for line_number, record in self._read_lines(
+                chunks, self.max_bytes, self.max_line_bytes
+            ):
+                kind = record.get("type") if isinstance(record, dict) else None
+                document = record.get("doc") if kind else None
+                if kind not in ("session", "message") or not isinstance(document, dict):
+                    raise ValueError(f"Invalid export record on line {line_number}")
+                if kind != batch_kind:
+                    if batch:
+                        await submit(batch_kind, batch)
+                        batch = []
+                    if kind == "message":
+                        # Sessions must be registered before their messages
+                        await wait_in_flight()
+                    batch_kind = kind
+                batch.append(document)
+                if len(batch) >= self.bulk_actions:
+                    await submit(batch_kind, batch)
+                    batch = []
+            if batch:
+                await submit(batch_kind, batch)
+            await wait_in_flight()
+        except BaseException:
+            for task in in_flight:
+                task.cancel()
+            raise
+        logger.info(f"Import finished: {stats}")
+        return stats
+
+    async def _import_batch(
+        self, kind: str, documents: List[Dict[str, Any]], stats: Dict[str, int]
+    ) -> None:
+        # Registering a document of an unknown user would fail its whole
+        # batch in PostgreSQL, after Elasticsearch already has it
+        user_ids = {document.get("user_id") for document in documents}
+        known = await existing_user_ids(
+            sorted(u for u in user_ids if isinstance(u, int))
+        )
+        kept = [document for document in documents if document.get("user_id") in known]
+        if len(kept) < len(documents):
+            stats["skipped"] += len(documents) - len(kept)
+            logger.warning(
+                f"Skipped {len(documents) - len(kept)} {kind}s of unknown users"
+            )
+        if not kept:
+            return
+        documents = kept
+
+        if kind == "session":
+            result = await import_documents(
+                settings.CHAT_INDEX_NAME, documents, "session_id"
+            )
+            id_field = "session_id"
+        else:
+            # Messages are immutable; a re-import leaves existing ones alone
+            result = await import_documents(
+                settings.CHAT_MESSAGES_INDEX_NAME, documents, "id", op_type="create"
+            )
+            id_field = "id"
+        stats[f"{kind}s"] += result["written"]
+        stats["existing"] += result["existing"]
+        stats["failed"] += len(result["failed"])
+
+        failed = set(result["failed"])
+        stored = [
+            document for document in documents if document[id_field] not in failed
+        ]
+        if not stored:
+            return
+        if kind == "session":
+            await register_chat_sessions(stored)
+        else:
+            stats["unregistered"] += await register_chat_messages(stored)
+
+    @staticmethod
+    async def _read_lines(
+        chunks: AsyncIterator[bytes], max_bytes: int, max_line_bytes: int
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        Decompress a gzip stream and yield (line number, parsed record) pairs.
+
+        Raises:
+            HTTPException: 413 once the decompressed data exceeds max_bytes or
+                a line exceeds max_line_bytes
+        """
+        decompressor = zlib.decompressobj(GZIP_WBITS)
+        remainder = b""
+        line_number = 0
+        total = 0
+        async for chunk in chunks:
+            while chunk:
+                try:
+                    data = decompressor.decompress(chunk, IMPORT_INFLATE_BYTES)
+                except zlib.error as e:
+                    raise ValueError(f"Invalid gzip data: {e}")
+                chunk = decompressor.unconsumed_tail
+                total += len(data)
+                if total > max_bytes:
+                    raise ChatTransfer._too_large(
+                        f"Import exceeds {max_bytes} bytes uncompressed"
+                    )
+                *lines, remainder = (remainder + data).split(b"\n")
+                for line in lines:
+                    line_number += 1
+                    if len(line) > max_line_bytes:
+                        raise ChatTransfer._too_large(
+                            f"Line {line_number} exceeds {max_line_bytes} bytes"
+                        )
+                    if line.strip():
+                        yield line_number, ChatTransfer._parse(line, line_number)
+                if len(remainder) > max_line_bytes:
+                    raise ChatTransfer._too_large(
+                        f"Line {line_number + 1} exceeds {max_line_bytes} bytes"
+                    )
+        if not decompressor.eof:
+            raise ValueError("Truncated gzip data")
+        if remainder.strip():
+            yield line_number + 1, ChatTransfer._parse(remainder, line_number + 1)
+
+    @staticmethod
+    def _too_large(detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail
+        )
+
+    @staticmethod
+    def _parse(line: bytes, line_number: int) -> Any:
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise ValueError(f"Invalid JSON on line {line_number}")
+
+
+# Singleton instance
+chat_transfer = ChatTransfer()
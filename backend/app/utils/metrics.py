@@ -0,0 +1,45 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+# In-process counters, one set per worker
+# In production, export these to Prometheus/StatsD instead
+_counters: Dict[str, float] = defaultdict(float)
+_lock = threading.Lock()
+
+
+def increment(name: str, value: float = 1) -> None:
+    """
+    Increase a counter.
+
+    Args:
+        name: Dotted counter name, e.g. "claude.requests"
+        value: Amount to add
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def get(name: str) -> float:
+    """
+    Read the current value of a counter.
+
+    Args:
+        name: Counter name
+
+    Returns:
+        Counter value, 0 if it was never incremented
+    """
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def snapshot() -> Dict[str, float]:
+    """
+    Get a copy of all counters.
+
+    Returns:
+        Mapping of counter name to value
+    """
+    with _lock:
+        return dict(sorted(_counters.items()))
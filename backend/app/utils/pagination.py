@@ -0,0 +1,45 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional
+
+
+def encode_cursor(sort_values: Optional[List[Any]]) -> Optional[str]:
+    """
+    Encode Elasticsearch sort values as an opaque, URL-safe cursor.
+
+    Args:
+        sort_values: The ``sort`` array of the last hit on a page
+
+    Returns:
+        Cursor string, or None if there is no next page
+    """
+    if not sort_values:
+        return None
+    raw = json.dumps(sort_values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """
+    Decode a cursor produced by encode_cursor into ``search_after`` values.
+
+    Args:
+        cursor: Cursor string from a previous page, or None for the first page
+
+    Returns:
+        Sort values to pass as ``search_after``, or None
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(sort_values, list) or not sort_values:
+        raise ValueError("Invalid cursor")
+    return sort_values
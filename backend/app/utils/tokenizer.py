@@ -0,0 +1,40 @@
+import re
+
+# Rough stand-in for the Claude tokenizer: words, numbers and punctuation are
+# split apart, and long words are charged extra since BPE breaks them into
+# several sub-word tokens.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Fixed per-message cost for role markers and turn separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a piece of text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Approximate token count
+    """
+    if not text:
+        return 0
+    word_estimate = sum(1 + len(piece) // 8 for piece in _TOKEN_PATTERN.findall(text))
+    # Dense text (code, URLs, non-latin scripts) is better approximated by length
+    char_estimate = (len(text) + 3) // 4
+    return max(word_estimate, char_estimate)
+
+
+def estimate_message_tokens(content: str) -> int:
+    """
+    Estimate the tokens a single chat message contributes to a prompt.
+
+    Args:
+        content: Message content
+
+    Returns:
+        Approximate token count including per-message overhead
+    """
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
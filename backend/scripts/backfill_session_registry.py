@@ -0,0 +1,95 @@
+"""
+Backfill the PostgreSQL chat_sessions table from Elasticsearch.
+
+Sessions created before the relational index was kept in sync are only in
+Elasticsearch, so they are missing from the session listing until their
+next message. This registers every session document (ownership, title and
+listing stats); sessions already registered are left alone:
+
+    python scripts/backfill_session_registry.py --batch-size 500
+
+Run it from the backend directory with the application's environment.
+"""
+
+import argparse
+import logging
+from typing import Any, Dict, List
+
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.db.postgresql import SessionLocal
+from app.db.session_registry import session_row_values
+from app.models.chat import ChatSession
+
+logger = logging.getLogger("backfill_session_registry")
+
+
+def flush(batch: List[Dict[str, Any]]) -> int:
+    with SessionLocal() as db:
+        result = db.execute(
+            insert(ChatSession)
+            .values([session_row_values(session) for session in batch])
+            .on_conflict_do_nothing(index_elements=["session_id"])
+        )
+        db.commit()
+        return result.rowcount
+
+
+def main(args: argparse.Namespace) -> None:
+    auth = None
+    if settings.ELASTICSEARCH_USERNAME and settings.ELASTICSEARCH_PASSWORD:
+        auth = (settings.ELASTICSEARCH_USERNAME, settings.ELASTICSEARCH_PASSWORD)
+    es = Elasticsearch(
+        [f"http://{settings.ELASTICSEARCH_HOST}:{settings.ELASTICSEARCH_PORT}"],
+        basic_auth=auth,
+    )
+    seen = registered = 0
+    batch: List[Dict[str, Any]] = []
+    try:
+        for hit in scan(
+            es,
+            index=settings.CHAT_INDEX_NAME,
+            query={"query": {"match_all": {}}},
+            # Embedded message IDs only, to count them for pre-index sessions
+            _source_includes=[
+                "session_id",
+                "user_id",
+                "title",
+                "message_count",
+                "last_message_preview",
+                "last_activity",
+                "created_at",
+                "updated_at",
+                "messages.id",
+            ],
+            size=args.batch_size,
+        ):
+            session = hit["_source"]
+            if session.get("message_count") is None:
+                session["message_count"] = len(session.pop("messages", []))
+            batch.append(session)
+            seen += 1
+            if len(batch) >= args.batch_size:
+                registered += flush(batch)
+                batch = []
+        if batch:
+            registered += flush(batch)
+    finally:
+        es.close()
+    logger.info(f"Scanned {seen} sessions, registered {registered} new")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main(parse_args())
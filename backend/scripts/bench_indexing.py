@@ -0,0 +1,159 @@
+"""
+Indexing throughput benchmark for chat message writes.
+
+Replays the per-message write the backend performs (index the message
+document, partially update its session) against scratch indices, once per
+refresh policy, and reports writes per second and latency percentiles:
+
+    python scripts/bench_indexing.py --host localhost --port 9200 \\
+        --messages 5000 --concurrency 16 --refresh true wait_for false
+
+"true" is the old behaviour (force a refresh on every write), "false" is
+what the backend does now. The scratch indices are deleted afterwards.
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+from elasticsearch import Elasticsearch
+
+SESSIONS_INDEX = "bench_chat_sessions"
+MESSAGES_INDEX = "bench_chat_messages"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def refresh_param(policy: str):
+    return {"true": True, "false": False}.get(policy, policy)
+
+
+def reset_indices(es: Elasticsearch, sessions: List[str]) -> None:
+    for index in (SESSIONS_INDEX, MESSAGES_INDEX):
+        es.indices.delete(index=index, ignore_unavailable=True)
+        es.indices.create(
+            index=index,
+            body={"settings": {"number_of_shards": 1, "number_of_replicas": 0}},
+        )
+    operations: List[Dict] = []
+    now = datetime.utcnow().isoformat()
+    for session_id in sessions:
+        operations.append({"index": {"_index": SESSIONS_INDEX, "_id": session_id}})
+        operations.append(
+            {
+                "session_id": session_id,
+                "user_id": 1,
+                "title": "bench",
+                "created_at": now,
+                "updated_at": now,
+            }
+        )
+    es.bulk(body=operations, refresh=True)
+
+
+def append(es: Elasticsearch, session_id: str, refresh, content: str) -> float:
+    message_id = str(uuid.uuid4())
+    timestamp = datetime.utcnow().isoformat()
+    operations = [
+        {"create": {"_index": MESSAGES_INDEX, "_id": message_id}},
+        {
+            "id": message_id,
+            "session_id": session_id,
+            "user_id": 1,
+            "role": "user",
+            "content": content,
+            "timestamp": timestamp,
+        },
+        {"update": {"_index": SESSIONS_INDEX, "_id": session_id}},
+        {"doc": {"updated_at": timestamp}},
+    ]
+    start = time.monotonic()
+    result = es.bulk(body=operations, refresh=refresh)
+    if result.get("errors"):
+        raise RuntimeError(json.dumps(result["items"]))
+    return time.monotonic() - start
+
+
+def run(es: Elasticsearch, args: argparse.Namespace, policy: str) -> Dict[str, object]:
+    sessions = [str(uuid.uuid4()) for _ in range(args.sessions)]
+    reset_indices(es, sessions)
+    content = "x" * args.message_bytes
+    refresh = refresh_param(policy)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(
+            pool.map(
+                lambda i: append(es, sessions[i % len(sessions)], refresh, content),
+                range(args.messages),
+            )
+        )
+    elapsed = time.monotonic() - start
+
+    return {
+        "refresh": policy,
+        "messages": args.messages,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "writes_per_s": round(args.messages / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1),
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+    }
+
+
+def main(args: argparse.Namespace) -> None:
+    es = Elasticsearch(
+        [f"http://{args.host}:{args.port}"], connections_per_node=args.concurrency
+    )
+    try:
+        results = [run(es, args, policy) for policy in args.refresh]
+        print(json.dumps(results, indent=2))
+    finally:
+        for index in (SESSIONS_INDEX, MESSAGES_INDEX):
+            es.indices.delete(index=index, ignore_unavailable=True)
+        es.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument(
+        "--messages", type=int, default=2000, help="Messages written per policy"
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        default=100,
+        help="Sessions the messages are spread over",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--message-bytes", type=int, default=500)
+    parser.add_argument(
+        "--refresh",
+        nargs="+",
+        choices=["true", "wait_for", "false"],
+        default=["true", "false"],
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,248 @@
+"""
+Load generator for the chat API.
+
+Drives POST /chat/message, POST /chat/message/stream or the WebSocket
+endpoint at a target concurrency and reports throughput, latency
+percentiles (and time to first token for streaming modes) and error rates.
+
+    python scripts/loadtest.py --base-url http://localhost:8000/api/v1 \\
+        --email load@example.com --password secret123 \\
+        --mode ws --concurrency 50 --duration 60
+
+Use it against the backend configured with CLAUDE_API_BASE_URL pointing at
+scripts/mock_anthropic.py to measure the backend without spending quota.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+import websockets
+
+PROMPTS = [
+    "Hi!",
+    "What is the capital of France?",
+    "Explain the difference between a process and a thread.",
+    "Write a short poem about the sea.",
+    "Summarize the plot of Hamlet in three sentences.",
+]
+
+
+class Results:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.first_token: List[float] = []
+        self.errors: Counter = Counter()
+        self.ok = 0
+
+    def record(self, latency: float, ttft: Optional[float] = None) -> None:
+        self.ok += 1
+        self.latencies.append(latency)
+        if ttft is not None:
+            self.first_token.append(ttft)
+
+    def fail(self, reason: str) -> None:
+        self.errors[reason] += 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(int(round(pct / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def login(
+    client: httpx.AsyncClient, base_url: str, email: str, password: str
+) -> str:
+    response = await client.post(
+        f"{base_url}/auth/login", data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def rest_worker(
+    client: httpx.AsyncClient,
+    args: argparse.Namespace,
+    token: str,
+    results: Results,
+    deadline: float,
+) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = None
+    while time.monotonic() < deadline:
+        payload = {
+            "message": random.choice(PROMPTS),
+            "session_id": session_id,
+            "client_message_id": uuid.uuid4().hex,
+        }
+        start = time.monotonic()
+        try:
+            if args.mode == "sse":
+                ttft = None
+                async with client.stream(
+                    "POST",
+                    f"{args.base_url}/chat/message/stream",
+                    json=payload,
+                    headers=headers,
+                ) as response:
+                    if response.status_code != 200:
+                        results.fail(f"http_{response.status_code}")
+                        continue
+                    async for line in response.aiter_lines():
+                        if line.startswith("event: delta") and ttft is None:
+                            ttft = time.monotonic() - start
+                        elif line.startswith("event: error"):
+                            results.fail("stream_error")
+                            break
+                        elif line.startswith("data:") and '"type": "done"' in line:
+                            session_id = (
+                                json.loads(line[5:])["session_id"]
+                                if args.reuse_session
+                                else None
+                            )
+                            results.record(time.monotonic() - start, ttft)
+            else:
+                response = await client.post(
+                    f"{args.base_url}/chat/message", json=payload, headers=headers
+                )
+                if response.status_code != 200:
+                    results.fail(f"http_{response.status_code}")
+                    continue
+                if args.reuse_session:
+                    session_id = response.json()["session_id"]
+                results.record(time.monotonic() - start)
+        except httpx.HTTPError as e:
+            results.fail(type(e).__name__)
+
+
+async def ws_worker(
+    args: argparse.Namespace, token: str, results: Results, deadline: float
+) -> None:
+    ws_url = args.base_url.replace("http", "ws", 1) + f"/chat/ws/{token}"
+    try:
+        async with websockets.connect(ws_url, open_timeout=args.timeout) as ws:
+            await ws.recv()  # connection_established
+            session_id = None
+            while time.monotonic() < deadline:
+                start = time.monotonic()
+                ttft = None
+                await ws.send(
+                    json.dumps(
+                        {
+                            "message": random.choice(PROMPTS),
+                            "session_id": session_id,
+                            "stream": args.stream,
+                            "client_message_id": uuid.uuid4().hex,
+                        }
+                    )
+                )
+                while True:
+                    frame = json.loads(
+                        await asyncio.wait_for(ws.recv(), timeout=args.timeout)
+                    )
+                    if frame.get("type") in ("ping", "start"):
+                        continue
+                    if frame.get("type") == "delta":
+                        ttft = ttft or time.monotonic() - start
+                        continue
+                    if "error" in frame:
+                        results.fail("ws_error")
+                    else:
+                        results.record(time.monotonic() - start, ttft)
+                        if args.reuse_session:
+                            session_id = frame.get("session_id")
+                    break
+    except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+        results.fail(type(e).__name__)
+
+
+def report(
+    results: Results, elapsed: float, args: argparse.Namespace
+) -> Dict[str, object]:
+    total = results.ok + sum(results.errors.values())
+    summary = {
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "succeeded": results.ok,
+        "throughput_rps": round(results.ok / elapsed, 2) if elapsed else 0,
+        "error_rate": round(sum(results.errors.values()) / total, 4) if total else 0,
+        "errors": dict(results.errors),
+    }
+    for name, values in (("latency", results.latencies), ("ttft", results.first_token)):
+        if values:
+            summary[f"{name}_ms"] = {
+                "mean": round(statistics.mean(values) * 1000, 1),
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p95": round(percentile(values, 95) * 1000, 1),
+                "p99": round(percentile(values, 99) * 1000, 1),
+            }
+    return summary
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        token = args.token or await login(
+            client, args.base_url, args.email, args.password
+        )
+        results = Results()
+        start = time.monotonic()
+        deadline = start + args.duration
+        if args.mode == "ws":
+            workers = [
+                ws_worker(args, token, results, deadline)
+                for _ in range(args.concurrency)
+            ]
+        else:
+            workers = [
+                rest_worker(client, args, token, results, deadline)
+                for _ in range(args.concurrency)
+            ]
+        await asyncio.gather(*workers)
+        print(json.dumps(report(results, time.monotonic() - start, args), indent=2))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument(
+        "--token", help="Access token; otherwise --email/--password are used to log in"
+    )
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--mode", choices=["rest", "sse", "ws"], default="rest")
+    parser.add_argument(
+        "--stream", action="store_true", help="Request delta frames in ws mode"
+    )
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--reuse-session",
+        action="store_true",
+        help="Keep each worker in one growing session",
+    )
+    args = parser.parse_args()
+    if not args.token and not (args.email and args.password):
+        parser.error("either --token or --email and --password are required")
+    return args
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,192 @@
+"""
+Mock Anthropic Messages API for load testing without spending API quota.
+
+Run it and point the backend at it:
+
+    python scripts/mock_anthropic.py --port 8081 --latency-ms 400 --tokens-per-second 80
+    CLAUDE_API_BASE_URL=http://localhost:8081 uvicorn app.main:app
+
+Supports regular and streaming (SSE) responses, configurable latency
+distributions and token rates, and injected 429/529 errors.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LOREM = (
+    "Sure. Here is a detailed answer covering the main points you asked about, "
+    "with a few examples and some caveats to keep in mind when applying it. "
+).split()
+
+app = FastAPI(title="Mock Anthropic API")
+config = argparse.Namespace()
+
+
+def sample_latency() -> float:
+    """First-token latency in seconds drawn from the configured distribution."""
+    base = config.latency_ms / 1000.0
+    if config.latency_dist == "uniform":
+        spread = config.latency_jitter_ms / 1000.0
+        return max(random.uniform(base - spread, base + spread), 0.0)
+    if config.latency_dist == "exponential":
+        return random.expovariate(1.0 / base) if base > 0 else 0.0
+    if config.latency_dist == "lognormal":
+        # latency_ms is the median; jitter widens the tail
+        sigma = math.log1p(config.latency_jitter_ms / max(config.latency_ms, 1))
+        return random.lognormvariate(0, sigma) * base
+    return base
+
+
+def injected_error() -> Optional[JSONResponse]:
+    roll = random.random()
+    if roll < config.error_rate_429:
+        status_code, error_type = 429, "rate_limit_error"
+    elif roll < config.error_rate_429 + config.error_rate_529:
+        status_code, error_type = 529, "overloaded_error"
+    else:
+        return None
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "type": "error",
+            "error": {"type": error_type, "message": "Injected by mock server"},
+        },
+        headers={"retry-after": str(config.retry_after)},
+    )
+
+
+def make_tokens(max_tokens: int) -> list:
+    count = min(max_tokens, config.output_tokens)
+    return [LOREM[i % len(LOREM)] + " " for i in range(count)]
+
+
+def sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_events(
+    model: str, tokens: list, input_tokens: int
+) -> AsyncIterator[str]:
+    message_id = f"msg_mock_{uuid.uuid4().hex[:24]}"
+    yield sse(
+        {
+            "type": "message_start",
+            "message": {
+                "id": message_id,
+                "type": "message",
+                "role": "assistant",
+                "model": model,
+                "content": [],
+                "stop_reason": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+            },
+        }
+    )
+    yield sse(
+        {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {"type": "text", "text": ""},
+        }
+    )
+    delay = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0
+    for token in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield sse(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": token},
+            }
+        )
+    yield sse({"type": "content_block_stop", "index": 0})
+    yield sse(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": len(tokens)},
+        }
+    )
+    yield sse({"type": "message_stop"})
+
+
+@app.post("/v1/messages")
+async def messages(request: Request) -> Any:
+    body = await request.json()
+    error = injected_error()
+    if error is not None:
+        return error
+
+    model = body.get("model", "mock-model")
+    tokens = make_tokens(int(body.get("max_tokens", 1024)))
+    input_tokens = len(json.dumps(body.get("messages", []))) // 4
+    await asyncio.sleep(sample_latency())
+
+    if body.get("stream"):
+        return StreamingResponse(
+            stream_events(model, tokens, input_tokens), media_type="text/event-stream"
+        )
+
+    if config.tokens_per_second > 0:
+        await asyncio.sleep(len(tokens) / config.tokens_per_second)
+    return {
+        "id": f"msg_mock_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": "".join(tokens)}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": len(tokens)},
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument(
+        "--latency-dist",
+        choices=["fixed", "uniform", "exponential", "lognormal"],
+        default="lognormal",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=500.0,
+        help="Time to first token (median/mean)",
+    )
+    parser.add_argument(
+        "--latency-jitter-ms",
+        type=float,
+        default=250.0,
+        help="Spread for uniform/lognormal",
+    )
+    parser.add_argument(
+        "--tokens-per-second",
+        type=float,
+        default=60.0,
+        help="0 returns all tokens at once",
+    )
+    parser.add_argument("--output-tokens", type=int, default=150)
+    parser.add_argument("--error-rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate-529", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    config = parse_args()
+    uvicorn.run(app, host=config.host, port=config.port, log_level="warning")
@@ -0,0 +1,96 @@
+"""
+Export or import chat histories as gzip-compressed NDJSON.
+
+Uses the same streaming code as the export endpoints, so memory stays flat
+whatever the size of the history:
+
+    python scripts/transfer_chats.py export --user-id 42 -o user-42.ndjson.gz
+    python scripts/transfer_chats.py export -o all.ndjson.gz
+    python scripts/transfer_chats.py import all.ndjson.gz --concurrency 8
+
+Run it from the backend directory with the application's environment.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+from app.core.config import settings
+from app.db.elasticsearch import close_elasticsearch, init_elasticsearch
+from app.services.transfer import ChatTransfer
+
+READ_CHUNK_BYTES = 1024 * 1024
+
+logger = logging.getLogger("transfer_chats")
+
+
+async def read_file(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def export(transfer: ChatTransfer, args: argparse.Namespace) -> None:
+    written = 0
+    with open(args.output, "wb") as f:
+        async for chunk in transfer.export_history(args.user_id):
+            await asyncio.to_thread(f.write, chunk)
+            written += len(chunk)
+    logger.info(f"Wrote {written} bytes to {args.output}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    if not await init_elasticsearch():
+        raise SystemExit("Elasticsearch is not available")
+    try:
+        if args.command == "export":
+            await export(ChatTransfer(), args)
+        else:
+            transfer = ChatTransfer(
+                bulk_actions=args.batch_size, concurrency=args.concurrency
+            )
+            stats = await transfer.import_history(read_file(args.input))
+            print(json.dumps(stats, indent=2))
+    finally:
+        await close_elasticsearch()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export histories to a file")
+    export_parser.add_argument(
+        "--user-id", type=int, default=None, help="Only this user (default: everyone)"
+    )
+    export_parser.add_argument("-o", "--output", required=True)
+
+    import_parser = commands.add_parser(
+        "import", help="Import histories from an export file"
+    )
+    import_parser.add_argument("input")
+    import_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=settings.IMPORT_BULK_ACTIONS,
+        help="Documents per bulk request",
+    )
+    import_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.IMPORT_CONCURRENCY,
+        help="Bulk requests in flight",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(parse_args()))
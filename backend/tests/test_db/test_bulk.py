@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.db import bulk
+from app.db.bulk import BulkWriteError, BulkWriter, failed_items
+
+
+class FakeClient:
+    """Answers each _bulk request with the next scripted item statuses."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    async def bulk(self, body):
+        self.requests.append(body)
+        statuses = self.responses.pop(0)
+        if isinstance(statuses, Exception):
+            raise statuses
+        items = []
+        for action, status in zip(body[::2], statuses):
+            name = next(iter(action))
+            outcome = {"_id": action[name]["_id"], "status": status}
+            if status >= 300:
+                outcome["error"] = {"type": f"status_{status}"}
+            items.append({name: outcome})
+        return {"errors": any(s >= 300 for s in statuses), "items": items}
+
+
+def create(doc_id):
+    return [{"create": {"_index": "messages", "_id": doc_id}}, {"id": doc_id}]
+
+
+def update(doc_id):
+    return [{"update": {"_index": "sessions", "_id": doc_id}}, {"script": {}}]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(bulk, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(bulk, "RETRY_MAX_DELAY", 0)
+
+
+async def start(client, **kwargs):
+    writer = BulkWriter(flush_interval=0.01, **kwargs)
+    writer.start(client)
+    return writer
+
+
+async def test_submit_resolves_after_flush():
+    client = FakeClient([201, 200])
+    writer = await start(client)
+    future = await writer.submit(create("m1") + update("s1"))
+    assert not future.done()
+    await future
+    assert len(client.requests) == 1
+    await writer.close()
+
+
+async def test_item_error_fails_only_its_own_write():
+    client = FakeClient([201, 400, 201])
+    writer = await start(client)
+    first = await writer.submit(create("m1") + update("s1"))
+    second = await writer.submit(create("m2"))
+    await second
+    with pytest.raises(BulkWriteError) as error:
+        await first
+    assert list(error.value.errors[0]) == ["update"]
+    await writer.close()
+
+
+async def test_retries_only_rejected_items():
+    client = FakeClient([201, 429, 201], [200])
+    writer = await start(client)
+    first = await writer.submit(create("m1") + update("s1"))
+    second = await writer.submit(create("m2"))
+    await asyncio.gather(first, second)
+    assert client.requests[1] == update("s1")
+    await writer.close()
+
+
+async def test_create_conflict_counts_as_stored():
+    client = FakeClient([409])
+    writer = await start(client)
+    await (await writer.submit(create("m1")))
+    await writer.close()
+
+
+async def test_gives_up_after_max_retries():
+    client = FakeClient([503], [503])
+    writer = await start(client, max_retries=1)
+    future = await writer.submit(update("s1"))
+    with pytest.raises(BulkWriteError):
+        await future
+    assert len(client.requests) == 2
+    await writer.close()
+
+
+async def test_request_failure_is_retried_then_raised():
+    client = FakeClient(ConnectionError("down"), ConnectionError("down"))
+    writer = await start(client, max_retries=1)
+    future = await writer.submit(create("m1"))
+    with pytest.raises(ConnectionError):
+        await future
+    await writer.close()
+
+
+def test_failed_items_ignores_create_conflicts():
+    result = {
+        "errors": True,
+        "items": [
+            {"create": {"status": 409, "error": {"type": "conflict"}}},
+            {"update": {"status": 404, "error": {"type": "not_found"}}},
+        ],
+    }
+    assert failed_items(result) == [result["items"][1]]
@@ -0,0 +1,52 @@
+import pytest
+
+from app.core.config import settings
+from app.services import chat
+from app.services.chat import ChatService
+
+
+def session(message_count):
+    return {
+        "session_id": "s1",
+        "user_id": 1,
+        "messages": [],
+        "message_count": message_count,
+        "updated_at": "2026-01-01T00:00:00",
+    }
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    state = {"current": True, "loads": 0}
+
+    async def session_is_current(cached):
+        return state["current"]
+
+    async def get_chat_session(session_id, user_id):
+        state["loads"] += 1
+        return session(message_count=2)
+
+    monkeypatch.setattr(settings, "SESSION_CACHE_ENABLED", True)
+    monkeypatch.setattr(chat, "session_is_current", session_is_current)
+    monkeypatch.setattr(chat, "get_chat_session", get_chat_session)
+    return state
+
+
+async def test_cached_session_is_used_while_current(registry):
+    service = ChatService()
+    cached = session(message_count=1)
+    service._cache_session(cached)
+
+    assert await service._load_session("s1", 1) is cached
+    assert registry["loads"] == 0
+
+
+async def test_session_changed_elsewhere_is_reloaded(registry):
+    service = ChatService()
+    service._cache_session(session(message_count=1))
+    registry["current"] = False
+
+    loaded = await service._load_session("s1", 1)
+
+    assert loaded["message_count"] == 2
+    assert registry["loads"] == 1
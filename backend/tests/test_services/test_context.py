@@ -0,0 +1,22 @@
+from app.services.context import ContextWindowManager
+
+HISTORY = [
+    {"role": "user", "content": "hello", "token_count": 5},
+    {"role": "assistant", "content": "hi there", "token_count": 5},
+]
+
+
+def test_zero_budget_sends_only_the_new_message():
+    manager = ContextWindowManager(max_input_tokens=1000)
+
+    messages = manager.build_messages("next", HISTORY, max_input_tokens=0)
+
+    assert messages == [{"role": "user", "content": "next"}]
+
+
+def test_default_budget_applies_without_override():
+    manager = ContextWindowManager(max_input_tokens=1000)
+
+    messages = manager.build_messages("next", HISTORY)
+
+    assert [message["content"] for message in messages] == ["hello", "hi there", "next"]
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app.services.idempotency import IdempotencyConflictError, IdempotencyStore
+
+FINGERPRINT = IdempotencyStore.fingerprint("s1", "hello")
+
+
+async def test_replay_while_in_flight_waits_for_the_first_result():
+    store = IdempotencyStore()
+    assert await store.acquire("1:k", FINGERPRINT) is None
+
+    duplicate = asyncio.create_task(store.acquire("1:k", FINGERPRINT))
+    await asyncio.sleep(0)
+    assert not duplicate.done()
+
+    store.complete("1:k", {"message": "hi"})
+    assert await duplicate == {"message": "hi"}
+    # Later duplicates get the stored result replayed
+    assert await store.acquire("1:k", FINGERPRINT) == {"message": "hi"}
+
+
+async def test_replay_takes_over_when_the_first_attempt_fails():
+    store = IdempotencyStore()
+    await store.acquire("1:k", FINGERPRINT)
+
+    duplicate = asyncio.create_task(store.acquire("1:k", FINGERPRINT))
+    await asyncio.sleep(0)
+    store.release("1:k", RuntimeError("upstream failed"))
+
+    # The duplicate now owns the key and runs the request itself
+    assert await duplicate is None
+
+
+async def test_replay_with_a_different_message_conflicts():
+    store = IdempotencyStore()
+    await store.acquire("1:k", FINGERPRINT)
+
+    with pytest.raises(IdempotencyConflictError):
+        await store.acquire("1:k", IdempotencyStore.fingerprint("s1", "other"))
@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import retention
+from app.services.retention import RetentionJob
+
+CUTOFF = "2026-01-01T00:00:00"
+
+
+def loaded(session_id, last_activity):
+    session = {
+        "session_id": session_id,
+        "user_id": 1,
+        "last_activity": last_activity,
+        "messages": [{"id": f"{session_id}-m1"}],
+    }
+    key = {"session_id": session_id, "user_id": 1, "if_seq_no": 1, "if_primary_term": 1}
+    return session, key
+
+
+@pytest.fixture
+def store(monkeypatch):
+    state = {"sessions": [], "changed": set(), "archives": {}, "deleted": []}
+
+    async def get_sessions_for_archive(candidates):
+        return state["sessions"]
+
+    async def write_session_archive(session, messages):
+        state["archives"][session["session_id"]] = messages
+
+    async def delete_session_archive(session_id, user_id):
+        del state["archives"][session_id]
+
+    async def delete_archived_sessions(keys):
+        # Sessions written to after they were read fail the version check
+        deleted = [
+            k["session_id"] for k in keys if k["session_id"] not in state["changed"]
+        ]
+        state["deleted"].extend(deleted)
+        return deleted
+
+    for function in (
+        get_sessions_for_archive,
+        write_session_archive,
+        delete_session_archive,
+        delete_archived_sessions,
+    ):
+        monkeypatch.setattr(retention, function.__name__, function)
+    return state
+
+
+async def test_session_changed_while_archiving_is_kept(store):
+    store["sessions"] = [loaded("idle", "2025-06-01"), loaded("busy", "2025-06-01")]
+    store["changed"] = {"busy"}
+
+    archived = await RetentionJob()._archive([{}, {}], CUTOFF)
+
+    assert archived == 1
+    assert store["deleted"] == ["idle"]
+    assert list(store["archives"]) == ["idle"]
+
+
+async def test_session_used_since_scan_is_not_archived(store):
+    store["sessions"] = [loaded("active", "2026-02-01")]
+
+    assert await RetentionJob()._archive([{}], CUTOFF) == 0
+    assert store["archives"] == {}
+    assert store["deleted"] == []
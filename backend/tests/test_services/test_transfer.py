@@ -0,0 +1,81 @@
+import gzip
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import transfer
+from app.services.transfer import ChatTransfer
+
+
+def export(*records):
+    lines = b"".join(json.dumps(record).encode() + b"\n" for record in records)
+    return gzip.compress(lines)
+
+
+async def stream(data, chunk_size=1024):
+    for start in range(0, len(data), chunk_size):
+        yield data[start : start + chunk_size]
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    state = {"indexed": [], "sessions": [], "messages": []}
+
+    async def existing_user_ids(user_ids):
+        return {1} & set(user_ids)
+
+    async def import_documents(index, documents, id_field, op_type="index"):
+        state["indexed"].extend(document[id_field] for document in documents)
+        return {"written": len(documents), "existing": 0, "failed": []}
+
+    async def register_chat_sessions(sessions):
+        state["sessions"].extend(session["session_id"] for session in sessions)
+
+    async def register_chat_messages(messages):
+        state["messages"].extend(message["id"] for message in messages)
+        return 0
+
+    for function in (
+        existing_user_ids,
+        import_documents,
+        register_chat_sessions,
+        register_chat_messages,
+    ):
+        monkeypatch.setattr(transfer, function.__name__, function)
+    return state
+
+
+async def test_unknown_user_is_skipped_in_both_stores(stores):
+    data = export(
+        {"type": "session", "doc": {"session_id": "s1", "user_id": 1}},
+        {"type": "session", "doc": {"session_id": "s2", "user_id": 2}},
+        {"type": "message", "doc": {"id": "m1", "session_id": "s1", "user_id": 1}},
+        {"type": "message", "doc": {"id": "m2", "session_id": "s2", "user_id": 2}},
+    )
+
+    stats = await ChatTransfer().import_history(stream(data))
+
+    assert stats["sessions"] == 1
+    assert stats["messages"] == 1
+    assert stats["skipped"] == 2
+    assert stores["indexed"] == ["s1", "m1"]
+    assert stores["sessions"] == ["s1"]
+    assert stores["messages"] == ["m1"]
+
+
+async def test_decompressed_size_is_capped(stores):
+    # Compresses to about 10 KB
+    data = gzip.compress(b" " * 10_000_000)
+
+    with pytest.raises(HTTPException) as error:
+        await ChatTransfer(max_bytes=1_000_000).import_history(stream(data))
+    assert error.value.status_code == 413
+
+
+async def test_line_length_is_capped(stores):
+    data = export({"type": "session", "doc": {"session_id": "s1", "title": "x" * 5000}})
+
+    with pytest.raises(HTTPException) as error:
+        await ChatTransfer(max_line_bytes=1000).import_history(stream(data))
+    assert error.value.status_code == 413
@@ -0,0 +1,54 @@
+from app.utils import resilience
+from app.utils.resilience import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def open_breaker(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker, clock
+
+
+def test_half_open_probe_success_closes_the_circuit(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only one probe at a time
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_half_open_probe_failure_reopens_the_circuit(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    assert breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+
+def test_lost_probe_is_replaced_after_the_timeout(monkeypatch):
+    breaker, clock = open_breaker(monkeypatch)
+    clock.now += 30
+    assert breaker.allow_request()
+
+    clock.now += 30
+    assert breaker.allow_request()